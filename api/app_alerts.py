@@ -5,8 +5,8 @@ from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from decouple import config
 from fastapi import FastAPI
 
-from chalicelib.core.alerts import alerts_processor
-from chalicelib.utils import pg_client
+from chalicelib.core.alerts import alerts_processor, alerts_listener
+from chalicelib.utils import pg_client, ch_client
 
 
 @asynccontextmanager
@@ -14,9 +14,11 @@ async def lifespan(app: FastAPI):
     # Startup
     ap_logger.info(">>>>> starting up <<<<<")
     await pg_client.init()
+    await ch_client.init()
     app.schedule.start()
+    # Ticks of the alerts scheduler, each tick only evaluates the alerts that are due
     app.schedule.add_job(id="alerts_processor", **{"func": alerts_processor.process, "trigger": "interval",
-                                                   "minutes": config("ALERTS_INTERVAL", cast=int, default=5),
+                                                   "seconds": config("ALERTS_TICK", cast=int, default=60),
                                                    "misfire_grace_time": 20})
 
     ap_logger.info(">Scheduled jobs:")
@@ -30,6 +32,7 @@ async def lifespan(app: FastAPI):
     ap_logger.info(">>>>> shutting down <<<<<")
     app.schedule.shutdown(wait=False)
     await pg_client.terminate()
+    await ch_client.terminate()
 
 
 loglevel = config("LOGLEVEL", default=logging.INFO)
@@ -51,10 +54,12 @@ async def root():
 
 
 @app.get("/health")
-async def get_health_status():
+def get_health_status():
     return {"data": {
         "health": True,
-        "details": {"version": config("version_number", default="unknown")}
+        "details": {"version": config("version_number", default="unknown"),
+                    "scheduler": alerts_listener.scheduler_state(),
+                    "lastCycle": getattr(alerts_processor, "last_cycle", None)}
     }}
 
 
@@ -0,0 +1,355 @@
+"""
+Funnel significance engine: the numpy implementation of significance.get_issues against the previous row-by-row
+implementation (kept below as the reference), on synthetic funnel rows.
+
+usage (from api, with the api env file loaded):
+    python benchmarks/significance_benchmark.py [--rows 100000] [--issues 500] [--stages 3]
+
+Both implementations run on the same rows, the benchmark fails if their results differ.
+"""
+from collections import defaultdict
+from pathlib import Path
+from time import perf_counter
+import argparse
+import logging
+import math
+import random
+import sys
+import warnings
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from chalicelib.core.metrics.modules.significance import significance
+from chalicelib.core.metrics.modules.significance.significance import SIGNIFICANCE_THRSH, T_VALUES
+from chalicelib.utils import helper
+
+logger = logging.getLogger(__name__)
+ISSUE_TYPES = ["click_rage", "dead_click", "excessive_scrolling", "bad_request", "missing_resource", "memory",
+               "cpu", "slow_resource", "slow_page_load", "crash", "js_exception"]
+
+
+def synthetic_rows(n_rows: int, n_issues: int, n_stages: int, seed: int = 42) -> list:
+    """Rows as get_stages_and_events returns them: one row per (session, issue), at most 10 issues per session"""
+    rng = random.Random(seed)
+    issues = [(f"issue-{i}", rng.choice(ISSUE_TYPES), f"context {i}") for i in range(n_issues)]
+    # A few issues are frequent, most of them are rare
+    weights = [1 / (i + 1) for i in range(n_issues)]
+    rows = []
+    session_id = 0
+    while len(rows) < n_rows:
+        session_id += 1
+        ts = 1_700_000_000_000 + session_id * 1000
+        session_issues = rng.choices(issues, weights=weights, k=rng.choice([0, 0, 1, 1, 2, 3, 10]))
+        # Sessions hitting one of the first 10 issues convert less
+        conversion = 0.3 if any(int(i[0].split("-")[1]) < 10 for i in session_issues) else 0.8
+        stages = [ts]
+        for _ in range(1, n_stages):
+            stages.append(stages[-1] + rng.randint(1, 60_000) if stages[-1] is not None and rng.random() < conversion
+                          else None)
+        user_uuid = f"user-{rng.randint(1, n_rows // 4)}" if rng.random() < 0.8 else None
+        session = {"session_id": session_id, "user_uuid": user_uuid, "user_id": user_uuid,
+                   **{f"stage{i + 1}_timestamp": t for i, t in enumerate(stages)}}
+        if len(session_issues) == 0:
+            rows.append({**session, "issue_type": None, "issue_timestamp": None, "issue_context": None,
+                         "issue_id": None})
+        for issue_id, issue_type, context in session_issues:
+            rows.append({**session, "issue_type": issue_type, "issue_timestamp": ts + rng.randint(0, 120_000),
+                         "issue_context": context, "issue_id": issue_id})
+    return rows[:n_rows]
+
+
+# Reference: row-by-row implementation used before the numpy engine
+
+def legacy_pearson_corr(x: list, y: list):
+    n = len(x)
+    if n != len(y):
+        raise ValueError(f'x and y must have the same length. Got {len(x)} and {len(y)} instead')
+
+    if n < 2:
+        warnings.warn(f'x and y must have length at least 2. Got {n} instead')
+        return None, None, False
+
+    # If an input is constant, the correlation coefficient is not defined.
+    if all(t == x[0] for t in x) or all(t == y[0] for t in y):
+        warnings.warn("An input array is constant; the correlation coefficent is not defined.")
+        return None, None, False
+
+    if n == 2:
+        return math.copysign(1, x[1] - x[0]) * math.copysign(1, y[1] - y[0]), 1.0, True
+
+    xmean = sum(x) / len(x)
+    ymean = sum(y) / len(y)
+
+    xm = [el - xmean for el in x]
+    ym = [el - ymean for el in y]
+
+    normxm = math.sqrt((sum([xm[i] * xm[i] for i in range(len(xm))])))
+    normym = math.sqrt((sum([ym[i] * ym[i] for i in range(len(ym))])))
+
+    threshold = 1e-8
+    if normxm < threshold * abs(xmean) or normym < threshold * abs(ymean):
+        # If all the values in x (likewise y) are very close to the mean,
+        # the loss of precision that occurs in the subtraction xm = x - xmean
+        # might result in large errors in r.
+        warnings.warn("An input array is constant; the correlation coefficent is not defined.")
+
+    r = sum(
+        i[0] * i[1] for i in zip([xm[i] / normxm for i in range(len(xm))], [ym[i] / normym for i in range(len(ym))]))
+
+    # Presumably, if abs(r) > 1, then it is only some small artifact of  floating point arithmetic.
+    # However, if r < 0, we don't care, as our problem is to find only positive correlations
+    r = max(min(r, 1.0), 0.0)
+
+    # approximated confidence
+    if n < 31:
+        t_c = T_VALUES[n]
+    elif n < 50:
+        t_c = 2.02
+    else:
+        t_c = 2
+    if r >= 0.999:
+        confidence = 1
+    else:
+        confidence = r * math.sqrt(n - 2) / math.sqrt(1 - r ** 2)
+
+    if confidence > SIGNIFICANCE_THRSH:
+        return r, confidence, True
+    else:
+        return r, confidence, False
+
+
+# def legacy_tuple_or(t: tuple):
+#     x = 0
+#     for el in t:
+#         x |= el # | is for bitwise OR
+#     return x
+#
+# The following function is correct optimization of the previous function because t is a list of 0,1
+def legacy_tuple_or(t: tuple):
+    for el in t:
+        if el > 0:
+            return 1
+    return 0
+
+
+def legacy_get_transitions_and_issues_of_each_type(rows: list, all_issues, first_stage, last_stage):
+    """
+    Returns two lists with binary values 0/1:
+
+    transitions ::: if transited from the first stage to the last - 1
+                    else - 0
+    errors      ::: a dictionary WHERE the keys are all unique issues (currently context-wise)
+                    the values are lists
+                    if an issue happened between the first stage to the last - 1
+                    else - 0
+
+    For a small task of calculating a total drop due to issues,
+    we need to disregard the issue type when creating the `errors`-like array.
+    The `all_errors` array can be obtained by logical OR statement applied to all errors by issue
+    The `transitions` array stays the same
+    """
+    transitions = []
+    n_sess_affected = 0
+    errors = {}
+
+    for row in rows:
+        t = 0
+        first_ts = row[f'stage{first_stage}_timestamp']
+        last_ts = row[f'stage{last_stage}_timestamp']
+        if first_ts is None:
+            continue
+        elif last_ts is not None:
+            t = 1
+        transitions.append(t)
+
+        ic_present = False
+        for error_id in all_issues:
+            if error_id not in errors:
+                errors[error_id] = []
+            ic = 0
+            row_issue_id = row['issue_id']
+            if row_issue_id is not None:
+                if last_ts is None or (first_ts < row['issue_timestamp'] < last_ts):
+                    if error_id == row_issue_id:
+                        ic = 1
+                        ic_present = True
+            errors[error_id].append(ic)
+
+        if ic_present and t:
+            n_sess_affected += 1
+
+    all_errors = [legacy_tuple_or(t) for t in zip(*errors.values())]
+
+    return transitions, errors, all_errors, n_sess_affected
+
+
+def legacy_get_affected_users_for_all_issues(rows, first_stage, last_stage):
+    """
+
+    :param rows:
+    :param first_stage:
+    :param last_stage:
+    :return:
+    """
+    affected_users = defaultdict(lambda: set())
+    affected_sessions = defaultdict(lambda: set())
+    all_issues = {}
+    n_affected_users_dict = defaultdict(lambda: None)
+    n_affected_sessions_dict = defaultdict(lambda: None)
+    n_issues_dict = defaultdict(lambda: 0)
+    issues_by_session = defaultdict(lambda: 0)
+
+    for row in rows:
+
+        # check that the session has reached the first stage of subfunnel:
+        if row[f'stage{first_stage}_timestamp'] is None:
+            continue
+
+        iss = row['issue_type']
+        iss_ts = row['issue_timestamp']
+
+        # check that the issue exists and belongs to subfunnel:
+        if iss is not None and (row[f'stage{last_stage}_timestamp'] is None or
+                                (row[f'stage{first_stage}_timestamp'] < iss_ts < row[f'stage{last_stage}_timestamp'])):
+            if row["issue_id"] not in all_issues:
+                all_issues[row["issue_id"]] = {"context": row['issue_context'], "issue_type": row["issue_type"]}
+            n_issues_dict[row["issue_id"]] += 1
+            if row['user_uuid'] is not None:
+                affected_users[row["issue_id"]].add(row['user_uuid'])
+
+            affected_sessions[row["issue_id"]].add(row['session_id'])
+            issues_by_session[row[f'session_id']] += 1
+
+    if len(affected_users) > 0:
+        n_affected_users_dict.update({
+            iss: len(affected_users[iss]) for iss in affected_users
+        })
+    if len(affected_sessions) > 0:
+        n_affected_sessions_dict.update({
+            iss: len(affected_sessions[iss]) for iss in affected_sessions
+        })
+    return all_issues, n_issues_dict, n_affected_users_dict, n_affected_sessions_dict
+
+
+def legacy_count_sessions(rows, n_stages):
+    session_counts = {i: set() for i in range(1, n_stages + 1)}
+    for row in rows:
+        for i in range(1, n_stages + 1):
+            if row[f"stage{i}_timestamp"] is not None:
+                session_counts[i].add(row[f"session_id"])
+
+    session_counts = {i: len(session_counts[i]) for i in session_counts}
+    return session_counts
+
+
+def legacy_get_issues(stages, rows, first_stage=None, last_stage=None, drop_only=False):
+    """
+
+    :param stages:
+    :param rows:
+    :param first_stage: If it's a part of the initial funnel, provide a number of the first stage (starting from 1)
+    :param last_stage: If it's a part of the initial funnel, provide a number of the last stage (starting from 1)
+    :return:
+    """
+
+    n_stages = len(stages)
+
+    if first_stage is None:
+        first_stage = 1
+    if last_stage is None:
+        last_stage = n_stages
+    if last_stage > n_stages:
+        logger.debug(
+            "The number of the last stage provided is greater than the number of stages. Using n_stages instead")
+        last_stage = n_stages
+
+    n_critical_issues = 0
+    issues_dict = {"significant": [],
+                   "insignificant": []}
+    session_counts = legacy_count_sessions(rows, n_stages)
+    drop = session_counts[first_stage] - session_counts[last_stage]
+
+    all_issues, n_issues_dict, affected_users_dict, affected_sessions = legacy_get_affected_users_for_all_issues(
+        rows, first_stage, last_stage)
+    transitions, errors, all_errors, n_sess_affected = legacy_get_transitions_and_issues_of_each_type(rows,
+                                                                                               all_issues,
+                                                                                               first_stage, last_stage)
+
+    del rows
+
+    if any(all_errors):
+        total_drop_corr, conf, is_sign = legacy_pearson_corr(transitions, all_errors)
+        if total_drop_corr is not None and drop is not None:
+            total_drop_due_to_issues = int(total_drop_corr * n_sess_affected)
+        else:
+            total_drop_due_to_issues = 0
+    else:
+        total_drop_due_to_issues = 0
+
+    if drop_only:
+        return total_drop_due_to_issues
+    for issue_id in all_issues:
+
+        if not any(errors[issue_id]):
+            continue
+        r, confidence, is_sign = legacy_pearson_corr(transitions, errors[issue_id])
+
+        if r is not None and drop is not None and is_sign:
+            lost_conversions = int(r * affected_sessions[issue_id])
+        else:
+            lost_conversions = None
+        if r is None:
+            r = 0
+        issues_dict['significant' if is_sign else 'insignificant'].append({
+            "type": all_issues[issue_id]["issue_type"],
+            "title": helper.get_issue_title(all_issues[issue_id]["issue_type"]),
+            "affected_sessions": affected_sessions[issue_id],
+            "unaffected_sessions": session_counts[1] - affected_sessions.get(issue_id, 0),
+            "lost_conversions": lost_conversions,
+            "affected_users": affected_users_dict[issue_id],
+            "conversion_impact": round(r * 100),
+            "context_string": all_issues[issue_id]["context"],
+            "issue_id": issue_id
+        })
+
+        if is_sign:
+            n_critical_issues += n_issues_dict[issue_id]
+    # To limit the number of returned issues to the frontend
+    issues_dict["significant"] = issues_dict["significant"][:20]
+    issues_dict["insignificant"] = issues_dict["insignificant"][:20]
+
+    return n_critical_issues, issues_dict, total_drop_due_to_issues
+
+
+
+def timed(function, *args, **kwargs):
+    t = perf_counter()
+    result = function(*args, **kwargs)
+    return result, perf_counter() - t
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--issues', type=int, default=500)
+    parser.add_argument('--stages', type=int, default=3)
+    args = parser.parse_args()
+
+    rows = synthetic_rows(args.rows, args.issues, args.stages)
+    stages = [None] * args.stages
+    print(f'[INFO] {len(rows)} rows, {args.issues} distinct issues, {args.stages} stages')
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        expected, legacy_time = timed(legacy_get_issues, stages, rows)
+    result, numpy_time = timed(significance.get_issues, stages, rows)
+    print(f'[INFO]     legacy: {legacy_time:.2f}s')
+    print(f'[INFO]      numpy: {numpy_time:.2f}s  (x{legacy_time / numpy_time:.1f})')
+    if result != expected:
+        print('[ERROR] results differ')
+        sys.exit(1)
+    print(f'[INFO] identical results: {len(result[1]["significant"])} significant, '
+          f'{len(result[1]["insignificant"])} insignificant issues, total drop due to issues {result[2]}')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,5 @@
 import json
 import logging
-import time
 from datetime import datetime
 
 from decouple import config
@@ -9,7 +8,7 @@ import schemas
 from chalicelib.core import notifications, webhook
 from chalicelib.core.collaborations.collaboration_msteams import MSTeams
 from chalicelib.core.collaborations.collaboration_slack import Slack
-from chalicelib.utils import pg_client, helper, email_helper, smtp
+from chalicelib.utils import pg_client, helper, email_helper, smtp, dispatcher
 from chalicelib.utils.TimeUTC import TimeUTC
 
 logger = logging.getLogger(__name__)
@@ -115,7 +114,10 @@ def process_notifications(data):
                 elif c["type"] in ["webhook"]:
                     full[c["type"]].append({"data": webhook_data, "destination": c["value"]})
     notifications.create(data)
+    # Slack, MSTeams and webhook batches are sent to their destinations concurrently on the dispatcher's workers,
+    # email batches are sent in the background meanwhile
     BATCH_SIZE = 200
+    email_batches = []
     for t in full.keys():
         for i in range(0, len(full[t]), BATCH_SIZE):
             notifications_list = full[t][i:min(i + BATCH_SIZE, len(full[t]))]
@@ -135,27 +137,30 @@ def process_notifications(data):
                     logger.error("!!!Error while sending msteams notifications batch")
                     logger.error(str(e))
             elif t == "email":
-                try:
-                    send_by_email_batch(notifications_list=notifications_list)
-                except Exception as e:
-                    logger.error("!!!Error while sending email notifications batch")
-                    logger.error(str(e))
+                email_batches.append(dispatcher.submit(send_by_email_batch, notifications_list=notifications_list))
             elif t == "webhook":
                 try:
                     webhook.trigger_batch(data_list=notifications_list)
                 except Exception as e:
                     logger.error("!!!Error while sending webhook notifications batch")
                     logger.error(str(e))
+    for f in email_batches:
+        try:
+            f.result()
+        except Exception as e:
+            logger.error("!!!Error while sending email notifications batch")
+            logger.error(str(e))
 
 
-def send_by_email(notification, destination):
+def send_by_email(notification, destination, server=None):
     if notification is None:
         return
     email_helper.alert_email(recipients=destination,
                              subject=f'"{notification["title"]}" has been triggered',
                              data={
                                  "message": f'"{notification["title"]}" {notification["description"]}',
-                                 "project_id": notification["options"]["projectId"]})
+                                 "project_id": notification["options"]["projectId"]},
+                             server=server)
 
 
 def send_by_email_batch(notifications_list):
@@ -164,9 +169,13 @@ def send_by_email_batch(notifications_list):
     if notifications_list is None or len(notifications_list) == 0:
         logger.info("no email notifications")
         return
-    for n in notifications_list:
-        send_by_email(notification=n.get("notification"), destination=n.get("destination"))
-        time.sleep(1)
+    bucket = dispatcher.get_bucket("smtp", rate=config("EMAIL_RATE", cast=float, default=5))
+    # one connection for the whole batch, re-opened by the client if the server drops it
+    server = smtp.SMTPClient()
+    with server:
+        for n in notifications_list:
+            bucket.acquire()
+            send_by_email(notification=n.get("notification"), destination=n.get("destination"), server=server)
 
 
 def send_to_slack_batch(notifications_list):
@@ -179,9 +188,9 @@ def send_to_slack_batch(notifications_list):
                                                              "title": n["notification"]["title"],
                                                              "title_link": n["notification"]["buttonUrl"],
                                                              "ts": datetime.now().timestamp()})
-    for batch in webhookId_map.keys():
-        Slack.send_batch(tenant_id=webhookId_map[batch]["tenantId"], webhook_id=batch,
-                         attachments=webhookId_map[batch]["batch"])
+    dispatcher.run_all([(Slack.send_batch, {"tenant_id": webhookId_map[batch]["tenantId"], "webhook_id": batch,
+                                            "attachments": webhookId_map[batch]["batch"]})
+                        for batch in webhookId_map.keys()])
 
 
 def send_to_msteams_batch(notifications_list):
@@ -208,9 +217,9 @@ def send_to_msteams_batch(notifications_list):
                 "markdown": True
             }
         )
-    for batch in webhookId_map.keys():
-        MSTeams.send_batch(tenant_id=webhookId_map[batch]["tenantId"], webhook_id=batch,
-                           attachments=webhookId_map[batch]["batch"])
+    dispatcher.run_all([(MSTeams.send_batch, {"tenant_id": webhookId_map[batch]["tenantId"], "webhook_id": batch,
+                                              "attachments": webhookId_map[batch]["batch"]})
+                        for batch in webhookId_map.keys()])
 
 
 def delete(project_id, alert_id):
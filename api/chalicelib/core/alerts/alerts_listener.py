@@ -1,33 +1,216 @@
-from chalicelib.core.alerts.modules import TENANT_ID
+import copy
+import heapq
+import json
+import logging
+import random
+import threading
+
+import psycopg2
+import psycopg2.extensions
+from decouple import config
+
+from chalicelib.core.alerts.modules import TENANT_ID, alert_helpers
 from chalicelib.utils import pg_client, helper
+from chalicelib.utils.TimeUTC import TimeUTC
 
+logger = logging.getLogger(__name__)
 
-def get_all_alerts():
-    with pg_client.PostgresClient(long_query=True) as cur:
-        query = f"""SELECT {TENANT_ID} AS tenant_id,
-                           alert_id,
-                           projects.project_id,
-                           projects.name AS project_name,
-                           detection_method,
-                           query,
-                           options,
-                           (EXTRACT(EPOCH FROM alerts.created_at) * 1000)::BIGINT AS created_at,
-                           alerts.name,
-                           alerts.series_id,
-                           filter,
-                           change,
-                           COALESCE(metrics.name || '.' || (COALESCE(metric_series.name, 'series ' || index)) || '.count',
-                                    query ->> 'left')                             AS series_name
-                    FROM public.alerts
-                             INNER JOIN projects USING (project_id)
-                             LEFT JOIN metric_series USING (series_id)
-                             LEFT JOIN metrics USING (metric_id)
-                    WHERE alerts.deleted_at ISNULL
-                      AND alerts.active
-                      AND projects.active
-                      AND projects.deleted_at ISNULL
-                      AND (alerts.series_id ISNULL OR metric_series.deleted_at ISNULL)
-                    ORDER BY alerts.created_at;"""
+# Alerts are loaded once and kept in a min-heap of next due times, each tick only returns the alerts that are due.
+# Changes of public.alerts are received on the 'alert' NOTIFY channel (notify_alert trigger) and only the changed
+# alerts are reloaded; everything is reloaded every ALERTS_FULL_RELOAD minutes (series filters changes aren't notified)
+# or at every tick if the channel can't be listened to.
+ALERTS_JITTER = config("ALERTS_JITTER", cast=int, default=30)
+ALERTS_FULL_RELOAD = config("ALERTS_FULL_RELOAD", cast=int, default=60)
+# An alert is still checked if a tick happens less than this after its due time (same window as can_check)
+DUE_WINDOW = 60 * 1000
+
+
+def get_alerts(alert_ids=None):
+    """Active alerts, only the ones of alert_ids if it is given"""
+    with pg_client.PostgresClient(long_query=alert_ids is None) as cur:
+        query = cur.mogrify(f"""SELECT {TENANT_ID} AS tenant_id,
+                                       alert_id,
+                                       projects.project_id,
+                                       projects.name AS project_name,
+                                       detection_method,
+                                       query,
+                                       options,
+                                       (EXTRACT(EPOCH FROM alerts.created_at) * 1000)::BIGINT AS created_at,
+                                       alerts.name,
+                                       alerts.series_id,
+                                       filter,
+                                       change,
+                                       COALESCE(metrics.name || '.' || (COALESCE(metric_series.name, 'series ' || index)) || '.count',
+                                                query ->> 'left')                             AS series_name
+                                FROM public.alerts
+                                         INNER JOIN projects USING (project_id)
+                                         LEFT JOIN metric_series USING (series_id)
+                                         LEFT JOIN metrics USING (metric_id)
+                                WHERE alerts.deleted_at ISNULL
+                                  AND alerts.active
+                                  AND projects.active
+                                  AND projects.deleted_at ISNULL
+                                  AND (alerts.series_id ISNULL OR metric_series.deleted_at ISNULL)
+                                  {"AND alert_id IN %(alert_ids)s" if alert_ids is not None else ""}
+                                ORDER BY alerts.created_at;""",
+                            {"alert_ids": tuple(alert_ids) if alert_ids is not None else None})
         cur.execute(query=query)
         all_alerts = helper.list_to_camel_case(cur.fetchall())
     return all_alerts
+
+
+def get_all_alerts():
+    return get_alerts()
+
+
+class AlertsScheduler:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.alerts = {}
+        # (due time with jitter, alertId, version, due time), entries of a previous version are skipped when popped
+        self.heap = []
+        self.versions = {}
+        # last due time checked of each alert, reloaded alerts are scheduled from it
+        self.checked = {}
+        self.listener = None
+        self.loaded_at = None
+        self.refreshed_at = None
+        self.last_due = 0
+
+    def __listen(self):
+        if self.listener is not None and not self.listener.closed:
+            return True
+        try:
+            self.listener = psycopg2.connect(**pg_client.PG_CONFIG)
+            self.listener.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+            with self.listener.cursor() as cur:
+                cur.execute("LISTEN alert;")
+            return True
+        except Exception as e:
+            logger.warning("couldn't listen to alerts changes, alerts will be reloaded at every tick")
+            logger.warning(e)
+            self.listener = None
+            return False
+
+    def __changed_alerts(self):
+        """alertIds received on the NOTIFY channel since the last call, None if the channel was lost"""
+        try:
+            self.listener.poll()
+        except Exception as e:
+            logger.warning("lost the alerts changes channel")
+            logger.warning(e)
+            self.listener = None
+            return None
+        alert_ids = set()
+        while self.listener.notifies:
+            notify = self.listener.notifies.pop(0)
+            try:
+                alert_ids.add(json.loads(notify.payload)["alert_id"])
+            except (ValueError, KeyError):
+                logger.warning(f"unexpected alert notification: {notify.payload}")
+        return alert_ids
+
+    def __schedule(self, alert, now):
+        alert_id = alert["alertId"]
+        self.versions[alert_id] = self.versions.get(alert_id, 0) + 1
+        self.alerts[alert_id] = alert
+        interval = alert_helpers.repetition_interval(alert)
+        if interval is None:
+            return
+        if alert_id in self.checked:
+            due = self.checked[alert_id] + interval
+            while due + interval <= now:
+                due += interval
+        else:
+            due = alert["createdAt"] + (now - alert["createdAt"]) // interval * interval
+            if now - due >= DUE_WINDOW:
+                due += interval
+        self.__push(alert_id, due, interval)
+
+    def __push(self, alert_id, due, interval):
+        jitter = random.randint(0, min(ALERTS_JITTER * 1000, interval // 2))
+        heapq.heappush(self.heap, (due + jitter, alert_id, self.versions[alert_id], due))
+
+    def __unschedule(self, alert_id):
+        self.alerts.pop(alert_id, None)
+        self.versions[alert_id] = self.versions.get(alert_id, 0) + 1
+
+    def __load(self, now):
+        self.alerts = {}
+        self.heap = []
+        self.versions = {}
+        for alert in get_alerts():
+            self.__schedule(alert, now)
+        self.loaded_at = now
+        self.refreshed_at = now
+
+    def __refresh(self, now):
+        listening = self.__listen()
+        alert_ids = self.__changed_alerts() if listening else None
+        if alert_ids is None or self.loaded_at is None or now - self.loaded_at >= ALERTS_FULL_RELOAD * 60 * 1000:
+            self.__load(now)
+            return
+        if len(alert_ids) > 0:
+            for alert_id in alert_ids:
+                self.__unschedule(alert_id)
+            for alert in get_alerts(alert_ids):
+                self.__schedule(alert, now)
+            logger.info(f"{len(alert_ids)} alert(s) changed")
+        self.refreshed_at = now
+
+    def due(self):
+        """Alerts due now, the next check of each of them is scheduled before they are returned"""
+        now = TimeUTC.now()
+        due_alerts = []
+        with self.lock:
+            self.__refresh(now)
+            while len(self.heap) > 0 and self.heap[0][0] <= now:
+                _, alert_id, version, due = heapq.heappop(self.heap)
+                if self.versions.get(alert_id) != version or alert_id not in self.alerts:
+                    continue
+                alert = self.alerts[alert_id]
+                interval = alert_helpers.repetition_interval(alert)
+                # ticks that were missed (long cycle, restart...) are not replayed
+                while due + interval <= now:
+                    due += interval
+                self.checked[alert_id] = due
+                self.__push(alert_id, due + interval, interval)
+                due_alerts.append(copy.deepcopy(alert))
+            self.last_due = len(due_alerts)
+        return due_alerts
+
+    def notified(self, alert_ids, timestamp):
+        """Keeps lastNotification up to date in memory, in case the change notification is missed"""
+        with self.lock:
+            for alert_id in alert_ids:
+                if alert_id in self.alerts:
+                    self.alerts[alert_id]["options"]["lastNotification"] = timestamp
+
+    def state(self):
+        with self.lock:
+            next_due = None
+            for due, alert_id, version, _ in self.heap:
+                if self.versions.get(alert_id) == version and (next_due is None or due < next_due):
+                    next_due = due
+            return {"alerts": len(self.alerts),
+                    "heapSize": len(self.heap),
+                    "nextDue": next_due,
+                    "lastDue": self.last_due,
+                    "listening": self.listener is not None and not self.listener.closed,
+                    "loadedAt": self.loaded_at,
+                    "refreshedAt": self.refreshed_at}
+
+
+scheduler = AlertsScheduler()
+
+
+def get_due_alerts():
+    return scheduler.due()
+
+
+def set_notified(alert_ids, timestamp):
+    scheduler.notified(alert_ids=alert_ids, timestamp=timestamp)
+
+
+def scheduler_state():
+    return scheduler.state()
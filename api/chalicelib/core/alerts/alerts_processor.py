@@ -134,10 +134,10 @@ def Build(a):
 def process():
     logger.info("> processing alerts on PG")
     notifications = []
-    all_alerts = alerts_listener.get_all_alerts()
+    all_alerts = alerts_listener.get_due_alerts()
     with pg_client.PostgresClient() as cur:
         for alert in all_alerts:
-            if alert_helpers.can_check(alert):
+            if alert_helpers.can_notify(alert):
                 query, params = Build(alert)
                 try:
                     query = cur.mogrify(query, params)
@@ -161,9 +161,11 @@ def process():
                     logger.error(e)
                     cur = cur.recreate(rollback=True)
         if len(notifications) > 0:
+            notified_at = TimeUTC.now()
             cur.execute(
                 cur.mogrify(f"""UPDATE public.alerts 
-                                SET options = options||'{{"lastNotification":{TimeUTC.now()}}}'::jsonb 
+                                SET options = options||'{{"lastNotification":{notified_at}}}'::jsonb 
                                 WHERE alert_id IN %(ids)s;""", {"ids": tuple([n["alertId"] for n in notifications])}))
+            alerts_listener.set_notified(alert_ids=[n["alertId"] for n in notifications], timestamp=notified_at)
     if len(notifications) > 0:
         alerts.process_notifications(notifications)
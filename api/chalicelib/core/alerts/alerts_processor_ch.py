@@ -1,5 +1,8 @@
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from time import time
 
+from decouple import config
 from pydantic_core._pydantic_core import ValidationError
 
 import schemas
@@ -11,6 +14,16 @@ from chalicelib.core.sessions import sessions_ch as sessions
 
 logger = logging.getLogger(__name__)
 
+# Alerts checked in the same cycle are grouped by (project, source table, detection, period), each group is evaluated
+# with one query (at most ALERTS_GROUP_SIZE alerts) and ALERTS_WORKERS groups run at the same time
+ALERTS_WORKERS = config("ALERTS_WORKERS", cast=int, default=4)
+ALERTS_GROUP_SIZE = config("ALERTS_GROUP_SIZE", cast=int, default=50)
+
+evaluation_executor = ThreadPoolExecutor(max_workers=ALERTS_WORKERS, thread_name_prefix="alerts_evaluation")
+
+# Latency report of the last processing cycle
+last_cycle = {}
+
 LeftToDb = {
     schemas.AlertColumn.PERFORMANCE__DOM_CONTENT_LOADED__AVERAGE: {
         "table": lambda timestamp: f"{exp_ch_helper.get_main_events_table(timestamp)} AS pages",
@@ -155,41 +168,112 @@ def Build(a):
     return q, params
 
 
+def __source(alert):
+    if alert["seriesId"] is not None:
+        return "series"
+    return LeftToDb[alert["query"]["left"]]["table"](0)
+
+
+def plan(all_alerts, ch_cur):
+    """Formatted query of each alert to check in this cycle, grouped by (project, source, detection, period)"""
+    groups = {}
+    for alert in all_alerts:
+        if alert["query"]["left"] != "CUSTOM":
+            continue
+        if alert_helpers.can_notify(alert):
+            try:
+                query, params = Build(alert)
+                query = ch_cur.format(query=query, parameters=params)
+            except Exception as e:
+                logger.error(
+                    f"!!!Error while building alert query for alertId:{alert['alertId']} name: {alert['name']}")
+                logger.error(e)
+                continue
+            logger.debug(alert)
+            logger.debug(query)
+            key = (alert["projectId"], __source(alert), alert["detectionMethod"], alert["change"],
+                   alert["options"]["currentPeriod"])
+            groups.setdefault(key, []).append((alert, query))
+
+    groups_plan = []
+    for key, group in groups.items():
+        for i in range(0, len(group), ALERTS_GROUP_SIZE):
+            groups_plan.append((key, group[i:i + ALERTS_GROUP_SIZE]))
+    return groups_plan
+
+
+def __evaluate_one(ch_cur, alert, query):
+    try:
+        result = ch_cur.execute(query=query)
+        if len(result) > 0:
+            return result[0]
+    except Exception as e:
+        logger.error(f"!!!Error while running alert query for alertId:{alert['alertId']}")
+        logger.error(str(e))
+        logger.error(query)
+    return None
+
+
+def evaluate(group):
+    """Results of a group of alerts {alertId: {"value", "valid"}} and the time it took.
+    The alerts of a group are evaluated with one UNION ALL query, if it fails each alert is evaluated on its own
+    so a broken alert doesn't prevent the others from being checked."""
+    now = time()
+    results = {}
+    with ch_client.ClickHouseClient() as ch_cur:
+        query = " UNION ALL ".join([f"""SELECT {alert['alertId']} AS alert_id, value, valid
+                                        FROM ({alert_query}) AS alert_{i}"""
+                                    for i, (alert, alert_query) in enumerate(group)])
+        try:
+            for r in ch_cur.execute(query=query):
+                results[r["alert_id"]] = r
+        except Exception as e:
+            logger.warning(f"grouped evaluation of {len(group)} alert(s) failed, evaluating them one by one")
+            logger.warning(str(e))
+            for alert, alert_query in group:
+                results[alert["alertId"]] = __evaluate_one(ch_cur=ch_cur, alert=alert, query=alert_query)
+    return results, time() - now
+
+
 def process():
+    global last_cycle
     logger.info("> processing alerts on CH")
+    now = time()
     notifications = []
-    all_alerts = alerts_listener.get_all_alerts()
-    with pg_client.PostgresClient() as cur, ch_client.ClickHouseClient() as ch_cur:
-        for alert in all_alerts:
-            if alert["query"]["left"] != "CUSTOM":
-                continue
-            if alert_helpers.can_check(alert):
-                query, params = Build(alert)
-                try:
-                    query = ch_cur.format(query=query, parameters=params)
-                except Exception as e:
-                    logger.error(
-                        f"!!!Error while building alert query for alertId:{alert['alertId']} name: {alert['name']}")
-                    logger.error(e)
-                    continue
-                logger.debug(alert)
-                logger.debug(query)
-                try:
-                    result = ch_cur.execute(query=query)
-                    if len(result) > 0:
-                        result = result[0]
-
-                    if result["valid"]:
-                        logger.info("Valid alert, notifying users")
-                        notifications.append(alert_helpers.generate_notification(alert, result))
-                except Exception as e:
-                    logger.error(f"!!!Error while running alert query for alertId:{alert['alertId']}")
-                    logger.error(str(e))
-                    logger.error(query)
-        if len(notifications) > 0:
+    all_alerts = alerts_listener.get_due_alerts()
+    with ch_client.ClickHouseClient() as ch_cur:
+        groups = plan(all_alerts=all_alerts, ch_cur=ch_cur)
+    planning_time = time() - now
+
+    timings = []
+    for (key, group), (results, duration) in zip(groups, evaluation_executor.map(lambda g: evaluate(g[1]), groups)):
+        timings.append((duration, key, len(group)))
+        for alert, _ in group:
+            result = results.get(alert["alertId"])
+            if result is not None and result["valid"]:
+                logger.info("Valid alert, notifying users")
+                notifications.append(alert_helpers.generate_notification(alert, result))
+
+    if len(notifications) > 0:
+        with pg_client.PostgresClient() as cur:
+            notified_at = TimeUTC.now()
             cur.execute(
                 cur.mogrify(f"""UPDATE public.alerts 
-                                SET options = options||'{{"lastNotification":{TimeUTC.now()}}}'::jsonb 
+                                SET options = options||'{{"lastNotification":{notified_at}}}'::jsonb 
                                 WHERE alert_id IN %(ids)s;""", {"ids": tuple([n["alertId"] for n in notifications])}))
-    if len(notifications) > 0:
+            alerts_listener.set_notified(alert_ids=[n["alertId"] for n in notifications], timestamp=notified_at)
         alerts.process_notifications(notifications)
+
+    timings.sort(key=lambda t: t[0], reverse=True)
+    last_cycle = {"startedAt": int(now * 1000),
+                  "due": len(all_alerts),
+                  "checked": sum([t[2] for t in timings]),
+                  "groups": len(timings),
+                  "notifications": len(notifications),
+                  "planningTime": round(planning_time, 3),
+                  "maxGroupTime": round(timings[0][0], 3) if len(timings) > 0 else 0,
+                  "avgGroupTime": round(sum([t[0] for t in timings]) / len(timings), 3) if len(timings) > 0 else 0,
+                  "slowestGroups": [{"projectId": t[1][0], "source": t[1][1], "alerts": t[2], "time": round(t[0], 3)}
+                                    for t in timings[:5]],
+                  "totalTime": round(time() - now, 3)}
+    logger.info(f"> alerts cycle: {last_cycle}")
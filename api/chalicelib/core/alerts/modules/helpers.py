@@ -24,9 +24,8 @@ def __format_value(x):
     return f"{x:,}"
 
 
-def can_check(a) -> bool:
-    now = TimeUTC.now()
-
+def repetition_interval(a):
+    """Time between two checks of the alert in ms, None if its period is not supported"""
     repetitionBase = a["options"]["currentPeriod"] \
         if a["detectionMethod"] == schemas.AlertDetectionMethod.CHANGE \
            and a["options"]["currentPeriod"] > a["options"]["previousPeriod"] \
@@ -34,13 +33,26 @@ def can_check(a) -> bool:
 
     if TimeInterval.get(repetitionBase) is None:
         logger.error(f"repetitionBase: {repetitionBase} NOT FOUND")
+        return None
+    return TimeInterval[repetitionBase] * 60 * 1000
+
+
+def can_notify(a, now=None) -> bool:
+    """The renotifyInterval of the alert has passed since its last notification"""
+    now = TimeUTC.now() if now is None else now
+    return a["options"]["renotifyInterval"] <= 0 or \
+        a["options"].get("lastNotification") is None or \
+        a["options"]["lastNotification"] <= 0 or \
+        ((now - a["options"]["lastNotification"]) > a["options"]["renotifyInterval"] * 60 * 1000)
+
+
+def can_check(a) -> bool:
+    now = TimeUTC.now()
+    interval = repetition_interval(a)
+    if interval is None:
         return False
 
-    return (a["options"]["renotifyInterval"] <= 0 or
-            a["options"].get("lastNotification") is None or
-            a["options"]["lastNotification"] <= 0 or
-            ((now - a["options"]["lastNotification"]) > a["options"]["renotifyInterval"] * 60 * 1000)) \
-        and ((now - a["createdAt"]) % (TimeInterval[repetitionBase] * 60 * 1000)) < 60 * 1000
+    return can_notify(a, now=now) and ((now - a["createdAt"]) % interval) < 60 * 1000
 
 
 def generate_notification(alert, result):
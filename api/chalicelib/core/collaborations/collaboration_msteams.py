@@ -7,6 +7,7 @@ from fastapi import HTTPException, status
 import schemas
 from chalicelib.core import webhook
 from chalicelib.core.collaborations.collaboration_base import BaseCollaboration
+from chalicelib.utils import dispatcher
 
 logger = logging.getLogger(__name__)
 
@@ -80,13 +81,13 @@ class MSTeams(BaseCollaboration):
             for j in range(1, len(part), 2):
                 part.insert(j, {"text": "***"})
 
-            r = requests.post(url=integration["endpoint"],
-                              json={
-                                  "@type": "MessageCard",
-                                  "@context": "http://schema.org/extensions",
-                                  "summary": part[0]["activityTitle"],
-                                  "sections": part
-                              })
+            r = dispatcher.post(url=integration["endpoint"],
+                                json={
+                                    "@type": "MessageCard",
+                                    "@context": "http://schema.org/extensions",
+                                    "summary": part[0]["activityTitle"],
+                                    "sections": part
+                                })
             if r.status_code != 200:
                 logger.warning("!!!! something went wrong")
                 logger.warning(r.text)
@@ -7,6 +7,7 @@ from fastapi import HTTPException, status
 import schemas
 from chalicelib.core import webhook
 from chalicelib.core.collaborations.collaboration_base import BaseCollaboration
+from chalicelib.utils import dispatcher
 
 
 class Slack(BaseCollaboration):
@@ -70,7 +71,7 @@ class Slack(BaseCollaboration):
             return {"errors": ["slack integration not found"]}
         print(f"====> sending slack batch notification: {len(attachments)}")
         for i in range(0, len(attachments), 100):
-            r = requests.post(
+            r = dispatcher.post(
                 url=integration["endpoint"],
                 json={"attachments": attachments[i:i + 100]})
             if r.status_code != 200:
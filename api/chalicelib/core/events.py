@@ -1,3 +1,4 @@
+from collections import deque
 from functools import cache
 from typing import Optional
 
@@ -10,8 +11,8 @@ from chalicelib.utils.TimeUTC import TimeUTC
 from chalicelib.utils.event_filter_definition import SupportedFilter, Event
 
 
-def get_customs_by_session_id(session_id, project_id):
-    with pg_client.PostgresClient() as cur:
+def get_customs_by_session_id(session_id, project_id, cur=None):
+    with pg_client.reuse_cursor(cur) as cur:
         cur.execute(cur.mogrify("""\
             SELECT 
                 c.*,
@@ -26,77 +27,73 @@ def get_customs_by_session_id(session_id, project_id):
     return helper.dict_to_camel_case(rows)
 
 
-def __merge_cells(rows, start, count, replacement):
-    rows[start] = replacement
-    rows = rows[:start + 1] + rows[start + count:]
-    return rows
-
-
-def __get_grouped_clickrage(rows, session_id, project_id):
-    click_rage_issues = issues.get_by_session_id(session_id=session_id, issue_type="click_rage", project_id=project_id)
-    if len(click_rage_issues) == 0:
-        return rows
-
-    for c in click_rage_issues:
-        merge_count = c.get("payload")
-        if merge_count is not None:
-            merge_count = merge_count.get("Count", 3)
+def __group_clickrage(rows, click_rage_issues):
+    """Single pass over the timeline: the click at the timestamp of a click_rage issue becomes a CLICKRAGE event
+    and the next count-1 clicks are dropped"""
+    click_rages = deque(sorted((c["timestamp"], (c.get("payload") or {}).get("Count", 3))
+                               for c in click_rage_issues))
+    skip = 0
+    for row in rows:
+        if row["type"] != "CLICK":
+            yield row
+            continue
+        if skip > 0:
+            skip -= 1
+            continue
+        while len(click_rages) > 0 and click_rages[0][0] < row["timestamp"]:
+            click_rages.popleft()
+        if len(click_rages) > 0 and click_rages[0][0] == row["timestamp"]:
+            merge_count = click_rages.popleft()[1]
+            skip = merge_count - 1
+            yield {**row, "type": "CLICKRAGE", "count": merge_count}
         else:
-            merge_count = 3
-        for i in range(len(rows)):
-            if rows[i]["timestamp"] == c["timestamp"]:
-                rows = __merge_cells(rows=rows,
-                                     start=i,
-                                     count=merge_count,
-                                     replacement={**rows[i], "type": "CLICKRAGE", "count": merge_count})
-                break
-    return rows
-
-
-def get_by_session_id(session_id, project_id, group_clickrage=False, event_type: Optional[schemas.EventType] = None):
-    with pg_client.PostgresClient() as cur:
-        rows = []
-        if event_type is None or event_type == schemas.EventType.CLICK:
-            cur.execute(cur.mogrify("""\
-                SELECT 
-                    c.*,
-                    'CLICK' AS type
-                FROM events.clicks AS c
-                WHERE 
-                  c.session_id = %(session_id)s
-                ORDER BY c.timestamp;""",
-                                    {"project_id": project_id, "session_id": session_id})
-                        )
-            rows += cur.fetchall()
-            if group_clickrage:
-                rows = __get_grouped_clickrage(rows=rows, session_id=session_id, project_id=project_id)
-        if event_type is None or event_type == schemas.EventType.INPUT:
-            cur.execute(cur.mogrify("""
-                SELECT 
-                    i.*,
-                    'INPUT' AS type
-                FROM events.inputs AS i
-                WHERE 
-                  i.session_id = %(session_id)s
-                ORDER BY i.timestamp;""",
-                                    {"project_id": project_id, "session_id": session_id})
-                        )
-            rows += cur.fetchall()
-        if event_type is None or event_type == schemas.EventType.LOCATION:
-            cur.execute(cur.mogrify("""\
-                SELECT 
-                    l.*,
-                    l.path AS value,
-                    l.path AS url,
-                    'LOCATION' AS type
-                FROM events.pages AS l
-                WHERE 
-                  l.session_id = %(session_id)s
-                ORDER BY l.timestamp;""", {"project_id": project_id, "session_id": session_id}))
-            rows += cur.fetchall()
-        rows = helper.list_to_camel_case(rows)
-        rows = sorted(rows, key=lambda k: (k["timestamp"], k["messageId"]))
-    return rows
+            yield row
+
+
+def __timeline_query(event_type: Optional[schemas.EventType] = None):
+    sub_queries = []
+    if event_type is None or event_type == schemas.EventType.CLICK:
+        sub_queries.append("""SELECT c.timestamp, c.message_id, 'CLICK' AS type, to_jsonb(c) AS data
+                              FROM events.clicks AS c
+                              WHERE c.session_id = %(session_id)s""")
+    if event_type is None or event_type == schemas.EventType.INPUT:
+        sub_queries.append("""SELECT i.timestamp, i.message_id, 'INPUT' AS type, to_jsonb(i) AS data
+                              FROM events.inputs AS i
+                              WHERE i.session_id = %(session_id)s""")
+    if event_type is None or event_type == schemas.EventType.LOCATION:
+        sub_queries.append("""SELECT l.timestamp, l.message_id, 'LOCATION' AS type,
+                                     to_jsonb(l) || jsonb_build_object('value', l.path, 'url', l.path) AS data
+                              FROM events.pages AS l
+                              WHERE l.session_id = %(session_id)s""")
+    if len(sub_queries) == 0:
+        return None
+    return f"""SELECT type, data
+               FROM ({" UNION ALL ".join(sub_queries)}) AS timeline
+               ORDER BY timestamp, message_id;"""
+
+
+def iterate_by_session_id(session_id, project_id, group_clickrage=False,
+                          event_type: Optional[schemas.EventType] = None, cur=None):
+    """Clicks, inputs and pages of a session in one query ordered by the DB, the rows are streamed"""
+    query = __timeline_query(event_type)
+    if query is None:
+        return
+    with pg_client.reuse_cursor(cur) as cur:
+        click_rage_issues = []
+        if group_clickrage and (event_type is None or event_type == schemas.EventType.CLICK):
+            click_rage_issues = issues.get_by_session_id(session_id=session_id, issue_type="click_rage",
+                                                         project_id=project_id, cur=cur)
+        rows = (helper.dict_to_camel_case({**r["data"], "type": r["type"]})
+                for r in pg_client.stream(cur=cur, query=cur.mogrify(query, {"session_id": session_id})))
+        if len(click_rage_issues) > 0:
+            rows = __group_clickrage(rows=rows, click_rage_issues=click_rage_issues)
+        yield from rows
+
+
+def get_by_session_id(session_id, project_id, group_clickrage=False, event_type: Optional[schemas.EventType] = None,
+                      cur=None):
+    return list(iterate_by_session_id(session_id=session_id, project_id=project_id, group_clickrage=group_clickrage,
+                                      event_type=event_type, cur=cur))
 
 
 def _search_tags(project_id, value, key=None, source=None):
@@ -191,8 +188,8 @@ def supported_types():
     }
 
 
-def get_errors_by_session_id(session_id, project_id):
-    with pg_client.PostgresClient() as cur:
+def get_errors_by_session_id(session_id, project_id, cur=None):
+    with pg_client.reuse_cursor(cur) as cur:
         cur.execute(cur.mogrify(f"""\
                     SELECT er.*,ur.*, er.timestamp - s.start_ts AS time
                     FROM {EventType.ERROR.table} AS er INNER JOIN public.errors AS ur USING (error_id) INNER JOIN public.sessions AS s USING (session_id)
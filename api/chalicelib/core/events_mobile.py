@@ -2,12 +2,12 @@ from chalicelib.utils import pg_client, helper
 from chalicelib.core import events
 
 
-def get_customs_by_session_id(session_id, project_id):
-    return events.get_customs_by_session_id(session_id=session_id, project_id=project_id)
+def get_customs_by_session_id(session_id, project_id, cur=None):
+    return events.get_customs_by_session_id(session_id=session_id, project_id=project_id, cur=cur)
 
 
-def get_by_sessionId(session_id, project_id):
-    with pg_client.PostgresClient() as cur:
+def get_by_sessionId(session_id, project_id, cur=None):
+    with pg_client.reuse_cursor(cur) as cur:
         cur.execute(cur.mogrify(f"""
             SELECT 
                 c.*,
@@ -54,8 +54,8 @@ def get_by_sessionId(session_id, project_id):
     return rows
 
 
-def get_crashes_by_session_id(session_id):
-    with pg_client.PostgresClient() as cur:
+def get_crashes_by_session_id(session_id, cur=None):
+    with pg_client.reuse_cursor(cur) as cur:
         cur.execute(cur.mogrify(f"""
                     SELECT cr.*,uc.*, cr.timestamp - s.start_ts AS time
                     FROM {events.EventType.CRASH_MOBILE.table} AS cr 
@@ -19,8 +19,8 @@ def get(project_id, issue_id):
     return helper.dict_to_camel_case(data)
 
 
-def get_by_session_id(session_id, project_id, issue_type=None):
-    with pg_client.PostgresClient() as cur:
+def get_by_session_id(session_id, project_id, issue_type=None, cur=None):
+    with pg_client.reuse_cursor(cur) as cur:
         cur.execute(
             cur.mogrify(f"""\
                     SELECT *
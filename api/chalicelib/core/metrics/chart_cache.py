@@ -0,0 +1,120 @@
+import hashlib
+import json
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from decouple import config
+
+import schemas
+from chalicelib.utils import metrics_helper
+from chalicelib.utils.TimeUTC import TimeUTC
+
+logger = logging.getLogger(__name__)
+
+# Timeseries results cached per series, one count per density-step bucket aligned on the step size.
+# Only complete buckets are kept (ending more than CHART_CACHE_GRACE seconds ago, to let late sessions be ingested),
+# so a card viewed again only recomputes its trailing bucket(s).
+CHART_CACHE_SIZE = config("CHART_CACHE_SIZE", cast=int, default=512)
+CHART_CACHE_GRACE = config("CHART_CACHE_GRACE", cast=int, default=5 * 60)
+
+__cache = OrderedDict()
+__in_flight = {}
+__lock = threading.Lock()
+
+
+def series_key(project_id: int, data: schemas.CardSchema, series_filter: schemas.SessionsSearchPayloadSchema,
+               step_size: int) -> str:
+    payload = {"projectId": project_id, "metricType": data.metric_type, "metricOf": data.metric_of,
+               "metricValue": data.metric_value, "stepSize": step_size,
+               "filter": series_filter.model_dump(mode="json",
+                                                  exclude={"startTimestamp", "endTimestamp", "limit", "page",
+                                                           "cursor"})}
+    return hashlib.sha1(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def __get_buckets(key: str) -> dict:
+    with __lock:
+        entry = __cache.get(key)
+        if entry is None:
+            return {}
+        __cache.move_to_end(key)
+        return dict(entry["buckets"])
+
+
+def __set_buckets(key: str, buckets: dict, metric_id: int = None):
+    with __lock:
+        entry = __cache.get(key)
+        if entry is None:
+            entry = __cache[key] = {"buckets": {}, "metricIds": set()}
+        entry["buckets"] = buckets
+        if metric_id is not None:
+            entry["metricIds"].add(metric_id)
+        __cache.move_to_end(key)
+        while len(__cache) > CHART_CACHE_SIZE:
+            __cache.popitem(last=False)
+
+
+def __single_flight(key: str, compute):
+    """Identical queries running at the same time (same series on several widgets) are computed once"""
+    with __lock:
+        future = __in_flight.get(key)
+        leader = future is None
+        if leader:
+            future = __in_flight[key] = Future()
+    if not leader:
+        return future.result()
+    try:
+        result = compute()
+        future.set_result(result)
+    except Exception as e:
+        future.set_exception(e)
+        raise e
+    finally:
+        with __lock:
+            del __in_flight[key]
+    return result
+
+
+def get_series(project_id: int, data: schemas.CardSchema, series_filter: schemas.SessionsSearchPayloadSchema,
+               compute, metric_id: int = None):
+    """Timeseries of a series, with the same number of points as compute(series_filter, data.density) on buckets
+    snapped to step boundaries (the last one contains endTimestamp).
+    compute(series_filter, density) runs the query for the buckets missing from the cache."""
+    step_size = metrics_helper.get_step_size(startTimestamp=series_filter.startTimestamp,
+                                             endTimestamp=series_filter.endTimestamp,
+                                             density=data.density, factor=1)
+    if CHART_CACHE_SIZE <= 0 or step_size <= 0:
+        return compute(series_filter, data.density)
+
+    points = len(range(series_filter.startTimestamp, series_filter.endTimestamp, step_size))
+    end = series_filter.endTimestamp + (-series_filter.endTimestamp) % step_size
+    start = end - points * step_size
+    key = series_key(project_id=project_id, data=data, series_filter=series_filter, step_size=step_size)
+    buckets = __get_buckets(key)
+    missing = [t for t in range(start, end, step_size) if t not in buckets]
+    if len(missing) > 0:
+        # The query covers whole buckets from the first missing one, so its step is exactly step_size
+        series_filter = series_filter.model_copy(deep=True)
+        series_filter.startTimestamp = missing[0]
+        series_filter.endTimestamp = end
+        density = (series_filter.endTimestamp - series_filter.startTimestamp) // step_size
+        rows = __single_flight(key=f"{key}:{series_filter.startTimestamp}:{series_filter.endTimestamp}",
+                               compute=lambda: compute(series_filter, density))
+        counts = {r["timestamp"]: r["count"] for r in rows}
+        for t in missing:
+            buckets[t] = counts.get(t, 0)
+        complete_before = TimeUTC.now(delta_seconds=-CHART_CACHE_GRACE)
+        __set_buckets(key=key,
+                      buckets={t: c for t, c in buckets.items() if start <= t and t + step_size <= complete_before},
+                      metric_id=metric_id)
+    logger.debug(f"chart cache {key}: {len(missing)} bucket(s) computed")
+    return [{"timestamp": t, "count": buckets[t]} for t in range(start, end, step_size)]
+
+
+def invalidate(metric_id: int):
+    """Drops the series cached for the card metric_id, called when the card is edited or deleted"""
+    with __lock:
+        for key in [k for k, v in __cache.items() if metric_id in v["metricIds"]]:
+            del __cache[key]
@@ -1,27 +1,36 @@
 import json
 import logging
+from concurrent.futures import ThreadPoolExecutor
 
+from decouple import config
 from fastapi import HTTPException, status
 
 import schemas
 from chalicelib.core import issues
 from chalicelib.core.errors import errors
-from chalicelib.core.metrics import heatmaps, product_analytics, funnels
+from chalicelib.core.metrics import heatmaps, product_analytics, funnels, chart_cache
 from chalicelib.core.sessions import sessions, sessions_search
 from chalicelib.utils import helper, pg_client
 from chalicelib.utils.TimeUTC import TimeUTC
 
 logger = logging.getLogger(__name__)
 
+# The series of a card are queried concurrently, bounded to stay within the DB connection pools
+series_executor = ThreadPoolExecutor(max_workers=config("CHART_SERIES_WORKERS", cast=int, default=4),
+                                     thread_name_prefix="card_series")
 
-def __get_table_of_series(project_id, data: schemas.CardSchema):
-    results = []
-    for i, s in enumerate(data.series):
-        results.append(sessions.search2_table(data=s.filter, project_id=project_id, density=data.density,
-                                              metric_of=data.metric_of, metric_value=data.metric_value,
-                                              metric_format=data.metric_format))
 
-    return results
+def __map_series(function, series: list) -> list:
+    if len(series) <= 1:
+        return [function(s) for s in series]
+    return list(series_executor.map(function, series))
+
+
+def __get_table_of_series(project_id, data: schemas.CardSchema):
+    return __map_series(lambda s: sessions.search2_table(data=s.filter, project_id=project_id, density=data.density,
+                                                         metric_of=data.metric_of, metric_value=data.metric_value,
+                                                         metric_format=data.metric_format),
+                        data.series)
 
 
 def __get_funnel_chart(project: schemas.ProjectContext, data: schemas.CardFunnel, user_id: int = None):
@@ -77,18 +86,24 @@ def __get_path_analysis_chart(project: schemas.ProjectContext, user_id: int, dat
     return product_analytics.path_analysis(project_id=project.project_id, data=data)
 
 
-def __get_timeseries_chart(project: schemas.ProjectContext, data: schemas.CardTimeSeries, user_id: int = None):
-    series_charts = []
-    for i, s in enumerate(data.series):
-        series_charts.append(sessions.search2_series(data=s.filter, project_id=project.project_id, density=data.density,
-                                                     metric_type=data.metric_type, metric_of=data.metric_of,
-                                                     metric_value=data.metric_value))
-
-    results = [{}] * len(series_charts[0])
-    for i in range(len(results)):
-        for j, series_chart in enumerate(series_charts):
-            results[i] = {**results[i], "timestamp": series_chart[i]["timestamp"],
-                          data.series[j].name if data.series[j].name else j + 1: series_chart[i]["count"]}
+def __get_timeseries_chart(project: schemas.ProjectContext, data: schemas.CardTimeSeries, user_id: int = None,
+                           metric_id: int = None):
+    def compute(series_filter, density):
+        return sessions.search2_series(data=series_filter, project_id=project.project_id, density=density,
+                                       metric_type=data.metric_type, metric_of=data.metric_of,
+                                       metric_value=data.metric_value)
+
+    series_charts = __map_series(lambda s: chart_cache.get_series(project_id=project.project_id, data=data,
+                                                                  series_filter=s.filter, compute=compute,
+                                                                  metric_id=metric_id),
+                                 data.series)
+
+    # Column-wise merge: one row per timestamp, one column per series
+    results = [{"timestamp": r["timestamp"]} for r in series_charts[0]]
+    for j, series_chart in enumerate(series_charts):
+        name = data.series[j].name if data.series[j].name else j + 1
+        for row, r in zip(results, series_chart):
+            row[name] = r["count"]
     return results
 
 
@@ -152,9 +167,10 @@ def __get_table_chart(project: schemas.ProjectContext, data: schemas.CardTable,
     return supported.get(data.metric_of, not_supported)(project=project, data=data, user_id=user_id)
 
 
-def get_chart(project: schemas.ProjectContext, data: schemas.CardSchema, user_id: int):
+def get_chart(project: schemas.ProjectContext, data: schemas.CardSchema, user_id: int, metric_id: int = None):
+    if data.metric_type == schemas.MetricType.TIMESERIES:
+        return __get_timeseries_chart(project=project, data=data, user_id=user_id, metric_id=metric_id)
     supported = {
-        schemas.MetricType.TIMESERIES: __get_timeseries_chart,
         schemas.MetricType.TABLE: __get_table_chart,
         schemas.MetricType.HEAT_MAP: get_heat_map_chart,
         schemas.MetricType.FUNNEL: __get_funnel_chart,
@@ -349,6 +365,7 @@ def update_card(metric_id, user_id, project_id, data: schemas.CardSchema):
             AND (user_id = %(user_id)s OR is_public) 
             RETURNING metric_id;""", params)
         cur.execute(query)
+    chart_cache.invalidate(metric_id)
     return get_card(metric_id=metric_id, project_id=project_id, user_id=user_id)
 
 
@@ -534,6 +551,7 @@ def delete_card(project_id, metric_id, user_id):
             RETURNING data;""",
                         {"metric_id": metric_id, "project_id": project_id, "user_id": user_id})
         )
+    chart_cache.invalidate(metric_id)
 
     return {"state": "success"}
 
@@ -592,19 +610,75 @@ def get_card(metric_id, project_id, user_id, flatten: bool = True, include_data:
         row = cur.fetchone()
         if row is None:
             return None
-        row["created_at"] = TimeUTC.datetime_to_timestamp(row["created_at"])
-        row["edited_at"] = TimeUTC.datetime_to_timestamp(row["edited_at"])
-        if flatten:
-            for s in row["series"]:
-                s["filter"] = helper.old_search_payload_to_flat(s["filter"])
-        row = helper.dict_to_camel_case(row)
-        if row["metricType"] == schemas.MetricType.PATH_ANALYSIS:
-            row = __get_path_analysis_attributes(row=row)
-        row = __get_global_attributes(row=row)
-        row.pop("cardInfo")
+    return __process_card(row=row, flatten=flatten)
+
+
+def __process_card(row, flatten: bool = True):
+    row["created_at"] = TimeUTC.datetime_to_timestamp(row["created_at"])
+    row["edited_at"] = TimeUTC.datetime_to_timestamp(row["edited_at"])
+    if flatten:
+        for s in row["series"]:
+            s["filter"] = helper.old_search_payload_to_flat(s["filter"])
+    row = helper.dict_to_camel_case(row)
+    if row["metricType"] == schemas.MetricType.PATH_ANALYSIS:
+        row = __get_path_analysis_attributes(row=row)
+    row = __get_global_attributes(row=row)
+    row.pop("cardInfo")
     return row
 
 
+def get_dashboard_cards(project_id, user_id, dashboard_id):
+    """Cards of the widgets of a dashboard as get_card(include_data=True) returns them, with their widgetId.
+    Returns None if the dashboard doesn't exist."""
+    with pg_client.PostgresClient() as cur:
+        query = cur.mogrify(
+            """SELECT dashboard_widgets.widget_id, metrics.metric_id, metrics.project_id, metrics.user_id, 
+                      metrics.name, metrics.is_public, metrics.created_at, metrics.deleted_at, metrics.edited_at, 
+                      metrics.metric_type, metrics.view_type, metrics.metric_of, metrics.metric_value, 
+                      metrics.metric_format, metrics.is_pinned, metrics.default_config, 
+                      metrics.default_config AS config, series, metrics.card_info, metrics.data
+               FROM dashboards
+                        LEFT JOIN dashboard_widgets USING (dashboard_id)
+                        LEFT JOIN metrics ON (metrics.metric_id = dashboard_widgets.metric_id
+                                              AND metrics.deleted_at ISNULL
+                                              AND (metrics.project_id = %(project_id)s OR metrics.project_id ISNULL)
+                                              AND (metrics.user_id = %(user_id)s OR metrics.is_public))
+                        LEFT JOIN LATERAL (SELECT COALESCE(jsonb_agg(metric_series.* ORDER BY index),'[]'::jsonb) AS series
+                                           FROM metric_series
+                                           WHERE metric_series.metric_id = metrics.metric_id
+                                             AND metric_series.deleted_at ISNULL
+                                           ) AS metric_series ON (TRUE)
+               WHERE dashboards.deleted_at ISNULL
+                 AND dashboards.project_id = %(project_id)s
+                 AND dashboard_id = %(dashboard_id)s
+                 AND (dashboards.user_id = %(user_id)s OR dashboards.is_public)
+               ORDER BY dashboard_widgets.widget_id;""",
+            {"dashboard_id": dashboard_id, "project_id": project_id, "user_id": user_id}
+        )
+        cur.execute(query)
+        rows = cur.fetchall()
+    if len(rows) == 0:
+        return None
+    cards = []
+    for row in rows:
+        if row["metric_id"] is None:
+            continue
+        widget_id = row.pop("widget_id")
+        cards.append({"widgetId": widget_id, **__process_card(row=row)})
+    return cards
+
+
+def card_payload_key(card: dict) -> str:
+    """Identical for cards that compute the same chart (only names, ids and display settings differ)"""
+    payload = {k: v for k, v in card.items()
+               if k not in ("widgetId", "metricId", "projectId", "userId", "name", "isPublic", "isPinned",
+                            "createdAt", "editedAt", "deletedAt", "viewType", "defaultConfig", "config",
+                            "thumbnail")}
+    payload["series"] = [{"name": s.get("name"), "index": s.get("index"), "filter": s.get("filter")}
+                         for s in card.get("series", [])]
+    return json.dumps(payload, sort_keys=True, default=str)
+
+
 def get_series_for_alert(project_id, user_id):
     with pg_client.PostgresClient() as cur:
         cur.execute(
@@ -674,8 +748,11 @@ def get_funnel_sessions_by_issue(user_id, project_id, metric_id, issue_id,
                 "issue": issue}
 
 
-def make_chart_from_card(project: schemas.ProjectContext, user_id, metric_id, data: schemas.CardSessionsSchema):
-    raw_metric: dict = get_card(metric_id=metric_id, project_id=project.project_id, user_id=user_id, include_data=True)
+def make_chart_from_card(project: schemas.ProjectContext, user_id, metric_id, data: schemas.CardSessionsSchema,
+                         raw_metric: dict = None):
+    if raw_metric is None:
+        raw_metric = get_card(metric_id=metric_id, project_id=project.project_id, user_id=user_id,
+                              include_data=True)
 
     if raw_metric is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="card not found")
@@ -694,7 +771,7 @@ def make_chart_from_card(project: schemas.ProjectContext, user_id, metric_id, da
                                                  data=schemas.HeatMapSessionsSearch(**metric.model_dump()),
                                                  user_id=user_id)
 
-    return get_chart(project=project, data=metric, user_id=user_id)
+    return get_chart(project=project, data=metric, user_id=user_id, metric_id=metric_id)
 
 
 def card_exists(metric_id, project_id, user_id) -> bool:
@@ -1,4 +1,10 @@
 import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from decouple import config
+from fastapi.encoders import jsonable_encoder
 
 import schemas
 from chalicelib.core.metrics import custom_metrics
@@ -6,6 +12,12 @@ from chalicelib.utils import helper
 from chalicelib.utils import pg_client
 from chalicelib.utils.TimeUTC import TimeUTC
 
+logger = logging.getLogger(__name__)
+
+# Widgets of a rendered dashboard are evaluated concurrently (their series also run on custom_metrics' pool)
+render_executor = ThreadPoolExecutor(max_workers=config("DASHBOARD_RENDER_WORKERS", cast=int, default=4),
+                                     thread_name_prefix="dashboard_render")
+
 
 def create_dashboard(project_id, user_id, data: schemas.CreateDashboardSchema):
     with pg_client.PostgresClient() as cur:
@@ -209,6 +221,41 @@ def create_metric_add_widget(project: schemas.ProjectContext, user_id, dashboard
     return add_widget(project_id=project.project_id, user_id=user_id, dashboard_id=dashboard_id,
                       data=schemas.AddWidgetToDashboardPayloadSchema(metricId=metric_id))
 
+
+def __render_card(project: schemas.ProjectContext, user_id, card: dict, data: schemas.CardSessionsSchema):
+    start = time.perf_counter()
+    try:
+        result = {"data": custom_metrics.make_chart_from_card(project=project, user_id=user_id,
+                                                              metric_id=card["metricId"], data=data,
+                                                              raw_metric=card)}
+    except Exception as e:
+        logger.error(f"failed to render card {card['metricId']}", exc_info=e)
+        result = {"errors": [getattr(e, "detail", None) or str(e)]}
+    result["time"] = round((time.perf_counter() - start) * 1000)
+    return result
+
+
+def render_dashboard(project: schemas.ProjectContext, user_id, dashboard_id, data: schemas.CardSessionsSchema):
+    """Evaluates all the widgets of a dashboard concurrently and yields one NDJSON line per widget, as soon as it is
+    done, with its computation time in ms. Widgets of cards computing the same chart are evaluated once."""
+    cards = custom_metrics.get_dashboard_cards(project_id=project.project_id, user_id=user_id,
+                                               dashboard_id=dashboard_id)
+    if cards is None:
+        yield json.dumps({"errors": ["dashboard not found"]}) + "\n"
+        return
+    widgets = {}
+    for card in cards:
+        widget = {"widgetId": card.pop("widgetId"), "metricId": card["metricId"]}
+        widgets.setdefault(custom_metrics.card_payload_key(card), {"card": card, "widgets": []})["widgets"] \
+            .append(widget)
+    futures = {render_executor.submit(__render_card, project=project, user_id=user_id, card=w["card"],
+                                      data=data.model_copy(deep=True)): w["widgets"]
+               for w in widgets.values()}
+    for future in as_completed(futures):
+        result = jsonable_encoder(future.result())
+        for widget in futures[future]:
+            yield json.dumps({**widget, **result}) + "\n"
+
 # def make_chart_widget(dashboard_id, project_id, user_id, widget_id, data: schemas.CardChartSchema):
 #     raw_metric = get_widget(widget_id=widget_id, project_id=project_id, user_id=user_id, dashboard_id=dashboard_id)
 #     if raw_metric is None:
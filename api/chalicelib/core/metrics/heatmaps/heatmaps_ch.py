@@ -84,7 +84,7 @@ def get_by_url(project_id, data: schemas.GetHeatMapPayloadSchema):
         logger.debug(query)
         logger.debug("---------")
         try:
-            rows = cur.execute(query=query)
+            rows = cur.execute(query=query, camel_case=True)
         except Exception as err:
             logger.warning("--------- HEATMAP 2 SEARCH QUERY EXCEPTION CH -----------")
             logger.warning(query)
@@ -93,7 +93,7 @@ def get_by_url(project_id, data: schemas.GetHeatMapPayloadSchema):
             logger.warning("--------------------")
             raise err
 
-        return helper.list_to_camel_case(rows)
+        return rows
 
 
 def get_x_y_by_url_and_session_id(project_id, session_id, data: schemas.GetHeatMapPayloadSchema):
@@ -122,7 +122,7 @@ def get_x_y_by_url_and_session_id(project_id, session_id, data: schemas.GetHeatM
         logger.debug(query)
         logger.debug("---------")
         try:
-            rows = cur.execute(query=query)
+            rows = cur.execute(query=query, camel_case=True)
         except Exception as err:
             logger.warning("--------- HEATMAP-session_id SEARCH QUERY EXCEPTION CH -----------")
             logger.warning(query)
@@ -131,7 +131,7 @@ def get_x_y_by_url_and_session_id(project_id, session_id, data: schemas.GetHeatM
             logger.warning("--------------------")
             raise err
 
-        return helper.list_to_camel_case(rows)
+        return rows
 
 
 def get_selectors_by_url_and_session_id(project_id, session_id, data: schemas.GetHeatMapPayloadSchema):
@@ -160,7 +160,7 @@ def get_selectors_by_url_and_session_id(project_id, session_id, data: schemas.Ge
         logger.debug(query)
         logger.debug("---------")
         try:
-            rows = cur.execute(query=query)
+            rows = cur.execute(query=query, camel_case=True)
         except Exception as err:
             logger.warning("--------- HEATMAP-session_id SEARCH QUERY EXCEPTION CH -----------")
             logger.warning(query)
@@ -169,7 +169,7 @@ def get_selectors_by_url_and_session_id(project_id, session_id, data: schemas.Ge
             logger.warning("--------------------")
             raise err
 
-        return helper.list_to_camel_case(rows)
+        return rows
 
 
 # use CH
@@ -380,6 +380,5 @@ def get_page_events(session_id, project_id):
                                 ORDER BY created_at,message_id;""",
                            parameters={"session_id": session_id, "project_id": project_id})
 
-        rows = cur.execute(query=query)
-        rows = helper.list_to_camel_case(rows)
+        rows = cur.execute(query=query, camel_case=True)
     return rows
@@ -1,9 +1,9 @@
 import logging
 import math
-import warnings
 from collections import defaultdict
 from typing import List
 
+import numpy as np
 from psycopg2.extras import RealDictRow
 
 import schemas
@@ -454,206 +454,187 @@ def get_simple_funnel(filter_d: schemas.CardSeriesFilterSchema, project: schemas
     return stages_list
 
 
-def pearson_corr(x: list, y: list):
-    n = len(x)
-    if n != len(y):
-        raise ValueError(f'x and y must have the same length. Got {len(x)} and {len(y)} instead')
+# Funnel rows are processed as numpy columns: one row per (session, issue) pair, stage timestamps as float64 with NaN
+# for missing stages (ms timestamps are exact in float64), ids as dense int codes with -1 for NULL.
+# The correlations are computed for all the issues at once on a rows x issues matrix, summing in row order
+# (cumsum is sequential) so the results are identical to the previous row-by-row implementation.
+CORR_CHUNK_CELLS = 4_000_000
 
-    if n < 2:
-        warnings.warn(f'x and y must have length at least 2. Got {n} instead')
-        return None, None, False
-
-    # If an input is constant, the correlation coefficient is not defined.
-    if all(t == x[0] for t in x) or all(t == y[0] for t in y):
-        warnings.warn("An input array is constant; the correlation coefficent is not defined.")
-        return None, None, False
-
-    if n == 2:
-        return math.copysign(1, x[1] - x[0]) * math.copysign(1, y[1] - y[0]), 1.0, True
 
-    xmean = sum(x) / len(x)
-    ymean = sum(y) / len(y)
+def __codes(values):
+    """Dense int codes of values in order of first appearance (-1 for None), and the values of the codes"""
+    index = {}
+    codes = np.fromiter((-1 if v is None else index.setdefault(v, len(index)) for v in values),
+                        dtype=np.int64, count=len(values))
+    return codes, list(index)
 
-    xm = [el - xmean for el in x]
-    ym = [el - ymean for el in y]
 
-    normxm = math.sqrt((sum([xm[i] * xm[i] for i in range(len(xm))])))
-    normym = math.sqrt((sum([ym[i] * ym[i] for i in range(len(ym))])))
-
-    threshold = 1e-8
-    if normxm < threshold * abs(xmean) or normym < threshold * abs(ymean):
-        # If all the values in x (likewise y) are very close to the mean,
-        # the loss of precision that occurs in the subtraction xm = x - xmean
-        # might result in large errors in r.
-        warnings.warn("An input array is constant; the correlation coefficent is not defined.")
+def rows_to_columns(rows: List[RealDictRow], n_stages) -> dict:
+    columns = {f"stage{i}_timestamp": np.array([r[f"stage{i}_timestamp"] for r in rows], dtype=np.float64)
+               for i in range(1, n_stages + 1)}
+    columns["n_rows"] = len(rows)
+    if len(rows) == 0:
+        return columns
+    columns["issue_timestamp"] = np.array([r["issue_timestamp"] for r in rows], dtype=np.float64)
+    columns["issue_type"] = [r["issue_type"] for r in rows]
+    columns["issue_context"] = [r["issue_context"] for r in rows]
+    for key in ("session_id", "issue_id", "user_uuid", "user_id"):
+        if key in rows[0]:
+            columns[key], columns[f"{key}_values"] = __codes([r[key] for r in rows])
+    return columns
 
-    r = sum(
-        i[0] * i[1] for i in zip([xm[i] / normxm for i in range(len(xm))], [ym[i] / normym for i in range(len(ym))]))
 
-    # Presumably, if abs(r) > 1, then it is only some small artifact of  floating point arithmetic.
-    # However, if r < 0, we don't care, as our problem is to find only positive correlations
-    r = max(min(r, 1.0), 0.0)
+def __count_distinct(codes, mask):
+    codes = codes[mask]
+    return np.unique(codes[codes >= 0]).size
 
-    # approximated confidence
-    if n < 31:
-        t_c = T_VALUES[n]
-    elif n < 50:
-        t_c = 2.02
-    else:
-        t_c = 2
-    if r >= 0.999:
-        confidence = 1
-    else:
-        confidence = r * math.sqrt(n - 2) / math.sqrt(1 - r ** 2)
 
-    if confidence > SIGNIFICANCE_THRSH:
-        return r, confidence, True
-    else:
-        return r, confidence, False
+def __count_distinct_per_group(groups, codes, n_groups):
+    """Number of distinct non-null codes per group"""
+    keep = codes >= 0
+    n_codes = codes.max(initial=0) + 1
+    pairs = np.unique(groups[keep] * n_codes + codes[keep])
+    return np.bincount(pairs // n_codes, minlength=n_groups)
 
 
-# def tuple_or(t: tuple):
-#     x = 0
-#     for el in t:
-#         x |= el # | is for bitwise OR
-#     return x
-#
-# The following function is correct optimization of the previous function because t is a list of 0,1
-def tuple_or(t: tuple):
-    for el in t:
-        if el > 0:
-            return 1
-    return 0
+def pearson_corr(x: np.ndarray, ys: np.ndarray):
+    """Correlation of the binary vector x with each binary column of ys, as (r, confidence, is_significant) tuples.
+    Only positive correlations are kept (r is clipped to [0, 1]), r is None if an input is constant."""
+    n, k = ys.shape
+    if n < 2:
+        return [(None, None, False)] * k
+    s_x = int(x.sum())
+    s_ys = ys.sum(axis=0)
+    constant = (s_ys == 0) | (s_ys == n)
+    if s_x == 0 or s_x == n:
+        return [(None, None, False)] * k
+    if n == 2:
+        return [(None, None, False) if constant[j]
+                else (math.copysign(1, x[1] - x[0]) * math.copysign(1, int(ys[1, j]) - int(ys[0, j])), 1.0, True)
+                for j in range(k)]
+
+    xm = x - s_x / n
+    normxm = math.sqrt(np.cumsum(xm * xm)[-1])
+    xn = xm / normxm
+    r_all = np.empty(k)
+    chunk = max(1, CORR_CHUNK_CELLS // n)
+    for start in range(0, k, chunk):
+        ym = ys[:, start:start + chunk].astype(np.float64) - s_ys[start:start + chunk] / n
+        normym = np.sqrt(np.cumsum(ym * ym, axis=0)[-1])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            r_all[start:start + chunk] = np.cumsum(xn[:, None] * (ym / normym), axis=0)[-1]
+
+    results = []
+    for j in range(k):
+        if constant[j]:
+            results.append((None, None, False))
+            continue
+        # Presumably, if abs(r) > 1, then it is only some small artifact of  floating point arithmetic.
+        # However, if r < 0, we don't care, as our problem is to find only positive correlations
+        r = max(min(float(r_all[j]), 1.0), 0.0)
+        if r >= 0.999:
+            confidence = 1
+        else:
+            confidence = r * math.sqrt(n - 2) / math.sqrt(1 - r ** 2)
+        results.append((r, confidence, confidence > SIGNIFICANCE_THRSH))
+    return results
 
 
-def get_transitions_and_issues_of_each_type(rows: List[RealDictRow], all_issues, first_stage, last_stage):
+def get_transitions_and_issues_of_each_type(columns: dict, all_issues, first_stage, last_stage):
     """
-    Returns two lists with binary values 0/1:
+    Returns binary numpy arrays, over the rows that reached the first stage:
 
-    transitions ::: if transited from the first stage to the last - 1
+    transitions ::: 1 if transited from the first stage to the last
                     else - 0
-    errors      ::: a dictionary WHERE the keys are all unique issues (currently context-wise)
-                    the values are lists
-                    if an issue happened between the first stage to the last - 1
+    errors      ::: rows x issues boolean matrix (issues in all_issues order),
+                    1 if the issue of the row happened between the first stage and the last
                     else - 0
 
-    For a small task of calculating a total drop due to issues,
-    we need to disregard the issue type when creating the `errors`-like array.
-    The `all_errors` array can be obtained by logical OR statement applied to all errors by issue
-    The `transitions` array stays the same
+    all_errors is the logical OR of errors over the issues, used to calculate the total drop due to issues
+    regardless of the issue type. n_sess_affected is the number of rows with an issue that transited.
     """
-    transitions = []
-    n_sess_affected = 0
-    errors = {}
-
-    for row in rows:
-        t = 0
-        first_ts = row[f'stage{first_stage}_timestamp']
-        last_ts = row[f'stage{last_stage}_timestamp']
-        if first_ts is None:
-            continue
-        elif last_ts is not None:
-            t = 1
-        transitions.append(t)
-
-        ic_present = False
-        for error_id in all_issues:
-            if error_id not in errors:
-                errors[error_id] = []
-            ic = 0
-            row_issue_id = row['issue_id']
-            if row_issue_id is not None:
-                if last_ts is None or (first_ts < row['issue_timestamp'] < last_ts):
-                    if error_id == row_issue_id:
-                        ic = 1
-                        ic_present = True
-            errors[error_id].append(ic)
-
-        if ic_present and t:
-            n_sess_affected += 1
-
-    all_errors = [tuple_or(t) for t in zip(*errors.values())]
+    first_ts = columns[f"stage{first_stage}_timestamp"]
+    last_ts = columns[f"stage{last_stage}_timestamp"]
+    reached = ~np.isnan(first_ts)
+    transitions = (~np.isnan(last_ts[reached])).astype(np.float64)
+
+    codes = {issue_id: code for code, issue_id in enumerate(columns["issue_id_values"])}
+    issue_index = np.full(len(codes) + 1, -1, dtype=np.int64)
+    for i, issue_id in enumerate(all_issues):
+        issue_index[codes[issue_id]] = i
+    issue_ts = columns["issue_timestamp"][reached]
+    in_range = np.isnan(last_ts[reached]) | ((first_ts[reached] < issue_ts) & (issue_ts < last_ts[reached]))
+    row_issue = issue_index[columns["issue_id"][reached]]  # code -1 (NULL) maps to the last cell: -1
+    has_error = in_range & (row_issue >= 0)
+
+    errors = np.zeros((transitions.size, len(all_issues)), dtype=bool)
+    errors[np.flatnonzero(has_error), row_issue[has_error]] = True
+    all_errors = has_error
+    n_sess_affected = int(np.count_nonzero(has_error & (transitions > 0)))
 
     return transitions, errors, all_errors, n_sess_affected
 
 
-def get_affected_users_for_all_issues(rows, first_stage, last_stage):
+def get_affected_users_for_all_issues(columns: dict, first_stage, last_stage):
     """
-
-    :param rows:
-    :param first_stage:
-    :param last_stage:
-    :return:
+    Issues that happened between the first and the last stage (in order of appearance), with their number of
+    occurrences, affected users (None if no known user) and affected sessions
     """
-    affected_users = defaultdict(lambda: set())
-    affected_sessions = defaultdict(lambda: set())
-    all_issues = {}
     n_affected_users_dict = defaultdict(lambda: None)
     n_affected_sessions_dict = defaultdict(lambda: None)
     n_issues_dict = defaultdict(lambda: 0)
-    issues_by_session = defaultdict(lambda: 0)
-
-    for row in rows:
-
-        # check that the session has reached the first stage of subfunnel:
-        if row[f'stage{first_stage}_timestamp'] is None:
-            continue
-
-        iss = row['issue_type']
-        iss_ts = row['issue_timestamp']
-
-        # check that the issue exists and belongs to subfunnel:
-        if iss is not None and (row[f'stage{last_stage}_timestamp'] is None or
-                                (row[f'stage{first_stage}_timestamp'] < iss_ts < row[f'stage{last_stage}_timestamp'])):
-            if row["issue_id"] not in all_issues:
-                all_issues[row["issue_id"]] = {"context": row['issue_context'], "issue_type": row["issue_type"]}
-            n_issues_dict[row["issue_id"]] += 1
-            if row['user_uuid'] is not None:
-                affected_users[row["issue_id"]].add(row['user_uuid'])
-
-            affected_sessions[row["issue_id"]].add(row['session_id'])
-            issues_by_session[row[f'session_id']] += 1
+    if columns["n_rows"] == 0:
+        return {}, n_issues_dict, n_affected_users_dict, n_affected_sessions_dict
+    first_ts = columns[f"stage{first_stage}_timestamp"]
+    last_ts = columns[f"stage{last_stage}_timestamp"]
+    issue_ts = columns["issue_timestamp"]
+    has_issue = np.fromiter((t is not None for t in columns["issue_type"]), dtype=bool, count=columns["n_rows"])
+    affected = ~np.isnan(first_ts) & has_issue & (columns["issue_id"] >= 0) \
+               & (np.isnan(last_ts) | ((first_ts < issue_ts) & (issue_ts < last_ts)))
+
+    affected_rows = np.flatnonzero(affected)
+    issue_codes = columns["issue_id"][affected]
+    codes, first_seen = np.unique(issue_codes, return_index=True)
+    order = np.argsort(first_seen)
+    codes, first_rows = codes[order], affected_rows[first_seen[order]]
+    n_codes = len(columns["issue_id_values"])
+    occurrences = np.bincount(issue_codes, minlength=n_codes)
+    sessions = __count_distinct_per_group(issue_codes, columns["session_id"][affected], n_codes)
+    users = __count_distinct_per_group(issue_codes, columns["user_uuid"][affected], n_codes)
 
-    if len(affected_users) > 0:
-        n_affected_users_dict.update({
-            iss: len(affected_users[iss]) for iss in affected_users
-        })
-    if len(affected_sessions) > 0:
-        n_affected_sessions_dict.update({
-            iss: len(affected_sessions[iss]) for iss in affected_sessions
-        })
+    all_issues = {}
+    for code, row in zip(codes.tolist(), first_rows.tolist()):
+        issue_id = columns["issue_id_values"][code]
+        all_issues[issue_id] = {"context": columns["issue_context"][row], "issue_type": columns["issue_type"][row]}
+        n_issues_dict[issue_id] = int(occurrences[code])
+        n_affected_sessions_dict[issue_id] = int(sessions[code])
+        if users[code] > 0:
+            n_affected_users_dict[issue_id] = int(users[code])
     return all_issues, n_issues_dict, n_affected_users_dict, n_affected_sessions_dict
 
 
-def count_sessions(rows, n_stages):
-    session_counts = {i: set() for i in range(1, n_stages + 1)}
-    for row in rows:
-        for i in range(1, n_stages + 1):
-            if row[f"stage{i}_timestamp"] is not None:
-                session_counts[i].add(row[f"session_id"])
-
-    session_counts = {i: len(session_counts[i]) for i in session_counts}
-    return session_counts
+def count_sessions(columns: dict, n_stages):
+    if columns["n_rows"] == 0:
+        return {i: 0 for i in range(1, n_stages + 1)}
+    return {i: __count_distinct(columns["session_id"], ~np.isnan(columns[f"stage{i}_timestamp"]))
+            for i in range(1, n_stages + 1)}
 
 
-def count_users(rows, n_stages, user_key="user_uuid"):
-    users_in_stages = {i: set() for i in range(1, n_stages + 1)}
-    for row in rows:
-        for i in range(1, n_stages + 1):
-            if row[f"stage{i}_timestamp"] is not None and row[user_key] is not None:
-                users_in_stages[i].add(row[user_key])
-
-    users_count = {i: len(users_in_stages[i]) for i in range(1, n_stages + 1)}
-    return users_count
+def count_users(columns: dict, n_stages, user_key="user_uuid"):
+    if columns["n_rows"] == 0:
+        return {i: 0 for i in range(1, n_stages + 1)}
+    return {i: __count_distinct(columns[user_key], ~np.isnan(columns[f"stage{i}_timestamp"]))
+            for i in range(1, n_stages + 1)}
 
 
 def get_stages(stages, rows,
                metric_format: schemas.MetricExtendedFormatType = schemas.MetricExtendedFormatType.SESSION_COUNT):
     n_stages = len(stages)
+    columns = rows_to_columns(rows, n_stages)
     if metric_format == schemas.MetricExtendedFormatType.SESSION_COUNT:
-        base_counts = count_sessions(rows, n_stages)
+        base_counts = count_sessions(columns, n_stages)
     else:
-        base_counts = count_users(rows, n_stages, user_key="user_id")
+        base_counts = count_users(columns, n_stages, user_key="user_id")
 
     stages_list = []
     for i, stage in enumerate(stages):
@@ -705,19 +686,21 @@ def get_issues(stages, rows, first_stage=None, last_stage=None, drop_only=False)
     n_critical_issues = 0
     issues_dict = {"significant": [],
                    "insignificant": []}
-    session_counts = count_sessions(rows, n_stages)
+    columns = rows_to_columns(rows, n_stages)
+    del rows
+    session_counts = count_sessions(columns, n_stages)
     drop = session_counts[first_stage] - session_counts[last_stage]
 
     all_issues, n_issues_dict, affected_users_dict, affected_sessions = get_affected_users_for_all_issues(
-        rows, first_stage, last_stage)
-    transitions, errors, all_errors, n_sess_affected = get_transitions_and_issues_of_each_type(rows,
+        columns, first_stage, last_stage)
+    if len(all_issues) == 0:
+        return 0 if drop_only else (n_critical_issues, issues_dict, 0)
+    transitions, errors, all_errors, n_sess_affected = get_transitions_and_issues_of_each_type(columns,
                                                                                                all_issues,
                                                                                                first_stage, last_stage)
 
-    del rows
-
-    if any(all_errors):
-        total_drop_corr, conf, is_sign = pearson_corr(transitions, all_errors)
+    if all_errors.any():
+        total_drop_corr, conf, is_sign = pearson_corr(transitions, all_errors[:, None])[0]
         if total_drop_corr is not None and drop is not None:
             total_drop_due_to_issues = int(total_drop_corr * n_sess_affected)
         else:
@@ -727,11 +710,13 @@ def get_issues(stages, rows, first_stage=None, last_stage=None, drop_only=False)
 
     if drop_only:
         return total_drop_due_to_issues
-    for issue_id in all_issues:
+    correlations = pearson_corr(transitions, errors)
+    has_errors = errors.any(axis=0)
+    for j, issue_id in enumerate(all_issues):
 
-        if not any(errors[issue_id]):
+        if not has_errors[j]:
             continue
-        r, confidence, is_sign = pearson_corr(transitions, errors[issue_id])
+        r, confidence, is_sign = correlations[j]
 
         if r is not None and drop is not None and is_sign:
             lost_conversions = int(r * affected_sessions[issue_id])
@@ -10,40 +10,51 @@ from chalicelib.utils import sql_helper as sh
 logger = logging.getLogger(__name__)
 
 
+JOURNEY_COLUMNS = ("event_number_in_session", "event_type", "e_value", "next_type", "next_value", "sessions_count")
+
+
 def __transform_journey(rows, reverse_path=False):
+    return __build_journey(steps=[tuple(r[c] for c in JOURNEY_COLUMNS) for r in rows], reverse_path=reverse_path)
+
+
+def __transform_journey_columns(columns, reverse_path=False):
+    """Same as __transform_journey for a columnar result ({column name: numpy array})"""
+    return __build_journey(steps=list(zip(*[columns[c].tolist() for c in JOURNEY_COLUMNS])), reverse_path=reverse_path)
+
+
+def __build_journey(steps, reverse_path=False):
     total_100p = 0
-    for r in rows:
-        if r["event_number_in_session"] > 1:
+    for event_number, _, _, _, _, sessions_count in steps:
+        if event_number > 1:
             break
-        total_100p += r["sessions_count"]
+        total_100p += sessions_count
 
-    nodes = []
+    # node key -> index in nodes_values
+    nodes = {}
     nodes_values = []
     links = []
-    drops = []
+    drops = {}
     max_depth = 0
-    for r in rows:
-        r["value"] = r["sessions_count"] * 100 / total_100p
-        source = f"{r['event_number_in_session'] - 1}_{r['event_type']}_{r['e_value']}"
-        if source not in nodes:
-            nodes.append(source)
-            nodes_values.append({"depth": r['event_number_in_session'] - 1,
-                                 "name": r['e_value'],
-                                 "eventType": r['event_type'],
-                                 "id": len(nodes_values)})
+    for event_number, event_type, e_value, next_type, next_value, sessions_count in steps:
+        source = f"{event_number - 1}_{event_type}_{e_value}"
+        sr_idx = nodes.get(source)
+        if sr_idx is None:
+            sr_idx = nodes[source] = len(nodes_values)
+            nodes_values.append({"depth": event_number - 1,
+                                 "name": e_value,
+                                 "eventType": event_type,
+                                 "id": sr_idx})
 
-        target = f"{r['event_number_in_session']}_{r['next_type']}_{r['next_value']}"
-        if target not in nodes:
-            nodes.append(target)
-            nodes_values.append({"depth": r['event_number_in_session'],
-                                 "name": r['next_value'],
-                                 "eventType": r['next_type'],
-                                 "id": len(nodes_values)})
+        target = f"{event_number}_{next_type}_{next_value}"
+        tg_idx = nodes.get(target)
+        if tg_idx is None:
+            tg_idx = nodes[target] = len(nodes_values)
+            nodes_values.append({"depth": event_number,
+                                 "name": next_value,
+                                 "eventType": next_type,
+                                 "id": tg_idx})
 
-        sr_idx = nodes.index(source)
-        tg_idx = nodes.index(target)
-
-        link = {"eventType": r['event_type'], "sessionsCount": r["sessions_count"], "value": r["value"]}
+        link = {"eventType": event_type, "sessionsCount": sessions_count, "value": sessions_count * 100 / total_100p}
         if not reverse_path:
             link["source"] = sr_idx
             link["target"] = tg_idx
@@ -52,31 +63,26 @@ def __transform_journey(rows, reverse_path=False):
             link["target"] = sr_idx
         links.append(link)
 
-        max_depth = r['event_number_in_session']
-        if r["next_type"] == "DROP":
-            for d in drops:
-                if d["depth"] == r['event_number_in_session']:
-                    d["sessions_count"] += r["sessions_count"]
-                    break
-            else:
-                drops.append({"depth": r['event_number_in_session'], "sessions_count": r["sessions_count"]})
+        max_depth = event_number
+        if next_type == "DROP":
+            drops[event_number] = drops.get(event_number, 0) + sessions_count
 
+    drops = [{"depth": depth, "sessions_count": sessions_count} for depth, sessions_count in drops.items()]
     for i in range(len(drops)):
 
         if drops[i]["depth"] < max_depth:
             source = f"{drops[i]['depth']}_DROP_None"
             target = f"{drops[i]['depth'] + 1}_DROP_None"
-            sr_idx = nodes.index(source)
+            sr_idx = nodes[source]
 
             if i < len(drops) - 1 and drops[i]["depth"] + 1 == drops[i + 1]["depth"]:
-                tg_idx = nodes.index(target)
+                tg_idx = nodes[target]
             else:
-                nodes.append(target)
+                tg_idx = nodes[target] = len(nodes_values)
                 nodes_values.append({"depth": drops[i]["depth"] + 1,
                                      "name": None,
                                      "eventType": "DROP",
-                                     "id": len(nodes_values)})
-                tg_idx = len(nodes) - 1
+                                     "id": tg_idx})
 
             link = {"eventType": "DROP",
                     "sessionsCount": drops[i]["sessions_count"],
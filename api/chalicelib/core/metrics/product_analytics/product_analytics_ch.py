@@ -3,7 +3,7 @@ from time import time
 
 import schemas
 from chalicelib.core import metadata
-from .product_analytics import __transform_journey
+from .product_analytics import __transform_journey_columns
 from chalicelib.utils import ch_client, exp_ch_helper
 from chalicelib.utils import helper
 from chalicelib.utils import sql_helper as sh
@@ -627,13 +627,13 @@ FROM ranked_events
                 ORDER BY event_number_in_session, sessions_count DESC;"""
         logger.debug("---------Q3-----------")
         ch_query3 = ch.format(query=ch_query3, parameters=params)
-        rows = ch.execute(query=ch_query3)
+        columns = ch.execute_columns(query=ch_query3)
         if time() - _now > 2:
             logger.warning(f">>>>>>>>>PathAnalysis long query EE ({int(time() - _now)}s)<<<<<<<<<")
             logger.warning(str.encode(ch_query3))
             logger.warning("----------------------")
 
-    return __transform_journey(rows=rows, reverse_path=reverse)
+    return __transform_journey_columns(columns=columns, reverse_path=reverse)
 
 #
 # def __compute_weekly_percentage(rows):
@@ -4,7 +4,7 @@ from typing import List, Union
 import schemas
 from chalicelib.core import events, metadata
 from . import performance_event, sessions_legacy
-from chalicelib.utils import pg_client, helper, metrics_helper, ch_client, exp_ch_helper
+from chalicelib.utils import pg_client, helper, metrics_helper, ch_client, exp_ch_helper, query_templates
 from chalicelib.utils import sql_helper as sh
 
 logger = logging.getLogger(__name__)
@@ -33,28 +33,29 @@ def search2_series(data: schemas.SessionsSearchPayloadSchema, project_id: int, d
     sessions = []
     with ch_client.ClickHouseClient() as cur:
         if metric_type == schemas.MetricType.TIMESERIES:
+            # each session goes to the step containing it, empty steps are added by complete_missing_steps
             if metric_of == schemas.MetricOfTimeseries.SESSION_COUNT:
-                query = f"""SELECT gs.generate_series AS timestamp,
-                                   COALESCE(COUNT(DISTINCT processed_sessions.session_id),0) AS count
-                            FROM generate_series(%(startDate)s, %(endDate)s, %(step_size)s) AS gs
-                                LEFT JOIN (SELECT s.session_id AS session_id,
-                                                s.datetime AS datetime
-                                            {query_part}) AS processed_sessions ON(TRUE)
-                            WHERE processed_sessions.datetime >= toDateTime(timestamp / 1000)
-                                AND processed_sessions.datetime < toDateTime((timestamp + %(step_size)s) / 1000)
+                query = f"""SELECT %(startDate)s + intDiv(toUnixTimestamp(processed_sessions.datetime) * 1000 - %(startDate)s,
+                                                          %(step_size)s) * %(step_size)s AS timestamp,
+                                   COUNT(DISTINCT processed_sessions.session_id) AS count
+                            FROM (SELECT s.session_id AS session_id,
+                                         s.datetime AS datetime
+                                    {query_part}) AS processed_sessions
+                            WHERE processed_sessions.datetime >= toDateTime(%(startDate)s / 1000)
+                                AND processed_sessions.datetime <= toDateTime(%(endDate)s / 1000)
                             GROUP BY timestamp
                             ORDER BY timestamp;"""
             elif metric_of == schemas.MetricOfTimeseries.USER_COUNT:
-                query = f"""SELECT gs.generate_series AS timestamp,
-                                COALESCE(COUNT(DISTINCT processed_sessions.user_id),0) AS count
-                            FROM generate_series(%(startDate)s, %(endDate)s, %(step_size)s) AS gs
-                                LEFT JOIN (SELECT multiIf(s.user_id IS NOT NULL AND s.user_id != '', s.user_id,
-                                                         s.user_anonymous_id IS NOT NULL AND s.user_anonymous_id != '', 
-                                                         s.user_anonymous_id, toString(s.user_uuid)) AS user_id,
-                                                s.datetime AS datetime
-                                            {query_part}) AS processed_sessions ON(TRUE)
-                            WHERE processed_sessions.datetime >= toDateTime(timestamp / 1000)
-                                AND processed_sessions.datetime < toDateTime((timestamp + %(step_size)s) / 1000)
+                query = f"""SELECT %(startDate)s + intDiv(toUnixTimestamp(processed_sessions.datetime) * 1000 - %(startDate)s,
+                                                          %(step_size)s) * %(step_size)s AS timestamp,
+                                   COUNT(DISTINCT processed_sessions.user_id) AS count
+                            FROM (SELECT multiIf(s.user_id IS NOT NULL AND s.user_id != '', s.user_id,
+                                                 s.user_anonymous_id IS NOT NULL AND s.user_anonymous_id != '', 
+                                                 s.user_anonymous_id, toString(s.user_uuid)) AS user_id,
+                                         s.datetime AS datetime
+                                    {query_part}) AS processed_sessions
+                            WHERE processed_sessions.datetime >= toDateTime(%(startDate)s / 1000)
+                                AND processed_sessions.datetime <= toDateTime(%(endDate)s / 1000)
                             GROUP BY timestamp
                             ORDER BY timestamp;"""
             else:
@@ -337,16 +338,32 @@ def json_condition(table_alias, json_column, json_key, op, values, value_key, ch
     return " AND ".join(conditions)
 
 
-# this function generates the query and return the generated-query with the dict of query arguments
+# returns the generated-query with the dict of query arguments, compiled once per payload shape
 def search_query_parts_ch(data: schemas.SessionsSearchPayloadSchema, error_status, errors_only, favorite_only, issue,
                           project_id, user_id, platform="web", extra_event=None, extra_deduplication=[],
                           extra_conditions=None):
+    # added before the cache lookup so the issue filter is part of the template's shape
     if issue:
         data.filters.append(
             schemas.SessionSearchFilterSchema(value=[issue['type']],
                                               type=schemas.FilterType.ISSUE.value,
                                               operator=schemas.SearchEventOperator.IS.value)
         )
+    # the main tables can depend on the time range, which is not part of the template's shape
+    tables = [exp_ch_helper.get_main_events_table(timestamp=data.startTimestamp, platform=platform),
+              exp_ch_helper.get_main_sessions_table(data.startTimestamp)]
+    return query_templates.compile_query_parts(builder=build_query_parts_ch, data=data, shape=tables,
+                                               error_status=error_status, errors_only=errors_only,
+                                               favorite_only=favorite_only, issue=issue,
+                                               project_id=project_id, user_id=user_id, platform=platform,
+                                               extra_event=extra_event, extra_deduplication=extra_deduplication,
+                                               extra_conditions=extra_conditions)
+
+
+# this function generates the query and return the generated-query with the dict of query arguments
+def build_query_parts_ch(data: schemas.SessionsSearchPayloadSchema, error_status, errors_only, favorite_only, issue,
+                         project_id, user_id, platform="web", extra_event=None, extra_deduplication=[],
+                         extra_conditions=None):
     ss_constraints = []
     full_args = {"project_id": project_id, "startDate": data.startTimestamp, "endDate": data.endTimestamp,
                  "projectId": project_id, "userId": user_id}
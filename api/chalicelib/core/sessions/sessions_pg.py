@@ -4,7 +4,7 @@ from typing import List, Union
 import schemas
 from chalicelib.core import events, metadata
 from . import performance_event
-from chalicelib.utils import pg_client, helper, metrics_helper
+from chalicelib.utils import pg_client, helper, metrics_helper, query_templates
 from chalicelib.utils import sql_helper as sh
 
 logger = logging.getLogger(__name__)
@@ -286,9 +286,18 @@ def __is_valid_event(is_any: bool, event: schemas.SessionSearchEventSchema2):
                         event.filters is None or len(event.filters) == 0))
 
 
-# this function generates the query and return the generated-query with the dict of query arguments
+# returns the generated-query with the dict of query arguments, compiled once per payload shape
 def search_query_parts(data: schemas.SessionsSearchPayloadSchema, error_status, errors_only, favorite_only, issue,
                        project_id, user_id, platform="web", extra_event=None, extra_conditions=None):
+    return query_templates.compile_query_parts(builder=build_query_parts, data=data, error_status=error_status,
+                                               errors_only=errors_only, favorite_only=favorite_only, issue=issue,
+                                               project_id=project_id, user_id=user_id, platform=platform,
+                                               extra_event=extra_event, extra_conditions=extra_conditions)
+
+
+# this function generates the query and return the generated-query with the dict of query arguments
+def build_query_parts(data: schemas.SessionsSearchPayloadSchema, error_status, errors_only, favorite_only, issue,
+                      project_id, user_id, platform="web", extra_event=None, extra_conditions=None):
     ss_constraints = []
     full_args = {"project_id": project_id, "startDate": data.startTimestamp, "endDate": data.endTimestamp,
                  "projectId": project_id, "userId": user_id}
@@ -1,3 +1,10 @@
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from decouple import config
+
 import schemas
 from chalicelib.core import events, metadata, events_mobile, \
     issues, assist, canvas, user_testing
@@ -6,6 +13,12 @@ from chalicelib.core.errors.modules import errors_helper
 from chalicelib.utils import pg_client, helper
 from chalicelib.core.modules import MOB_KEY, get_file_key
 
+logger = logging.getLogger(__name__)
+
+# the urls, canvas, user-testing and live lookups of a replay are independent, they run at the same time
+replay_executor = ThreadPoolExecutor(max_workers=config("REPLAY_WORKERS", cast=int, default=8),
+                                     thread_name_prefix="replay")
+
 
 def __is_mobile_session(platform):
     return platform in ('ios', 'android')
@@ -26,8 +39,23 @@ def get_pre_replay(project_id, session_id):
         'domURL': [sessions_mobs.get_first_url(project_id=project_id, session_id=session_id, check_existence=False)]}
 
 
+def __timed(function, **kwargs):
+    start = time.time()
+    result = function(**kwargs)
+    return result, int((time.time() - start) * 1000)
+
+
+def __get_utx_video(session_id, project_id):
+    if user_testing.has_test_signals(session_id=session_id, project_id=project_id):
+        return user_testing.get_ux_webcam_signed_url(session_id=session_id, project_id=project_id,
+                                                     check_existence=False)
+    return []
+
+
 def get_replay(project_id, session_id, context: schemas.CurrentContext, full_data=False, include_fav_viewed=False,
-               group_metadata=False, live=True):
+               group_metadata=False, live=True, check_live=True):
+    """check_live=False leaves the assist call to the caller, live is then None"""
+    start = time.time()
     with pg_client.PostgresClient() as cur:
         extra_query = []
         if include_fav_viewed:
@@ -56,36 +84,43 @@ def get_replay(project_id, session_id, context: schemas.CurrentContext, full_dat
         cur.execute(query=query)
 
         data = cur.fetchone()
-        if data is not None:
-            data = helper.dict_to_camel_case(data)
-            if full_data:
-                if __is_mobile_session(data["platform"]):
-                    data['mobsUrl'] = []
-                    data['videoURL'] = sessions_mobs.get_mobile_videos(session_id=session_id, project_id=project_id,
-                                                                       check_existence=False)
-                else:
-                    data['mobsUrl'] = sessions_mobs.get_urls_depercated(session_id=session_id, check_existence=False)
-                    data['devtoolsURL'] = sessions_devtool.get_urls(session_id=session_id, project_id=project_id,
-                                                                    context=context, check_existence=False)
-                    data['canvasURL'] = canvas.get_canvas_presigned_urls(session_id=session_id, project_id=project_id)
-                    if user_testing.has_test_signals(session_id=session_id, project_id=project_id):
-                        data['utxVideo'] = user_testing.get_ux_webcam_signed_url(session_id=session_id,
-                                                                                 project_id=project_id,
-                                                                                 check_existence=False)
-                    else:
-                        data['utxVideo'] = []
-
-                data['domURL'] = sessions_mobs.get_urls(session_id=session_id, project_id=project_id,
-                                                        check_existence=False)
-                data['metadata'] = __group_metadata(project_metadata=data.pop("projectMetadata"), session=data)
-                data['live'] = live and assist.is_live(project_id=project_id, session_id=session_id,
-                                                       project_key=data["projectKey"])
-            data["inDB"] = True
-            return data
-        elif live:
+    timings = {"session": int((time.time() - start) * 1000)}
+    if data is None:
+        if live:
             return assist.get_live_session_by_id(project_id=project_id, session_id=session_id)
+        return None
+
+    data = helper.dict_to_camel_case(data)
+    if full_data:
+        stages = {"domURL": (sessions_mobs.get_urls,
+                             {"session_id": session_id, "project_id": project_id, "check_existence": False})}
+        if __is_mobile_session(data["platform"]):
+            data['mobsUrl'] = []
+            stages["videoURL"] = (sessions_mobs.get_mobile_videos,
+                                  {"session_id": session_id, "project_id": project_id, "check_existence": False})
         else:
-            return None
+            stages["mobsUrl"] = (sessions_mobs.get_urls_depercated,
+                                 {"session_id": session_id, "check_existence": False})
+            stages["devtoolsURL"] = (sessions_devtool.get_urls,
+                                     {"session_id": session_id, "project_id": project_id, "context": context,
+                                      "check_existence": False})
+            stages["canvasURL"] = (canvas.get_canvas_presigned_urls,
+                                   {"session_id": session_id, "project_id": project_id})
+            stages["utxVideo"] = (__get_utx_video, {"session_id": session_id, "project_id": project_id})
+        if live and check_live:
+            stages["live"] = (assist.is_live,
+                              {"project_id": project_id, "session_id": session_id,
+                               "project_key": data["projectKey"]})
+        else:
+            data['live'] = None if live else False
+        futures = {k: replay_executor.submit(__timed, function, **kwargs) for k, (function, kwargs) in stages.items()}
+        for k, future in futures.items():
+            data[k], timings[k] = future.result()
+        data['metadata'] = __group_metadata(project_metadata=data.pop("projectMetadata"), session=data)
+    data["inDB"] = True
+    timings["total"] = int((time.time() - start) * 1000)
+    logger.debug(f"replay {session_id} timings (ms): {timings}")
+    return data
 
 
 def get_events(project_id, session_id):
@@ -104,36 +139,58 @@ def get_events(project_id, session_id):
             s_data = helper.dict_to_camel_case(s_data)
             data = {}
             if __is_mobile_session(s_data["platform"]):
-                data['events'] = events_mobile.get_by_sessionId(project_id=project_id, session_id=session_id)
+                data['events'] = events_mobile.get_by_sessionId(project_id=project_id, session_id=session_id,
+                                                                cur=cur)
                 for e in data['events']:
                     if e["type"].endswith("_IOS"):
                         e["type"] = e["type"][:-len("_IOS")]
                     elif e["type"].endswith("_MOBILE"):
                         e["type"] = e["type"][:-len("_MOBILE")]
-                data['crashes'] = events_mobile.get_crashes_by_session_id(session_id=session_id)
+                data['crashes'] = events_mobile.get_crashes_by_session_id(session_id=session_id, cur=cur)
                 data['userEvents'] = events_mobile.get_customs_by_session_id(project_id=project_id,
-                                                                             session_id=session_id)
+                                                                             session_id=session_id, cur=cur)
                 data['userTesting'] = []
             else:
                 data['events'] = events.get_by_session_id(project_id=project_id, session_id=session_id,
-                                                          group_clickrage=True)
-                all_errors = events.get_errors_by_session_id(session_id=session_id, project_id=project_id)
+                                                          group_clickrage=True, cur=cur)
+                all_errors = events.get_errors_by_session_id(session_id=session_id, project_id=project_id, cur=cur)
                 data['stackEvents'] = [e for e in all_errors if e['source'] != "js_exception"]
                 # to keep only the first stack
                 # limit the number of errors to reduce the response-body size
                 data['errors'] = [errors_helper.format_first_stack_frame(e) for e in all_errors
                                   if e['source'] == "js_exception"][:500]
                 data['userEvents'] = events.get_customs_by_session_id(project_id=project_id,
-                                                                      session_id=session_id)
-                data['userTesting'] = user_testing.get_test_signals(session_id=session_id, project_id=project_id)
+                                                                      session_id=session_id, cur=cur)
+                data['userTesting'] = user_testing.get_test_signals(session_id=session_id, project_id=project_id,
+                                                                    cur=cur)
 
-            data['issues'] = issues.get_by_session_id(session_id=session_id, project_id=project_id)
+            data['issues'] = issues.get_by_session_id(session_id=session_id, project_id=project_id, cur=cur)
             data['issues'] = reduce_issues(data['issues'])
             return data
         else:
             return None
 
 
+def get_events_timeline(project_id, session_id):
+    """NDJSON lines of the clicks, inputs and pages of a web session, read by batches through a server-side cursor:
+    they are encoded before the connection is released, so it is not held while the response is streamed.
+    None if the session is not found."""
+    with pg_client.PostgresClient() as cur:
+        cur.execute(cur.mogrify("""SELECT platform
+                                   FROM public.sessions AS s
+                                   WHERE s.project_id = %(project_id)s
+                                     AND s.session_id = %(session_id)s;""",
+                                {"project_id": project_id, "session_id": session_id}))
+        s_data = cur.fetchone()
+        if s_data is None:
+            return None
+        if __is_mobile_session(s_data["platform"]):
+            return {"errors": [f"events timeline is not supported for {s_data['platform']} sessions"]}
+        return [json.dumps(e) + "\n"
+                for e in events.iterate_by_session_id(project_id=project_id, session_id=session_id,
+                                                      group_clickrage=True, cur=cur)]
+
+
 # To reduce the number of issues in the replay;
 # will be removed once we agree on how to show issues
 def reduce_issues(issues_list):
@@ -1,5 +1,10 @@
+import base64
+import json
 import logging
 
+from decouple import config
+from fastapi import HTTPException, status
+
 import schemas
 from chalicelib.core import metadata, projects
 from . import sessions_favorite, sessions_legacy
@@ -7,6 +12,9 @@ from chalicelib.utils import pg_client, helper
 
 logger = logging.getLogger(__name__)
 
+# Approximate counts stop counting after SESSIONS_COUNT_CAP sessions
+SESSIONS_COUNT_CAP = config("SESSIONS_COUNT_CAP", cast=int, default=10000)
+
 SESSION_PROJECTION_BASE_COLS = """s.project_id,
 s.session_id::text AS session_id,
 s.user_uuid,
@@ -37,6 +45,42 @@ COALESCE((SELECT TRUE
    AND fs.user_id = %(userId)s LIMIT 1), FALSE) AS viewed """
 
 
+def encode_cursor(sort_value, key) -> str:
+    return base64.urlsafe_b64encode(json.dumps([sort_value, key]).encode()).decode()
+
+
+def decode_cursor(cursor: str):
+    """(sort value, key) of the last row of the previous page, (None, None) for the first page"""
+    if cursor is None or len(cursor) == 0:
+        return None, None
+    try:
+        sort_value, key = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor.")
+    return sort_value, key
+
+
+def keyset_condition(sort_expr: str, key_expr: str, op: str, cursor_sort) -> str:
+    """Condition of the rows after the cursor, for pages ordered by sort_expr NULLS LAST then key_expr:
+    the sort column can be NULL, a plain (sort_expr, key_expr) comparison would never match these rows"""
+    if cursor_sort is None:
+        return f"{sort_expr} IS NULL AND {key_expr} {op} %(cursor_key)s"
+    return f"({sort_expr} IS NULL OR ({sort_expr}, {key_expr}) {op} (%(cursor_sort)s, %(cursor_key)s))"
+
+
+def keyset_page(rows: list, limit: int):
+    """Rows of the page and the cursor of the next one, limit+1 rows are fetched to know if there is a next page.
+    Rows have a sort_key and a cursor_key (unique tie-breaker) column."""
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]["sort_key"], rows[-1]["cursor_key"])
+    for r in rows:
+        r.pop("sort_key")
+        r.pop("cursor_key")
+    return rows, next_cursor
+
+
 # This function executes the query and return result
 def search_sessions(data: schemas.SessionsSearchPayloadSchema, project: schemas.ProjectContext,
                     user_id, errors_only=False, error_status=schemas.ErrorStatus.ALL,
@@ -63,6 +107,13 @@ def search_sessions(data: schemas.SessionsSearchPayloadSchema, project: schemas.
         full_args["sessions_limit"] = 200
         full_args["sessions_limit_s"] = 0
         full_args["sessions_limit_e"] = 200
+    # keyset mode: only the rows of the page are read, the total comes from count_sessions
+    keyset = data.cursor is not None and not (errors_only or count_only or ids_only)
+    if keyset:
+        full_args["sessions_limit_keyset"] = full_args["sessions_limit"] + 1
+        cursor_sort, cursor_key = decode_cursor(data.cursor)
+        full_args["cursor_sort"] = cursor_sort
+        full_args["cursor_key"] = cursor_key
 
     meta_keys = []
     with pg_client.PostgresClient() as cur:
@@ -78,6 +129,33 @@ def search_sessions(data: schemas.SessionsSearchPayloadSchema, project: schemas.
             main_query = cur.mogrify(f"""SELECT COUNT(DISTINCT s.session_id) AS count_sessions, 
                                                 COUNT(DISTINCT s.user_uuid) AS count_users
                                         {query_part};""", full_args)
+        elif keyset and data.group_by_user:
+            g_sort = "count(full_sessions)"
+            sort = 'start_ts'
+            if data.sort is not None and data.sort != 'sessionsCount':
+                sort = helper.key_to_snake_case(data.sort)
+                g_sort = f"{'MIN' if data.order == schemas.SortOrderType.DESC else 'MAX'}({sort})"
+            op = "<" if data.order == schemas.SortOrderType.DESC else ">"
+            user_key = "COALESCE(user_id, '')"
+            meta_keys = metadata.get(project_id=project.project_id)
+            main_query = cur.mogrify(f"""SELECT *, {user_key} AS cursor_key
+                                        FROM (SELECT user_id,
+                                                 count(full_sessions)                                   AS user_sessions_count,
+                                                 jsonb_agg(full_sessions) FILTER (WHERE rn <= 1)        AS last_session,
+                                                 MIN(full_sessions.start_ts)                            AS first_session_ts,
+                                                 {g_sort}                                               AS sort_key
+                                            FROM (SELECT *, ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY {sort} {data.order}) AS rn 
+                                                FROM (SELECT DISTINCT ON(s.session_id) {SESSION_PROJECTION_COLS} 
+                                                                    {"," if len(meta_keys) > 0 else ""}{",".join([f'metadata_{m["index"]}' for m in meta_keys])}
+                                                    {query_part}
+                                                    ) AS filtred_sessions
+                                                ) AS full_sessions
+                                                GROUP BY user_id
+                                            ) AS users_sessions
+                                        {f"WHERE {keyset_condition('sort_key', user_key, op, cursor_sort)}" if cursor_key is not None else ""}
+                                        ORDER BY sort_key {data.order} NULLS LAST, {user_key} {data.order}
+                                        LIMIT %(sessions_limit_keyset)s;""",
+                                     full_args)
         elif data.group_by_user:
             g_sort = "count(full_sessions)"
             if data.order is None:
@@ -114,6 +192,25 @@ def search_sessions(data: schemas.SessionsSearchPayloadSchema, project: schemas.
                                              ORDER BY s.session_id desc
                                              LIMIT %(sessions_limit)s OFFSET %(sessions_limit_s)s;""",
                                      full_args)
+        elif keyset:
+            sort = 'session_id'
+            if data.sort is not None and data.sort != "session_id":
+                if data.sort == 'datetime':
+                    sort = 'start_ts'
+                else:
+                    sort = helper.key_to_snake_case(data.sort)
+            op = "<" if data.order == schemas.SortOrderType.DESC else ">"
+            if cursor_key is not None:
+                query_part += f" AND {keyset_condition(f's.{sort}', 's.session_id', op, cursor_sort)}"
+            meta_keys = metadata.get(project_id=project.project_id)
+            # DISTINCT ON the sort key lets the ORDER BY ... LIMIT stop after the page instead of sorting everything
+            main_query = cur.mogrify(f"""SELECT DISTINCT ON(s.{sort}, s.session_id) {SESSION_PROJECTION_COLS},
+                                                s.{sort} AS sort_key, s.session_id AS cursor_key
+                                                {"," if len(meta_keys) > 0 else ""}{",".join([f'metadata_{m["index"]}' for m in meta_keys])}
+                                        {query_part}
+                                        ORDER BY s.{sort} {data.order} NULLS LAST, s.session_id {data.order}
+                                        LIMIT %(sessions_limit_keyset)s;""",
+                                     full_args)
         else:
             if data.order is None:
                 data.order = schemas.SortOrderType.DESC.value
@@ -139,11 +236,12 @@ def search_sessions(data: schemas.SessionsSearchPayloadSchema, project: schemas.
                                             ORDER BY {sort} {data.order}, issue_score DESC) AS full_sessions;""",
                                      full_args)
         logger.debug("--------------------")
+        logger.debug(f"query template: {full_args.get('query_template')}")
         logger.debug(main_query)
         logger.debug("--------------------")
         try:
             cur.execute(main_query)
-            sessions = cur.fetchone()
+            sessions = cur.fetchall() if keyset else cur.fetchone()
         except Exception as err:
             logger.warning("--------- SESSIONS SEARCH QUERY EXCEPTION -----------")
             logger.warning(main_query.decode('UTF-8'))
@@ -157,8 +255,12 @@ def search_sessions(data: schemas.SessionsSearchPayloadSchema, project: schemas.
         if count_only:
             return helper.dict_to_camel_case(sessions)
 
-        total = sessions["count"]
-        sessions = sessions["sessions"]
+        if keyset:
+            total = None
+            sessions, next_cursor = keyset_page(rows=sessions, limit=full_args["sessions_limit"])
+        else:
+            total = sessions["count"]
+            sessions = sessions["sessions"]
 
     if data.group_by_user:
         for i, s in enumerate(sessions):
@@ -173,11 +275,44 @@ def search_sessions(data: schemas.SessionsSearchPayloadSchema, project: schemas.
     # if not data.group_by_user and data.sort is not None and data.sort != "session_id":
     #     sessions = sorted(sessions, key=lambda s: s[helper.key_to_snake_case(data.sort)],
     #                       reverse=data.order.upper() == "DESC")
-    return {
+    result = {
         'total': total,
         'sessions': helper.list_to_camel_case(sessions),
         'src': 1
     }
+    if keyset:
+        result['nextCursor'] = next_cursor
+    return result
+
+
+def count_sessions(data: schemas.SessionsSearchPayloadSchema, project: schemas.ProjectContext, user_id,
+                   approximate=False, platform="web"):
+    """Total of a search, loaded separately from the keyset pages.
+    With approximate, counting stops after SESSIONS_COUNT_CAP sessions."""
+    if data.bookmarked:
+        data.startTimestamp, data.endTimestamp = sessions_favorite.get_start_end_timestamp(project.project_id, user_id)
+    if data.startTimestamp is None:
+        return {"total": 0, "approximate": False}
+    full_args, query_part = sessions_legacy.search_query_parts(data=data, error_status=schemas.ErrorStatus.ALL,
+                                                               errors_only=False, favorite_only=data.bookmarked,
+                                                               issue=None, project_id=project.project_id,
+                                                               user_id=user_id, platform=platform)
+    full_args["count_cap"] = SESSIONS_COUNT_CAP + 1
+    with pg_client.PostgresClient() as cur:
+        if approximate:
+            main_query = cur.mogrify(f"""SELECT COUNT(*) AS count_sessions
+                                        FROM (SELECT DISTINCT s.session_id
+                                              {query_part}
+                                              LIMIT %(count_cap)s) AS capped_sessions;""", full_args)
+        else:
+            main_query = cur.mogrify(f"""SELECT COUNT(DISTINCT s.session_id) AS count_sessions
+                                        {query_part};""", full_args)
+        logger.debug(main_query)
+        cur.execute(main_query)
+        total = cur.fetchone()["count_sessions"]
+    if approximate and total > SESSIONS_COUNT_CAP:
+        return {"total": SESSIONS_COUNT_CAP, "approximate": True}
+    return {"total": total, "approximate": False}
 
 
 def search_by_metadata(tenant_id, user_id, m_key, m_value, project_id=None):
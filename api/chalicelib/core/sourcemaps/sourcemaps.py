@@ -1,3 +1,8 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urlparse
 
 import requests
@@ -6,6 +11,48 @@ from decouple import config
 from chalicelib.core.sourcemaps import sourcemaps_parser
 from chalicelib.utils.storage import StorageClient, generators
 
+# Files of a stack are resolved concurrently (existence checks, sourcemap-reader calls and JS sources downloads)
+SOURCEMAPS_WORKERS = config("SOURCEMAPS_WORKERS", cast=int, default=8)
+SOURCEMAPS_CACHE_TTL = config("SOURCEMAPS_CACHE_TTL", cast=int, default=10 * 60)
+
+executor = ThreadPoolExecutor(max_workers=SOURCEMAPS_WORKERS, thread_name_prefix="sourcemaps")
+
+
+class LRUCache:
+    """Thread-safe LRU of at most size entries, each one expiring ttl seconds after it was set"""
+
+    def __init__(self, size, ttl=SOURCEMAPS_CACHE_TTL):
+        self.size = size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return default
+            if entry[0] < time.time():
+                del self.entries[key]
+                return default
+            self.entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (time.time() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+
+# sourcemap key -> (exists in bucket, exists in server, URL to use)
+exists_cache = LRUCache(size=config("SOURCEMAPS_EXISTS_CACHE_SIZE", cast=int, default=2000))
+# (sourcemap key, line, column) -> original position returned by the sourcemap-reader
+positions_cache = LRUCache(size=config("SOURCEMAPS_POSITIONS_CACHE_SIZE", cast=int, default=20000))
+# JS cache path -> JSSource (None if it doesn't exist)
+sources_cache = LRUCache(size=config("SOURCEMAPS_SOURCES_CACHE_SIZE", cast=int, default=32))
+
 
 def presign_share_urls(project_id, urls):
     results = []
@@ -77,15 +124,48 @@ def url_exists(url):
         return False
 
 
+def __check_exists(key, file_url):
+    """(exists in bucket, exists in server, URL to use) of the sourcemap of file_url"""
+    cached = exists_cache.get(key)
+    if cached is not None:
+        return cached
+    file_exists_in_server = False
+    file_exists_in_bucket = len(file_url) > 0 and StorageClient.exists(config('sourcemaps_bucket'), key)
+    if len(file_url) > 0 and not file_exists_in_bucket:
+        print(f"{file_url} sourcemap (key '{key}') doesn't exist in S3 looking in server")
+        if not file_url.endswith(".map"):
+            file_url += '.map'
+        file_exists_in_server = url_exists(file_url)
+        file_exists_in_bucket = file_exists_in_server
+    result = (file_exists_in_bucket, file_exists_in_server, file_url)
+    exists_cache.set(key, result)
+    return result
+
+
+def __get_original_positions(key, file_url, is_url, positions):
+    """Original position of each position, resolved by the sourcemap-reader unless it is cached"""
+    results = [positions_cache.get((key, p["line"], p["column"])) for p in positions]
+    missing = [i for i, r in enumerate(results) if r is None]
+    if len(missing) > 0:
+        key_results = sourcemaps_parser.get_original_trace(key=file_url if is_url else key,
+                                                           positions=[positions[i] for i in missing],
+                                                           is_url=is_url)
+        if key_results is None:
+            return None
+        for i, r in zip(missing, key_results):
+            positions_cache.set((key, positions[i]["line"], positions[i]["column"]), r)
+            results[i] = r
+    return [copy.deepcopy(r) for r in results]
+
+
 def get_traces_group(project_id, payload):
     frames = format_payload(payload)
 
     results = [{}] * len(frames)
     payloads = {}
+    file_urls = {}
     all_exists = True
     for i, u in enumerate(frames):
-        file_exists_in_bucket = False
-        file_exists_in_server = False
         file_url = u["absPath"]
         key = generators.generate_file_key_from_url(project_id, file_url)  # use filename instead?
         params_idx = file_url.find("?")
@@ -95,33 +175,32 @@ def get_traces_group(project_id, payload):
             payloads[key] = None
 
         if key not in payloads:
-            file_exists_in_bucket = len(file_url) > 0 and StorageClient.exists(config('sourcemaps_bucket'), key)
-            if len(file_url) > 0 and not file_exists_in_bucket:
-                print(f"{u['absPath']} sourcemap (key '{key}') doesn't exist in S3 looking in server")
-                if not file_url.endswith(".map"):
-                    file_url += '.map'
-                file_exists_in_server = url_exists(file_url)
-                file_exists_in_bucket = file_exists_in_server
-            all_exists = all_exists and file_exists_in_bucket
-            if not file_exists_in_bucket and not file_exists_in_server:
-                print(f"{u['absPath']} sourcemap (key '{key}') doesn't exist in S3 nor server")
-                payloads[key] = None
-            else:
-                payloads[key] = []
+            file_urls[key] = file_url
+            payloads[key] = []
         results[i] = dict(u)
         results[i]["frame"] = dict(u)
         if payloads[key] is not None:
-            payloads[key].append({"resultIndex": i, "frame": dict(u), "URL": file_url,
-                                  "position": {"line": u["lineNo"], "column": u["colNo"]},
-                                  "isURL": file_exists_in_server})
+            payloads[key].append({"resultIndex": i, "frame": dict(u),
+                                  "position": {"line": u["lineNo"], "column": u["colNo"]}})
 
-    for key in payloads.keys():
-        if payloads[key] is None:
-            continue
-        key_results = sourcemaps_parser.get_original_trace(
-            key=payloads[key][0]["URL"] if payloads[key][0]["isURL"] else key,
-            positions=[o["position"] for o in payloads[key]],
-            is_url=payloads[key][0]["isURL"])
+    keys = [key for key in file_urls.keys() if payloads[key] is not None]
+    sources = {}
+    for key, (file_exists, file_exists_in_server, file_url) in \
+            zip(keys, executor.map(lambda k: __check_exists(key=k, file_url=file_urls[k]), keys)):
+        all_exists = all_exists and file_exists
+        if not file_exists and not file_exists_in_server:
+            print(f"{file_urls[key]} sourcemap (key '{key}') doesn't exist in S3 nor server")
+            payloads[key] = None
+        else:
+            sources[key] = (file_url, file_exists_in_server)
+
+    keys = list(sources.keys())
+    for key, key_results in zip(keys,
+                                executor.map(lambda k: __get_original_positions(key=k, file_url=sources[k][0],
+                                                                                is_url=sources[k][1],
+                                                                                positions=[o["position"]
+                                                                                           for o in payloads[k]]),
+                                             keys)):
         if key_results is None:
             all_exists = False
             continue
@@ -143,23 +222,51 @@ def get_js_cache_path(fullURL):
 MAX_COLUMN_OFFSET = 60
 
 
+class JSSource:
+    """A JS file with the offset of each of its lines, to get a line without splitting the whole file"""
+
+    def __init__(self, source: str):
+        self.source = source
+        self.offsets = [0]
+        i = source.find("\n")
+        while i > -1:
+            self.offsets.append(i + 1)
+            i = source.find("\n", i + 1)
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def line(self, index: int) -> str:
+        if index < 0:
+            index += len(self.offsets)
+        end = self.offsets[index + 1] - 1 if index + 1 < len(self.offsets) else len(self.source)
+        return self.source[self.offsets[index]:end]
+
+
+def __get_js_source(file_abs_path):
+    file_path = get_js_cache_path(file_abs_path)
+    source = sources_cache.get(file_path, default=False)
+    if source is not False:
+        return source
+    file = StorageClient.get_file(config('js_cache_bucket'), file_path)
+    if file is None:
+        print(f"Missing abs_path: {file_abs_path}, file {file_path} not found in {config('js_cache_bucket')}")
+        source = None
+    else:
+        source = JSSource(file)
+    sources_cache.set(file_path, source)
+    return source
+
+
 def fetch_missed_contexts(frames):
-    source_cache = {}
-    for i in range(len(frames)):
-        if frames[i] and frames[i].get("context") and len(frames[i]["context"]) > 0:
-            continue
-        file_abs_path = frames[i]["frame"]["absPath"]
-        if file_abs_path in source_cache:
-            file = source_cache[file_abs_path]
-        else:
-            file_path = get_js_cache_path(file_abs_path)
-            file = StorageClient.get_file(config('js_cache_bucket'), file_path)
-            if file is None:
-                print(f"Missing abs_path: {file_abs_path}, file {file_path} not found in {config('js_cache_bucket')}")
-            source_cache[file_abs_path] = file
-        if file is None:
+    missing = [i for i in range(len(frames))
+               if not (frames[i] and frames[i].get("context") and len(frames[i]["context"]) > 0)]
+    abs_paths = list({frames[i]["frame"]["absPath"] for i in missing})
+    source_cache = dict(zip(abs_paths, executor.map(__get_js_source, abs_paths)))
+    for i in missing:
+        lines = source_cache[frames[i]["frame"]["absPath"]]
+        if lines is None:
             continue
-        lines = file.split("\n")
 
         if frames[i]["lineNo"] is None:
             print("no original-source found for frame in sourcemap results")
@@ -176,7 +283,7 @@ def fetch_missed_contexts(frames):
             print(f"line number {l} greater than file length {len(lines)}")
             continue
 
-        line = lines[l]
+        line = lines.line(l)
         offset = c - MAX_COLUMN_OFFSET
         if offset < 0:  # if the line is short
             offset = 0
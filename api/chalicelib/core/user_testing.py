@@ -3,8 +3,8 @@ from chalicelib.utils.storage import StorageClient
 from decouple import config
 
 
-def get_test_signals(session_id, project_id):
-    with pg_client.PostgresClient() as cur:
+def get_test_signals(session_id, project_id, cur=None):
+    with pg_client.reuse_cursor(cur) as cur:
         cur.execute(cur.mogrify("""\
             SELECT *
             FROM public.ut_tests_signals
@@ -1,8 +1,11 @@
 import logging
+from itertools import islice
 
 import clickhouse_driver
 from decouple import config
 
+from chalicelib.utils.ch_result import column_names, to_columns
+
 logger = logging.getLogger(__name__)
 
 settings = {}
@@ -35,21 +38,49 @@ class ClickHouseClient:
     def __enter__(self):
         return self
 
-    def execute(self, query, parameters=None, **args):
+    def execute(self, query, parameters=None, camel_case=False, **args):
         try:
             results = self.__client.execute(query=query, params=parameters, with_column_types=True, **args)
-            keys = tuple(x for x, y in results[1])
+            keys = column_names([name for name, _ in results[1]], camel_case=camel_case)
             return [dict(zip(keys, i)) for i in results[0]]
         except Exception as err:
-            logger.error("--------- CH EXCEPTION -----------", exc_info=err)
-            logger.error("--------- CH QUERY EXCEPTION -----------")
-            logger.error(self.format(query=query, parameters=parameters)
-                         .replace('\n', '\\n')
-                         .replace('    ', ' ')
-                         .replace('        ', ' '))
-            logger.error("--------------------")
+            self.__log_error(query=query, parameters=parameters, err=err)
+            raise err
+
+    def execute_columns(self, query, parameters=None, camel_case=False, **args) -> dict:
+        """Columnar result: {column name: numpy array}, no dict is built per row"""
+        try:
+            results = self.__client.execute(query=query, params=parameters, with_column_types=True, columnar=True,
+                                            **args)
+            return to_columns(column_names([name for name, _ in results[1]], camel_case=camel_case), results[0])
+        except Exception as err:
+            self.__log_error(query=query, parameters=parameters, err=err)
             raise err
 
+    def execute_blocks(self, query, parameters=None, camel_case=False, block_size=10000, **args):
+        """Streamed result: yields lists of at most block_size rows (dicts) as they are received"""
+        try:
+            args["settings"] = {**args.get("settings", {}), "max_block_size": block_size}
+            results = self.__client.execute_iter(query=query, params=parameters, with_column_types=True, **args)
+            keys = column_names([name for name, _ in next(results)], camel_case=camel_case)
+            while True:
+                block = [dict(zip(keys, i)) for i in islice(results, block_size)]
+                if len(block) == 0:
+                    break
+                yield block
+        except Exception as err:
+            self.__log_error(query=query, parameters=parameters, err=err)
+            raise err
+
+    def __log_error(self, query, parameters, err):
+        logger.error("--------- CH EXCEPTION -----------", exc_info=err)
+        logger.error("--------- CH QUERY EXCEPTION -----------")
+        logger.error(self.format(query=query, parameters=parameters)
+                     .replace('\n', '\\n')
+                     .replace('    ', ' ')
+                     .replace('        ', ' '))
+        logger.error("--------------------")
+
     def insert(self, query, params=None, **args):
         return self.__client.execute(query=query, params=params, **args)
 
@@ -8,6 +8,8 @@ import clickhouse_connect
 from clickhouse_connect.driver.query import QueryContext
 from decouple import config
 
+from chalicelib.utils.ch_result import column_names, to_columns
+
 logger = logging.getLogger(__name__)
 
 _CH_CONFIG = {"host": config("ch_host"),
@@ -31,24 +33,55 @@ if config("CH_COMPRESSION", cast=bool, default=True):
     extra_args["compression"] = "lz4"
 
 
+def __log_query(self, args, kwargs):
+    if kwargs.get("parameters"):
+        logger.debug(str.encode(self.format(query=kwargs.get("query", ""), parameters=kwargs.get("parameters"))))
+    elif len(args) > 0:
+        logger.debug(str.encode(args[0]))
+
+
 def transform_result(self, original_function):
     @wraps(original_function)
-    def wrapper(*args, **kwargs):
-        if kwargs.get("parameters"):
-            logger.debug(str.encode(self.format(query=kwargs.get("query", ""), parameters=kwargs.get("parameters"))))
-        elif len(args) > 0:
-            logger.debug(str.encode(args[0]))
+    def wrapper(*args, camel_case=False, **kwargs):
+        __log_query(self, args, kwargs)
         result = original_function(*args, **kwargs)
         if isinstance(result, clickhouse_connect.driver.query.QueryResult):
-            column_names = result.column_names
+            keys = column_names(result.column_names, camel_case=camel_case)
             result = result.result_rows
-            result = [dict(zip(column_names, row)) for row in result]
+            result = [dict(zip(keys, row)) for row in result]
 
         return result
 
     return wrapper
 
 
+def columns_result(self, original_function):
+    """Columnar result: {column name: numpy array}, no dict is built per row"""
+
+    @wraps(original_function)
+    def wrapper(*args, camel_case=False, **kwargs):
+        __log_query(self, args, kwargs)
+        result = original_function(*args, column_oriented=True, **kwargs)
+        return to_columns(column_names(result.column_names, camel_case=camel_case), result.result_columns)
+
+    return wrapper
+
+
+def blocks_result(self, original_function):
+    """Streamed result: yields lists of at most block_size rows (dicts) as they are received"""
+
+    @wraps(original_function)
+    def wrapper(*args, camel_case=False, block_size=10000, **kwargs):
+        __log_query(self, args, kwargs)
+        kwargs["settings"] = {**kwargs.get("settings", {}), "max_block_size": block_size}
+        with original_function(*args, **kwargs) as stream:
+            keys = column_names(stream.source.column_names, camel_case=camel_case)
+            for block in stream:
+                yield [dict(zip(keys, row)) for row in block]
+
+    return wrapper
+
+
 class ClickHouseConnectionPool:
     def __init__(self, min_size, max_size):
         self.min_size = min_size
@@ -144,6 +177,8 @@ class ClickHouseClient:
                 self.__client = CH_pool.get_connection()
 
             self.__client.execute = transform_result(self, self.__client.query)
+            self.__client.execute_columns = columns_result(self, self.__client.query)
+            self.__client.execute_blocks = blocks_result(self, self.__client.query_row_block_stream)
             self.__client.format = self.format
 
     def __enter__(self):
@@ -0,0 +1,24 @@
+import numpy as np
+
+
+def column_names(names, camel_case=False) -> tuple:
+    # helper imports schemas, which imports chalicelib.utils (and this module through ch_client)
+    from chalicelib.utils import helper
+    # camelCase aliasing is done once per column instead of once per row
+    return tuple(helper.key_to_camel_case(name) if camel_case else name for name in names)
+
+
+def to_array(values) -> np.ndarray:
+    """numpy array of a result column, numbers get a numeric dtype, other values (strings, arrays, None...) are kept
+    as python objects"""
+    if len(values) > 0 and isinstance(values[0], (int, float)):
+        array = np.asarray(values)
+        if array.ndim == 1:
+            return array
+    return np.fromiter(values, dtype=object, count=len(values))
+
+
+def to_columns(names, columns) -> dict:
+    if len(columns) == 0:
+        return {name: np.array([], dtype=object) for name in names}
+    return {name: to_array(column) for name, column in zip(names, columns)}
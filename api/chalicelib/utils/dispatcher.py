@@ -0,0 +1,115 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from urllib.parse import urlparse
+
+import requests
+from decouple import config
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# Outgoing notifications (webhooks, Slack, MS Teams, emails):
+# - at most DISPATCHER_WORKERS sends at the same time
+# - one keep-alive requests.Session per host
+# - a token bucket per destination: DISPATCHER_RATE requests/s with bursts of DISPATCHER_BURST
+# - connection errors, timeouts, 429 and 5xx are retried DISPATCHER_RETRIES times with exponential backoff
+DISPATCHER_WORKERS = config("DISPATCHER_WORKERS", cast=int, default=8)
+DISPATCHER_RATE = config("DISPATCHER_RATE", cast=float, default=1)
+DISPATCHER_BURST = config("DISPATCHER_BURST", cast=int, default=3)
+DISPATCHER_RETRIES = config("DISPATCHER_RETRIES", cast=int, default=3)
+DISPATCHER_BACKOFF = config("DISPATCHER_BACKOFF", cast=float, default=0.5)
+DISPATCHER_TIMEOUT = config("DISPATCHER_TIMEOUT", cast=int, default=10)
+
+executor = ThreadPoolExecutor(max_workers=DISPATCHER_WORKERS, thread_name_prefix="dispatcher")
+
+__lock = threading.Lock()
+__sessions = {}
+__buckets = {}
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Blocks until a token is available"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait_time = (1 - self.tokens) / self.rate
+            time.sleep(wait_time)
+
+
+def get_bucket(destination: str, rate: float = None, capacity: int = None) -> TokenBucket:
+    with __lock:
+        bucket = __buckets.get(destination)
+        if bucket is None:
+            bucket = __buckets[destination] = TokenBucket(rate=rate or DISPATCHER_RATE,
+                                                          capacity=capacity or DISPATCHER_BURST)
+        return bucket
+
+
+def __get_session(host: str) -> requests.Session:
+    with __lock:
+        session = __sessions.get(host)
+        if session is None:
+            session = __sessions[host] = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=DISPATCHER_WORKERS)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+        return session
+
+
+def __retry_after(response: requests.Response, attempt: int) -> float:
+    backoff = DISPATCHER_BACKOFF * 2 ** attempt
+    try:
+        return max(backoff, float(response.headers.get("Retry-After", 0)))
+    except ValueError:
+        return backoff
+
+
+def post(url: str, json=None, headers=None, timeout=DISPATCHER_TIMEOUT) -> requests.Response:
+    """POST through the session of the url's host, rate-limited per url and retried with backoff.
+    Returns the last response, raises the last error if no response was received."""
+    session = __get_session(urlparse(url).netloc)
+    bucket = get_bucket(url)
+    for attempt in range(DISPATCHER_RETRIES + 1):
+        bucket.acquire()
+        try:
+            r = session.post(url=url, json=json, headers=headers, timeout=timeout)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            if attempt == DISPATCHER_RETRIES:
+                raise e
+            logger.warning(f"dispatcher: {type(e).__name__} for {urlparse(url).netloc}, retry n°{attempt + 1}")
+            time.sleep(DISPATCHER_BACKOFF * 2 ** attempt)
+            continue
+        if (r.status_code == 429 or r.status_code >= 500) and attempt < DISPATCHER_RETRIES:
+            logger.warning(f"dispatcher: {r.status_code} from {urlparse(url).netloc}, retry n°{attempt + 1}")
+            time.sleep(__retry_after(r, attempt))
+            continue
+        return r
+
+
+def submit(function, *args, **kwargs):
+    return executor.submit(function, *args, **kwargs)
+
+
+def run_all(tasks):
+    """Runs the (function, kwargs) tasks on the dispatcher's workers and waits for all of them,
+    an error in a task is logged and doesn't stop the others"""
+    futures = {submit(function, **kwargs): function.__name__ for function, kwargs in tasks}
+    wait(futures.keys())
+    for future, name in futures.items():
+        if future.exception() is not None:
+            logger.error(f"!!!Error in dispatched {name}", exc_info=future.exception())
@@ -1,5 +1,6 @@
 import logging
 import re
+from contextlib import nullcontext
 from email.header import Header
 from email.mime.image import MIMEImage
 from email.mime.multipart import MIMEMultipart
@@ -44,7 +45,8 @@ def __replace_images(HTML):
     return HTML, mime_img
 
 
-def send_html(BODY_HTML, SUBJECT, recipient):
+def send_html(BODY_HTML, SUBJECT, recipient, server=None):
+    """server: an already opened smtp.SMTPClient to reuse, a new one is opened if None"""
     BODY_HTML, mime_img = __replace_images(BODY_HTML)
     if not isinstance(recipient, list):
         recipient = [recipient]
@@ -57,12 +59,13 @@ def send_html(BODY_HTML, SUBJECT, recipient):
     for m in mime_img:
         msg.attach(m)
 
-    with smtp.SMTPClient() as s:
+    client = smtp.SMTPClient() if server is None else server
+    with client if server is None else nullcontext():
         for r in recipient:
             msg["To"] = r
             try:
                 logger.info(f"Email sending to: {r}")
-                s.send_message(msg)
+                client.send_message(msg)
             except Exception as e:
                 logger.error("!!! Email error!")
                 logger.error(e)
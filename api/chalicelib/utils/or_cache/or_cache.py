@@ -1,18 +1,47 @@
+import copy
 import functools
 import inspect
 import json
 import logging
-from chalicelib.utils import pg_client
+import threading
 import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from decouple import config
 from fastapi.encoders import jsonable_encoder
 
+from chalicelib.utils import pg_client
+
 logger = logging.getLogger(__name__)
 
+# Upserts into or_cache.* are written in the background (write-behind), one at a time
+_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="or_cache_writer")
+
+
+class _Flight:
+    """A miss being computed, concurrent requests for the same key wait for its result"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
 
 class CachedResponse:
+    """Caches the response of the decorated function in two tiers:
+    an in-process LRU (OR_CACHE_LOCAL_SIZE entries, same TTL as the table) in front of the shared PG table.
+    Concurrent misses of the same key run the function once (single-flight)."""
+
     def __init__(self, table, ttl):
         self.table = table
         self.ttl = ttl
+        self.local = OrderedDict()
+        self.local_size = config("OR_CACHE_LOCAL_SIZE", cast=int, default=1024)
+        self.lock = threading.Lock()
+        self.in_flight = {}
+        self.counters = {"local_hits": 0, "shared_hits": 0, "misses": 0, "deduplicated": 0,
+                         "shared_time": 0.0, "miss_time": 0.0}
 
     def __call__(self, func):
         self.param_names = {i: param for i, param in enumerate(inspect.signature(func).parameters)}
@@ -27,25 +56,103 @@ class CachedResponse:
                     values[param] = kwargs[param]
                 else:
                     values[param] = None
-            result = self.__get(values)
-            if result is None or result["expired"] \
-                    or result["result"] is None or len(result["result"]) == 0:
-                now = time.time()
-                result = func(*args, **kwargs)
-                now = time.time() - now
-                if result is not None and len(result) > 0:
-                    self.__add(values, result, now)
-                    result[0]["cached"] = False
-            else:
-                logger.info(f"using cached response for "
-                            f"{func.__name__}({','.join([f'{key}={val}' for key, val in enumerate(values)])})")
-                result = result["result"]
+            key = json.dumps(jsonable_encoder(values), sort_keys=True)
+            result = self.__get_local(key)
+            if result is not None:
+                self.__count("local_hits")
                 result[0]["cached"] = True
+                return result
 
+            with self.lock:
+                flight = self.in_flight.get(key)
+                leader = flight is None
+                if leader:
+                    flight = self.in_flight[key] = _Flight()
+            if not leader:
+                self.__count("deduplicated")
+                flight.event.wait()
+                if flight.error is not None:
+                    raise flight.error
+                result = copy.deepcopy(flight.result)
+                if result is not None and len(result) > 0:
+                    result[0]["cached"] = True
+                return result
+
+            try:
+                result = self.__load(func, key, values, args, kwargs)
+                flight.result = copy.deepcopy(result)
+            except Exception as e:
+                flight.error = e
+                raise e
+            finally:
+                with self.lock:
+                    del self.in_flight[key]
+                flight.event.set()
             return result
 
+        wrapper.cache_stats = self.stats
         return wrapper
 
+    def __load(self, func, key, values, args, kwargs):
+        now = time.time()
+        result = self.__get(values)
+        self.__count("shared_time", time.time() - now)
+        if result is None or result["expired"] \
+                or result["result"] is None or len(result["result"]) == 0:
+            self.__count("misses")
+            now = time.time()
+            result = func(*args, **kwargs)
+            now = time.time() - now
+            self.__count("miss_time", now)
+            if result is not None and len(result) > 0:
+                self.__set_local(key, result, self.ttl)
+                _writer.submit(self.__add_safe, values, copy.deepcopy(result), now)
+                result[0]["cached"] = False
+        else:
+            self.__count("shared_hits")
+            logger.info(f"using cached response for "
+                        f"{func.__name__}({','.join([f'{key}={val}' for key, val in enumerate(values)])})")
+            ttl_left = float(result["ttl_left"])
+            result = result["result"]
+            self.__set_local(key, result, ttl_left)
+            result[0]["cached"] = True
+        logger.debug(f"{self.table} cache stats: {self.stats()}")
+        return result
+
+    def __count(self, counter, value=1):
+        with self.lock:
+            self.counters[counter] += value
+
+    def stats(self):
+        """Hit/miss counters and average latencies (in seconds) of the shared tier and of the wrapped function"""
+        with self.lock:
+            stats = dict(self.counters)
+        lookups = stats["shared_hits"] + stats["misses"]
+        stats["avg_shared_time"] = stats.pop("shared_time") / lookups if lookups else 0
+        stats["avg_miss_time"] = stats.pop("miss_time") / stats["misses"] if stats["misses"] else 0
+        stats["local_size"] = len(self.local)
+        return stats
+
+    def __get_local(self, key):
+        with self.lock:
+            entry = self.local.get(key)
+            if entry is None:
+                return None
+            expires_at, result = entry
+            if expires_at is not None and expires_at < time.time():
+                del self.local[key]
+                return None
+            self.local.move_to_end(key)
+        return copy.deepcopy(result)
+
+    def __set_local(self, key, result, ttl):
+        expires_at = time.time() + ttl if self.ttl > 0 else None
+        with self.lock:
+            self.local[key] = (expires_at, copy.deepcopy(result))
+            self.local.move_to_end(key)
+            while len(self.local) > self.local_size:
+                self.local.popitem(last=False)
+
     def __get(self, values):
         with pg_client.PostgresClient() as cur:
             sub_constraints = []
@@ -55,8 +162,9 @@ class CachedResponse:
                 else:
                     sub_constraints.append(f"{key} IS NULL")
             query = f"""SELECT result,
-                               (%(ttl)s>0 
-                                AND EXTRACT(EPOCH FROM (timezone('utc'::text, now()) - created_at - INTERVAL %(interval)s)) > 0) AS expired
+                               (%(ttl)s>0
+                                AND EXTRACT(EPOCH FROM (timezone('utc'::text, now()) - created_at - INTERVAL %(interval)s)) > 0) AS expired,
+                               %(ttl)s - EXTRACT(EPOCH FROM (timezone('utc'::text, now()) - created_at)) AS ttl_left
                         FROM {self.table}
                         WHERE {" AND ".join(sub_constraints)}"""
             query = cur.mogrify(query, {**values, 'ttl': self.ttl, 'interval': f'{self.ttl} seconds'})
@@ -67,11 +175,17 @@ class CachedResponse:
             result = cur.fetchone()
         return result
 
+    def __add_safe(self, values, result, execution_time):
+        try:
+            self.__add(values, result, execution_time)
+        except Exception as e:
+            logger.error(f"failed to write {self.table} cache entry", exc_info=e)
+
     def __add(self, values, result, execution_time):
         with pg_client.PostgresClient() as cur:
-            query = f"""INSERT INTO {self.table} ({",".join(values.keys())},result,execution_time) 
-                        VALUES ({",".join([f"%({param})s" for param in values.keys()])},%(result)s,%(execution_time)s) 
-                        ON CONFLICT ({",".join(values.keys())}) DO UPDATE SET result=%(result)s, 
+            query = f"""INSERT INTO {self.table} ({",".join(values.keys())},result,execution_time)
+                        VALUES ({",".join([f"%({param})s" for param in values.keys()])},%(result)s,%(execution_time)s)
+                        ON CONFLICT ({",".join(values.keys())}) DO UPDATE SET result=%(result)s,
                                                   execution_time=%(execution_time)s,
                                                   created_at=timezone('utc'::text, now());"""
             query = cur.mogrify(query, {**values,
@@ -1,5 +1,7 @@
 import logging
 import time
+import uuid
+from contextlib import contextmanager
 from threading import Semaphore
 
 import psycopg2
@@ -185,6 +187,25 @@ class PostgresClient:
         return self.__enter__()
 
 
+@contextmanager
+def reuse_cursor(cur=None):
+    """cur if it is given, so several functions can run on the same connection, otherwise a new PostgresClient"""
+    if cur is not None:
+        yield cur
+    else:
+        with PostgresClient() as cur:
+            yield cur
+
+
+def stream(cur, query, itersize=1000):
+    """Rows of query, fetched by batches of itersize through a server-side cursor on the connection of cur"""
+    with cur.connection.cursor(name=f"stream_{uuid.uuid4().hex}",
+                               cursor_factory=psycopg2.extras.RealDictCursor) as server_cursor:
+        server_cursor.itersize = itersize
+        server_cursor.execute(query)
+        yield from server_cursor
+
+
 async def init():
     logger.info(f">use PG_POOL:{config('PG_POOL', default=True)}")
     make_pool()
@@ -0,0 +1,103 @@
+import copy
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from decouple import config
+from pydantic import BaseModel
+
+logger = logging.getLogger(__name__)
+
+# Compiled search queries: the (full_args, query_part) built by search_query_parts(_ch) are cached by the shape of the
+# payload. The time range and the user only ever reach the query as %(startDate)s/%(endDate)s/%(userId)s, so they are
+# left out of the shape (only whether they are set is kept): cards, alerts and dashboards re-run over a new time range
+# get the same query text back and only these parameters change. Filter values stay in the shape because they can
+# change the query text (deduplicated conditions, "*" values...).
+# The builders also normalise the payload in place (operator values, invalid events dropped, events_order...): the
+# payload as left by the builder is kept with the entry and put back on a hit, so callers see the same payload either way.
+# Entries expire after QUERY_TEMPLATES_TTL seconds to pick up metadata changes of the project.
+QUERY_TEMPLATES_SIZE = config("QUERY_TEMPLATES_SIZE", cast=int, default=1024)
+QUERY_TEMPLATES_TTL = config("QUERY_TEMPLATES_TTL", cast=int, default=10 * 60)
+# payload fields that are not used to build the query parts
+__IGNORED_FIELDS = {"startTimestamp", "endTimestamp", "limit", "page", "cursor", "sort", "order"}
+
+__cache = OrderedDict()
+__lock = threading.Lock()
+__stats = {"hits": 0, "misses": 0}
+
+
+def __default(value):
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    return str(value)
+
+
+def template_key(builder, data: BaseModel, shape=None, **kwargs) -> str:
+    user_id = kwargs.pop("user_id", None)
+    payload = {"builder": f"{builder.__module__}.{builder.__name__}",
+               "shape": shape,
+               "schema": type(data).__name__,
+               "data": data.model_dump(mode="json", exclude=__IGNORED_FIELDS),
+               "hasStartTimestamp": data.startTimestamp is not None,
+               "hasEndTimestamp": data.endTimestamp is not None,
+               "hasUserId": user_id is not None,
+               **kwargs}
+    return hashlib.sha1(json.dumps(payload, sort_keys=True, default=__default).encode()).hexdigest()
+
+
+def __get(key: str):
+    with __lock:
+        entry = __cache.get(key)
+        if entry is None or entry["expiresAt"] <= time.monotonic():
+            __stats["misses"] += 1
+            return None
+        __cache.move_to_end(key)
+        __stats["hits"] += 1
+        entry["hits"] += 1
+        return entry
+
+
+def __payload(data: BaseModel) -> dict:
+    return {k: copy.deepcopy(getattr(data, k)) for k in type(data).model_fields if k not in __IGNORED_FIELDS}
+
+
+def __set(key: str, full_args: dict, query_part: str, payload: dict):
+    with __lock:
+        __cache[key] = {"args": copy.deepcopy(full_args), "query": query_part, "payload": payload, "hits": 0,
+                        "expiresAt": time.monotonic() + QUERY_TEMPLATES_TTL}
+        __cache.move_to_end(key)
+        while len(__cache) > QUERY_TEMPLATES_SIZE:
+            __cache.popitem(last=False)
+
+
+def compile_query_parts(builder, data: BaseModel, shape=None, **kwargs):
+    """(full_args, query_part) of builder(data=data, **kwargs), from the cache if a payload of the same shape was
+    already built; full_args["query_template"] is the template's hash, to be used in logs and query metrics.
+    shape: anything else the query text depends on (e.g. tables picked from the time range), added to the key"""
+    if QUERY_TEMPLATES_SIZE <= 0:
+        return builder(data=data, **kwargs)
+    key = template_key(builder, data, shape=shape, **kwargs)
+    entry = __get(key)
+    if entry is None:
+        full_args, query_part = builder(data=data, **kwargs)
+        __set(key=key, full_args=full_args, query_part=query_part, payload=__payload(data))
+    else:
+        for k, v in entry["payload"].items():
+            setattr(data, k, copy.deepcopy(v))
+        full_args = copy.deepcopy(entry["args"])
+        full_args["startDate"] = data.startTimestamp
+        full_args["endDate"] = data.endTimestamp
+        full_args["userId"] = kwargs.get("user_id")
+        query_part = entry["query"]
+    full_args["query_template"] = key
+    return full_args, query_part
+
+
+def stats() -> dict:
+    with __lock:
+        return {"size": len(__cache), **__stats,
+                "templates": sorted([{"template": k, "hits": v["hits"]} for k, v in __cache.items()],
+                                    key=lambda t: t["hits"], reverse=True)[:10]}
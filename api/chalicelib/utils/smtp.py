@@ -18,6 +18,9 @@ class SMTPClient:
     server = None
 
     def __init__(self):
+        self.__connect()
+
+    def __connect(self):
         if config("EMAIL_HOST") is None or len(config("EMAIL_HOST")) == 0:
             return
         elif not config("EMAIL_USE_SSL", cast=bool):
@@ -49,6 +52,20 @@ class SMTPClient:
             return
         self.server.quit()
 
+    def send_message(self, msg):
+        """sends msg on the opened connection; if the server closed it (e.g. idle timeout during a batch),
+        reconnects and retries once"""
+        if self.server is None:
+            return EmptySMTP().send_message(msg)
+        try:
+            return self.server.send_message(msg)
+        except smtplib.SMTPServerDisconnected:
+            logger.warning(f'SMTP connexion to {config("EMAIL_HOST")} lost, reconnecting')
+            self.server.close()
+            self.__connect()
+            self.__enter__()
+            return self.server.send_message(msg)
+
     def test_configuration(self):
         # check server connexion
         try:
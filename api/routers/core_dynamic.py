@@ -4,7 +4,7 @@ from typing import Optional, Union
 from decouple import config
 from fastapi import Body, Depends, BackgroundTasks
 from fastapi import HTTPException, status
-from starlette.responses import RedirectResponse, FileResponse, JSONResponse, Response
+from starlette.responses import RedirectResponse, FileResponse, JSONResponse, Response, StreamingResponse
 
 import schemas
 from chalicelib.core import assist, signup, feature_flags
@@ -273,6 +273,15 @@ def session_ids_search(projectId: int, data: schemas.SessionsSearchPayloadSchema
     return {'data': data}
 
 
+@app.post('/{projectId}/sessions/search/count', tags=["sessions"])
+def sessions_search_count(projectId: int, data: schemas.SessionsSearchPayloadSchema = \
+        Depends(contextual_validators.validate_contextual_payload), approximate: bool = False,
+                          context: schemas.CurrentContext = Depends(OR_context)):
+    data = sessions_search.count_sessions(data=data, project=context.project, user_id=context.user_id,
+                                          approximate=approximate, platform=context.project.platform)
+    return {'data': data}
+
+
 @app.get('/{projectId}/sessions/{sessionId}/first-mob', tags=["sessions", "replay"])
 def get_first_mob_file(projectId: int, sessionId: Union[int, str],
                        context: schemas.CurrentContext = Depends(OR_context)):
@@ -290,13 +299,14 @@ def get_first_mob_file(projectId: int, sessionId: Union[int, str],
 
 @app.get('/{projectId}/sessions/{sessionId}/replay', tags=["sessions", "replay"])
 def get_session_events(projectId: int, sessionId: Union[int, str], background_tasks: BackgroundTasks,
-                       context: schemas.CurrentContext = Depends(OR_context)):
+                       checkLive: bool = True, context: schemas.CurrentContext = Depends(OR_context)):
     if not sessionId.isnumeric():
         return {"errors": ["session not found"]}
     else:
         sessionId = int(sessionId)
     data = sessions_replay.get_replay(project_id=projectId, session_id=sessionId, full_data=True,
-                                      include_fav_viewed=True, group_metadata=True, context=context)
+                                      include_fav_viewed=True, group_metadata=True, context=context,
+                                      check_live=checkLive)
     if data is None:
         return {"errors": ["session not found"]}
     if data.get("inDB"):
@@ -323,6 +333,17 @@ def get_session_events(projectId: int, sessionId: Union[int, str],
     }
 
 
+@app.get('/{projectId}/sessions/{sessionId}/events/timeline', tags=["sessions", "replay"])
+def get_session_events_timeline(projectId: int, sessionId: int,
+                                context: schemas.CurrentContext = Depends(OR_context)):
+    data = sessions_replay.get_events_timeline(project_id=projectId, session_id=sessionId)
+    if data is None:
+        return {"errors": ["session not found"]}
+    if isinstance(data, dict):
+        return data
+    return StreamingResponse(data, media_type="application/x-ndjson")
+
+
 @app.get('/{projectId}/sessions/{sessionId}/errors/{errorId}/sourcemaps', tags=["sessions", "sourcemaps"])
 def get_error_trace(projectId: int, sessionId: int, errorId: str,
                     context: schemas.CurrentContext = Depends(OR_context)):
@@ -672,6 +672,8 @@ class SessionsSearchPayloadSchema(_TimedSchema, _PaginatedSchema):
     events_order: Optional[SearchEventOrder] = Field(default=SearchEventOrder.THEN)
     group_by_user: bool = Field(default=False)
     bookmarked: bool = Field(default=False)
+    # keyset pagination: "" for the first page, then the nextCursor of the previous page; page is ignored
+    cursor: Optional[str] = Field(default=None)
 
     @model_validator(mode="before")
     @classmethod
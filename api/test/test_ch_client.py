@@ -0,0 +1,65 @@
+import importlib
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+from chalicelib import utils
+from chalicelib.utils import ch_client_exp
+
+# chalicelib.utils.ch_client is the clickhouse_connect client (EXP_CH_DRIVER), the clickhouse_driver one is loaded by
+# name, without replacing the one used by the rest of the api
+ch_client = importlib.import_module("chalicelib.utils.ch_client")
+utils.ch_client = ch_client_exp
+
+COLUMNS = [("session_id", "UInt64"), ("event_name", "String")]
+ROWS = [(1, "CLICK"), (1, "INPUT"), (2, "CLICK"), (3, "LOCATION"), (3, "CLICK")]
+
+
+class FakeDriverClient:
+    """clickhouse_driver.Client answering execute_iter"""
+
+    def __init__(self):
+        self.settings = None
+
+    def execute_iter(self, query, params=None, with_column_types=False, settings=None):
+        self.settings = settings
+        return iter([COLUMNS] + ROWS)
+
+
+class FakeStream:
+    """clickhouse_connect.Client.query_row_block_stream"""
+
+    def __init__(self, block_size):
+        self.block_size = block_size
+        self.settings = None
+
+    @contextmanager
+    def __call__(self, query, settings=None):
+        self.settings = settings
+        yield FakeStreamBlocks(column_names=[name for name, _ in COLUMNS],
+                               blocks=[ROWS[i:i + self.block_size] for i in range(0, len(ROWS), self.block_size)])
+
+
+class FakeStreamBlocks(list):
+    def __init__(self, column_names, blocks):
+        super().__init__(blocks)
+        self.source = SimpleNamespace(column_names=column_names)
+
+
+class TestExecuteBlocks:
+    def test_driver_blocks(self):
+        client = ch_client.ClickHouseClient.__new__(ch_client.ClickHouseClient)
+        driver = client._ClickHouseClient__client = FakeDriverClient()
+        blocks = list(client.execute_blocks(query="SELECT", camel_case=True, block_size=2,
+                                            settings={"max_execution_time": 5}))
+        assert driver.settings == {"max_execution_time": 5, "max_block_size": 2}
+        assert [len(block) for block in blocks] == [2, 2, 1]
+        assert blocks[0][0] == {"sessionId": 1, "eventName": "CLICK"}
+        assert [tuple(row.values()) for block in blocks for row in block] == ROWS
+
+    def test_connect_blocks(self):
+        stream = FakeStream(block_size=2)
+        execute_blocks = ch_client_exp.blocks_result(SimpleNamespace(), stream)
+        blocks = list(execute_blocks("SELECT", camel_case=True, block_size=2, settings={"max_execution_time": 5}))
+        assert stream.settings == {"max_execution_time": 5, "max_block_size": 2}
+        assert blocks[0][0] == {"sessionId": 1, "eventName": "CLICK"}
+        assert [tuple(row.values()) for block in blocks for row in block] == ROWS
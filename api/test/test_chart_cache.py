@@ -0,0 +1,55 @@
+import schemas
+from chalicelib.core.metrics import chart_cache
+from chalicelib.utils import metrics_helper
+
+HOUR = 60 * 60 * 1000
+DAY_START = 1699920000000  # 2023-11-14 00:00 UTC
+SESSIONS = [DAY_START + i * 7 * 60 * 1000 for i in range(0, 2 * 24 * 60 // 7)]
+
+
+def compute(series_filter: schemas.SessionsSearchPayloadSchema, density: int):
+    """sessions.search2_series of a session count timeseries: each session goes to the step containing it"""
+    step_size = metrics_helper.get_step_size(startTimestamp=series_filter.startTimestamp,
+                                             endTimestamp=series_filter.endTimestamp, density=density, factor=1)
+    counts = {}
+    for ts in SESSIONS:
+        if series_filter.startTimestamp <= ts <= series_filter.endTimestamp:
+            t = series_filter.startTimestamp + (ts - series_filter.startTimestamp) // step_size * step_size
+            counts[t] = counts.get(t, 0) + 1
+    return metrics_helper.complete_missing_steps(rows=[{"timestamp": t, "count": c} for t, c in sorted(counts.items())],
+                                                 start_timestamp=series_filter.startTimestamp,
+                                                 end_timestamp=series_filter.endTimestamp, step=step_size,
+                                                 neutral={"count": 0})
+
+
+def card(density):
+    return schemas.CardTimeSeries(metricType=schemas.MetricType.TIMESERIES, viewType="lineChart", density=density)
+
+
+def series_filter(start, end):
+    return schemas.SessionsSearchPayloadSchema(startTimestamp=start, endTimestamp=end)
+
+
+class TestChartCache:
+    def test_same_series_as_uncached(self, monkeypatch):
+        data = card(density=24)
+        s = series_filter(DAY_START, DAY_START + 24 * HOUR)
+        cached = chart_cache.get_series(project_id=1, data=data, series_filter=s, compute=compute)
+        from_cache = chart_cache.get_series(project_id=1, data=data, series_filter=s, compute=compute)
+        monkeypatch.setattr(chart_cache, "CHART_CACHE_SIZE", 0)
+        uncached = chart_cache.get_series(project_id=1, data=data, series_filter=s, compute=compute)
+        assert len(uncached) == 24
+        assert cached == uncached
+        assert from_cache == uncached
+
+    def test_unaligned_range(self, monkeypatch):
+        data = card(density=7)
+        s = series_filter(DAY_START + 17 * 60 * 1000, DAY_START + 20 * HOUR + 17 * 60 * 1000)
+        cached = chart_cache.get_series(project_id=2, data=data, series_filter=s, compute=compute)
+        monkeypatch.setattr(chart_cache, "CHART_CACHE_SIZE", 0)
+        uncached = chart_cache.get_series(project_id=2, data=data, series_filter=s, compute=compute)
+        step_size = cached[1]["timestamp"] - cached[0]["timestamp"]
+        assert len(cached) == len(uncached)
+        assert all(r["timestamp"] % step_size == 0 for r in cached)
+        # the last bucket holds endTimestamp
+        assert cached[-1]["timestamp"] <= s.endTimestamp < cached[-1]["timestamp"] + step_size
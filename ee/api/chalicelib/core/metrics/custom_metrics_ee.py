@@ -83,6 +83,7 @@ def delete_card(project_id, metric_id, user_id):
         )
         # for EE only
         row = cur.fetchone()
+    chart_cache.invalidate(metric_id)
     if row:
         if row["data"] and not sessions_favorite.favorite_session_exists(session_id=row["data"]["sessionId"]):
             keys = sessions_mobs. \
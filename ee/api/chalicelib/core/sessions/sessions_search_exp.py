@@ -93,6 +93,13 @@ def search_sessions(data: schemas.SessionsSearchPayloadSchema, project: schemas.
         full_args["sessions_limit"] = 200
         full_args["sessions_limit_s"] = 0
         full_args["sessions_limit_e"] = 200
+    # keyset mode: only the rows of the page are read, the total comes from count_sessions
+    keyset = data.cursor is not None and not (errors_only or count_only or ids_only or data.group_by_user)
+    if keyset:
+        full_args["sessions_limit_keyset"] = full_args["sessions_limit"] + 1
+        cursor_sort, cursor_key = sessions_search_legacy.decode_cursor(data.cursor)
+        full_args["cursor_sort"] = cursor_sort
+        full_args["cursor_key"] = cursor_key
 
     meta_keys = []
     with ch_client.ClickHouseClient() as cur:
@@ -146,6 +153,30 @@ def search_sessions(data: schemas.SessionsSearchPayloadSchema, project: schemas.
                                               ORDER BY s.session_id desc
                                               LIMIT %(sessions_limit)s OFFSET %(sessions_limit_s)s;""",
                                     parameters=full_args)
+        elif keyset:
+            sort = 'session_id'
+            if data.sort is not None and data.sort != "session_id":
+                sort = helper.key_to_snake_case(data.sort)
+            sort_expr = "toUnixTimestamp(s.datetime)" if sort == "datetime" else f"s.{sort}"
+            op = "<" if data.order == schemas.SortOrderType.DESC else ">"
+            meta_keys = metadata.get(project_id=project.project_id)
+            meta_map = ",'metadata',toString(map(%s))" \
+                       % ','.join([f"'{m['key']}',coalesce(metadata_{m['index']},'None')" for m in meta_keys])
+            main_query = cur.format(query=f"""SELECT sort_key, cursor_key, details
+                                              FROM (SELECT {sort_expr} AS sort_key,
+                                                           s.session_id AS cursor_key,
+                                                           map({SESSION_PROJECTION_COLS_CH_MAP}{meta_map}) AS details
+                                                    {query_part}
+                                                    LEFT JOIN (SELECT DISTINCT session_id
+                                                               FROM experimental.user_viewed_sessions
+                                                               WHERE user_id = %(userId)s AND project_id=%(project_id)s
+                                                                 AND _timestamp >= toDateTime(%(startDate)s / 1000)) AS viewed_sessions
+                                                               ON (viewed_sessions.session_id = s.session_id)
+                                                    ) AS raw
+                                              {f"WHERE {sessions_search_legacy.keyset_condition('sort_key', 'cursor_key', op, cursor_sort)}" if cursor_key is not None else ""}
+                                              ORDER BY sort_key {data.order} NULLS LAST, cursor_key {data.order}
+                                              LIMIT %(sessions_limit_keyset)s;""",
+                                    parameters=full_args)
         else:
             if data.order is None:
                 data.order = schemas.SortOrderType.DESC.value
@@ -176,6 +207,7 @@ def search_sessions(data: schemas.SessionsSearchPayloadSchema, project: schemas.
                                               LIMIT %(sessions_limit)s OFFSET %(sessions_limit_s)s) AS sorted_sessions;""",
                                     parameters=full_args)
         logging.debug("--------------------")
+        logging.debug(f"query template: {full_args.get('query_template')}")
         logging.debug(main_query)
         logging.debug("--------------------")
         try:
@@ -190,11 +222,17 @@ def search_sessions(data: schemas.SessionsSearchPayloadSchema, project: schemas.
         if errors_only or ids_only:
             return helper.list_to_camel_case(sessions_list)
 
-        if len(sessions_list) > 0:
-            sessions_list = sessions_list[0]
+        if keyset:
+            total = None
+            sessions_list, next_cursor = sessions_search_legacy.keyset_page(rows=sessions_list,
+                                                                            limit=full_args["sessions_limit"])
+            sessions_list = [r["details"] for r in sessions_list]
+        else:
+            if len(sessions_list) > 0:
+                sessions_list = sessions_list[0]
 
-        total = sessions_list["count"]
-        sessions_list = sessions_list["sessions"]
+            total = sessions_list["count"]
+            sessions_list = sessions_list["sessions"]
 
     if data.group_by_user:
         for i, s in enumerate(sessions_list):
@@ -206,11 +244,43 @@ def search_sessions(data: schemas.SessionsSearchPayloadSchema, project: schemas.
             sessions_list[i]["metadata"] = ast.literal_eval(sessions_list[i]["metadata"])
             sessions_list[i] = schemas.SessionModel.parse_obj(helper.dict_to_camel_case(sessions_list[i]))
 
-    return {
+    result = {
         'total': total,
         'sessions': sessions_list,
         'src': 2
     }
+    if keyset:
+        result['nextCursor'] = next_cursor
+    return result
+
+
+def count_sessions(data: schemas.SessionsSearchPayloadSchema, project: schemas.ProjectContext, user_id,
+                   approximate=False, platform="web"):
+    """Total of a search, loaded separately from the keyset pages.
+    With approximate, sessions are counted with uniq (HyperLogLog) instead of uniqExact."""
+    if data.bookmarked:
+        data.startTimestamp, data.endTimestamp = sessions_favorite.get_start_end_timestamp(project.project_id, user_id)
+    if data.startTimestamp is None:
+        return {"total": 0, "approximate": False}
+    if project.platform == "web":
+        full_args, query_part = sessions.search_query_parts_ch(data=data, error_status=schemas.ErrorStatus.ALL,
+                                                               errors_only=False, favorite_only=data.bookmarked,
+                                                               issue=None, project_id=project.project_id,
+                                                               user_id=user_id, platform=platform)
+    else:
+        full_args, query_part = sessions_legacy_mobil.search_query_parts_ch(data=data,
+                                                                            error_status=schemas.ErrorStatus.ALL,
+                                                                            errors_only=False,
+                                                                            favorite_only=data.bookmarked, issue=None,
+                                                                            project_id=project.project_id,
+                                                                            user_id=user_id, platform=platform)
+    with ch_client.ClickHouseClient() as cur:
+        main_query = cur.format(query=f"""SELECT {"uniq" if approximate else "uniqExact"}(s.session_id) AS count_sessions
+                                          {query_part};""",
+                                parameters=full_args)
+        logger.debug(main_query)
+        rows = cur.execute(main_query)
+    return {"total": rows[0]["count_sessions"] if len(rows) > 0 else 0, "approximate": approximate}
 
 
 def search_by_metadata(tenant_id, user_id, m_key, m_value, project_id=None):
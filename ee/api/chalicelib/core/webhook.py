@@ -1,11 +1,10 @@
 import logging
 from typing import Optional
 
-import requests
 from fastapi import HTTPException, status
 
 import schemas
-from chalicelib.utils import pg_client, helper
+from chalicelib.utils import pg_client, helper, dispatcher
 from chalicelib.utils.TimeUTC import TimeUTC
 
 
@@ -162,14 +161,23 @@ def delete(tenant_id, webhook_id):
 
 
 def trigger_batch(data_list):
+    """Hooks are triggered concurrently on the dispatcher's workers, in order for a given hook"""
     webhooks_map = {}
+    hooks_data = {}
     for w in data_list:
         if w["destination"] not in webhooks_map:
             webhooks_map[w["destination"]] = get_by_id(webhook_id=w["destination"])
         if webhooks_map[w["destination"]] is None:
             logging.error(f"!!Error webhook not found: webhook_id={w['destination']}")
         else:
-            __trigger(hook=webhooks_map[w["destination"]], data=w["data"])
+            hooks_data.setdefault(w["destination"], []).append(w["data"])
+    dispatcher.run_all([(__trigger_all, {"hook": webhooks_map[destination], "data_list": data})
+                        for destination, data in hooks_data.items()])
+
+
+def __trigger_all(hook, data_list):
+    for data in data_list:
+        __trigger(hook=hook, data=data)
 
 
 def __trigger(hook, data):
@@ -178,7 +186,7 @@ def __trigger(hook, data):
         if hook["authHeader"] is not None and len(hook["authHeader"]) > 0:
             headers = {"Authorization": hook["authHeader"]}
 
-        r = requests.post(url=hook["endpoint"], json=data, headers=headers)
+        r = dispatcher.post(url=hook["endpoint"], json=data, headers=headers)
         if r.status_code != 200:
             logging.error("=======> webhook: something went wrong for:")
             logging.error(hook)
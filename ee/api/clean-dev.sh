@@ -109,3 +109,7 @@ rm -rf ./chalicelib/core/errors/errors_pg.py
 rm -rf ./chalicelib/core/errors/errors_ch.py
 rm -rf ./chalicelib/core/errors/errors_details.py
 rm -rf ./chalicelib/utils/contextual_validators.py
+rm -rf ./chalicelib/utils/ch_result.py
+rm -rf ./chalicelib/core/metrics/chart_cache.py
+rm -rf ./chalicelib/utils/dispatcher.py
+rm -rf ./chalicelib/utils/query_templates.py
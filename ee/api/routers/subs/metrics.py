@@ -3,6 +3,7 @@ from typing import Union
 import schemas
 from chalicelib.core.metrics import custom_metrics, dashboards
 from fastapi import Body, Depends
+from fastapi.responses import StreamingResponse
 from or_dependencies import OR_context, OR_scope
 from routers.base import get_routers
 
@@ -28,6 +29,14 @@ def get_dashboard(projectId: int, dashboardId: int, context: schemas.CurrentCont
     return {"data": data}
 
 
+@app.post('/{projectId}/dashboards/{dashboardId}/render', tags=["dashboard"])
+def render_dashboard(projectId: int, dashboardId: int, data: schemas.CardSessionsSchema = Body(...),
+                     context: schemas.CurrentContext = Depends(OR_context)):
+    return StreamingResponse(dashboards.render_dashboard(project=context.project, user_id=context.user_id,
+                                                         dashboard_id=dashboardId, data=data),
+                             media_type="application/x-ndjson")
+
+
 @app.put('/{projectId}/dashboards/{dashboardId}', tags=["dashboard"])
 def update_dashboard(projectId: int, dashboardId: int, data: schemas.EditDashboardSchema = Body(...),
                      context: schemas.CurrentContext = Depends(OR_context)):
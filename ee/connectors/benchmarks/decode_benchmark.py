@@ -0,0 +1,230 @@
+"""
+Decoding throughput of MessageCodec.decode_detailed (memoryview cursor) against the previous io.BytesIO reader.
+
+usage (from ee/connectors):
+    python benchmarks/decode_benchmark.py [--input recorded_batches.bin] [--batches 2000] [--rounds 3]
+
+--input expects recorded kafka values, each one prefixed by its length as a 4-byte little endian integer.
+Without --input a synthetic set of batches (mode 1, with skipped and selected messages) is generated.
+The "lazy" row uses MessageCodec(lazy=True) with LAZY_PROJECTION and only accesses the projected fields.
+"""
+from pathlib import Path
+from time import perf_counter
+import argparse
+import io
+import random
+import sys
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from msgcodec.msgcodec import MessageCodec
+from msgcodec.messages import BatchMetadata
+
+# Same selection the connector uses with EVENT_TYPE=normal
+SELECTED_MESSAGES = [1, 21, 22, 25, 27, 28, 29, 30, 31, 32, 54, 56, 62, 64, 69, 78, 125, 126]
+LAZY_PROJECTION = {'SetViewportSize': ['width'], 'CustomEvent': ['name'], 'IssueEvent': ['type', 'timestamp']}
+
+
+class BytesIOReader(io.BytesIO):
+    """Reference copy of the former io.BytesIO primitives (one read(1) and int.from_bytes per byte)"""
+
+    def skip(self, n):
+        self.read(n)
+
+    def read_boolean(self):
+        return self.read(1) == b'\x01'
+
+    def read_uint(self):
+        x = 0
+        s = 0
+        i = 0
+        while True:
+            b = self.read(1)
+            if len(b) == 0:
+                raise IndexError('bytes out of range')
+            num = int.from_bytes(b, "big", signed=False)
+            if num < 0x80:
+                if i > 9 | i == 9 & num > 1:
+                    raise OverflowError()
+                return int(x | num << s)
+            x |= (num & 0x7f) << s
+            s += 7
+            i += 1
+
+    def read_size(self):
+        size = 0
+        for i in range(3):
+            b = self.read(1)
+            num = int.from_bytes(b, "big", signed=False)
+            size += num << (8*i)
+        return size
+
+    def read_int(self):
+        ux = self.read_uint()
+        x = int(ux >> 1)
+        if ux & 1 != 0:
+            x = - x - 1
+        return x
+
+    def read_string(self):
+        length = self.read_uint()
+        s = self.read(length)
+        try:
+            return s.decode("utf-8", errors="replace").replace("\x00", "\uFFFD")
+        except UnicodeDecodeError:
+            return None
+
+
+class BytesIOMessageCodec(MessageCodec):
+
+    def decode_detailed(self, b: bytes):
+        reader = BytesIOReader(b)
+        messages_list = list()
+        try:
+            messages_list.append(self.handler(reader, 0))
+        except IndexError:
+            return list()
+        if isinstance(messages_list[0], BatchMetadata):
+            mode = 0 if messages_list[0].version == 0 else 1
+        else:
+            return messages_list
+        while True:
+            try:
+                msg_decoded = self.handler(reader, mode)
+                if msg_decoded is not None:
+                    messages_list.append(msg_decoded)
+            except IndexError:
+                break
+        return messages_list
+
+
+def write_uint(out: bytearray, x: int):
+    while x >= 0x80:
+        out.append((x & 0x7f) | 0x80)
+        x >>= 7
+    out.append(x)
+
+
+def write_int(out: bytearray, x: int):
+    write_uint(out, (x << 1) if x >= 0 else ((-x - 1) << 1) | 1)
+
+
+def write_string(out: bytearray, s: str):
+    b = s.encode('utf-8')
+    write_uint(out, len(b))
+    out += b
+
+
+def encode_message(message_id: int, fields: list) -> bytes:
+    body = bytearray()
+    for kind, value in fields:
+        if kind == 'uint':
+            write_uint(body, value)
+        elif kind == 'int':
+            write_int(body, value)
+        else:
+            write_string(body, value)
+    out = bytearray()
+    write_uint(out, message_id)
+    out += len(body).to_bytes(3, 'little')
+    out += body
+    return bytes(out)
+
+
+def synthetic_batch(rnd: random.Random, n_messages: int) -> bytes:
+    out = bytearray()
+    # BatchMetadata is read in mode 0 (no size prefix)
+    write_uint(out, 81)
+    for kind, value in [('uint', 1), ('uint', 0), ('uint', 0), ('int', 1690000000000), ('string', 'https://app.example.com/')]:
+        if kind == 'uint':
+            write_uint(out, value)
+        elif kind == 'int':
+            write_int(out, value)
+        else:
+            write_string(out, value)
+    for _ in range(n_messages):
+        r = rnd.random()
+        if r < 0.45:
+            out += encode_message(20, [('uint', rnd.randint(0, 1920)), ('uint', rnd.randint(0, 1080))])
+        elif r < 0.7:
+            out += encode_message(12, [('uint', rnd.randint(0, 50000)), ('string', 'class'),
+                                       ('string', 'btn btn-primary ' * rnd.randint(1, 4))])
+        elif r < 0.8:
+            out += encode_message(5, [('uint', 1920), ('uint', 1080)])
+        elif r < 0.85:
+            out += encode_message(54, [('uint', 10), ('string', '4g')])
+        elif r < 0.93:
+            out += encode_message(27, [('string', 'checkout'), ('string', '{"cart": %d}' % rnd.randint(0, 99))])
+        elif r < 0.98:
+            out += encode_message(83, [('string', 'fetch'), ('string', 'GET'), ('string', 'https://api.example.com/v1/items'),
+                                       ('string', '{}'), ('string', '{"items": []}' * rnd.randint(1, 20)),
+                                       ('uint', 200), ('uint', 1690000000000), ('uint', 120), ('uint', 512)])
+        else:
+            out += encode_message(125, [('uint', rnd.randint(0, 5000)), ('uint', 1690000000000), ('string', 'click_rage'),
+                                        ('string', 'button#buy'), ('string', ''), ('string', '{"count": 5}'),
+                                        ('string', 'https://app.example.com/cart')])
+    return bytes(out)
+
+
+def load_recorded(path: str) -> list[bytes]:
+    batches = list()
+    with open(path, 'rb') as f:
+        while True:
+            size = f.read(4)
+            if len(size) < 4:
+                break
+            batches.append(f.read(int.from_bytes(size, 'little')))
+    return batches
+
+
+def touch_projected_fields(messages):
+    for message in messages:
+        for field in LAZY_PROJECTION.get(type(message).__name__.removeprefix('Lazy'), ()):
+            getattr(message, field)
+
+
+def run(codec, batches: list[bytes], rounds: int):
+    best = None
+    n_messages = 0
+    for _ in range(rounds):
+        n_messages = 0
+        t = perf_counter()
+        for b in batches:
+            messages = codec.decode_detailed(b)
+            touch_projected_fields(messages)
+            n_messages += len(messages)
+        elapsed = perf_counter() - t
+        best = elapsed if best is None else min(best, elapsed)
+    return best, n_messages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--input', default=None)
+    parser.add_argument('--batches', type=int, default=2000)
+    parser.add_argument('--messages-per-batch', type=int, default=200)
+    parser.add_argument('--rounds', type=int, default=3)
+    args = parser.parse_args()
+
+    if args.input:
+        batches = load_recorded(args.input)
+    else:
+        rnd = random.Random(42)
+        batches = [synthetic_batch(rnd, args.messages_per_batch) for _ in range(args.batches)]
+    total_bytes = sum(len(b) for b in batches)
+    print(f'[INFO] {len(batches)} batches, {total_bytes / 1e6:.2f} MB')
+
+    current = MessageCodec(SELECTED_MESSAGES)
+    previous = BytesIOMessageCodec(SELECTED_MESSAGES)
+    lazy = MessageCodec(SELECTED_MESSAGES, lazy=True, projection=LAZY_PROJECTION)
+    for b in batches[:100]:
+        assert [m.__dict__ for m in current.decode_detailed(b)] == [m.__dict__ for m in previous.decode_detailed(b)]
+
+    for name, codec in [('bytesio', previous), ('memoryview', current), ('lazy', lazy)]:
+        elapsed, n_messages = run(codec, batches, args.rounds)
+        print(f'[INFO] {name:>10}: {len(batches) / elapsed:10.0f} batches/s  {n_messages / elapsed:10.0f} messages/s  '
+              f'{total_bytes / elapsed / 1e6:8.2f} MB/s')
+
+
+if __name__ == '__main__':
+    main()
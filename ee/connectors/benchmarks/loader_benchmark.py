@@ -0,0 +1,139 @@
+"""
+Loader throughput: pandas to_sql (row-wise INSERTs) against the native bulk paths of db/loaders.
+
+usage (from ee/connectors, with the connector env file loaded):
+    python benchmarks/loader_benchmark.py [--rows 1000000] [--live] [--to-sql-rows 20000]
+
+Without --live nothing is sent anywhere: each path only prepares the payload it would send (the local stand-in),
+  to_sql      -> one parameter dict per row, as SQLAlchemy executemany receives them
+  clickhouse  -> numpy columns given to clickhouse_driver insert_dataframe
+  postgres    -> CSV buffer streamed through COPY FROM STDIN
+  snowflake   -> parquet file written by write_pandas before PUT + COPY INTO (needs pyarrow)
+With --live the events are loaded into a scratch copy of the events table of CLOUD_SERVICE (dropped afterwards),
+to_sql only loads --to-sql-rows rows and its rate is extrapolated.
+"""
+from pathlib import Path
+from time import perf_counter
+import argparse
+import io
+import sys
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import numpy as np
+
+from db.columnar import ColumnArrays
+from db.utils import get_df_from_batch, get_schema
+
+# Columns every event has, the others are only filled for the event type of the row (customevent_*, clickevent_*...)
+COMMON_COLUMNS = ['sessionid', 'received_at', 'batch_order_number']
+
+
+def synthetic_events(n_rows: int, seed: int = 42) -> ColumnArrays:
+    rng = np.random.default_rng(seed)
+    dtypes, columns = get_schema('normal')
+    event_types = sorted({name.split('_')[0] for name in columns if name not in COMMON_COLUMNS})
+    row_types = rng.integers(0, len(event_types), n_rows)
+    arrays = dict()
+    for name in columns:
+        if name in COMMON_COLUMNS:
+            mask = np.zeros(n_rows, dtype=bool)
+        else:
+            mask = row_types != event_types.index(name.split('_')[0])
+        kind = dtypes[name]
+        if kind == 'Int64':
+            values = rng.integers(0, 2 ** 40, n_rows)
+        elif kind == 'boolean':
+            values = rng.random(n_rows) < 0.5
+        else:
+            pool = np.array([f'{name}-{i}' * (1 + i % 4) for i in range(1000)], dtype=object)
+            values = pool[rng.integers(0, len(pool), n_rows)]
+        arrays[name] = (values, mask)
+    return ColumnArrays(dtypes, columns, arrays, n_rows)
+
+
+def prepare_to_sql(df):
+    return df.to_dict('records')
+
+
+def prepare_clickhouse(df):
+    from db.loaders.clickhouse_loader import to_numpy_columns
+    return to_numpy_columns(df)
+
+
+def prepare_postgres(df):
+    from db.loaders.postgres_loader import to_csv_buffer
+    return to_csv_buffer(df)
+
+
+def prepare_snowflake(df):
+    buffer = io.BytesIO()
+    df.to_parquet(buffer, compression='snappy')
+    return buffer
+
+
+def timed(function, *args):
+    t = perf_counter()
+    function(*args)
+    return perf_counter() - t
+
+
+def report(name: str, n_rows: int, elapsed: float):
+    print(f'[INFO] {name:>12}: {n_rows / elapsed:12.0f} rows/s  ({n_rows} rows in {elapsed:.2f}s)')
+
+
+def run_stand_in(df):
+    for name, prepare in [('to_sql', prepare_to_sql), ('clickhouse', prepare_clickhouse),
+                          ('postgres', prepare_postgres), ('snowflake', prepare_snowflake)]:
+        try:
+            report(name, len(df), timed(prepare, df))
+        except ImportError as e:
+            print(f'[WARN] {name} skipped: {e}')
+
+
+def run_live(events: ColumnArrays, df, to_sql_rows: int):
+    from db.api import DBConnection
+    from db.models import DATABASE, events_table_name
+    from db.writer import insert_batch
+
+    db = DBConnection(DATABASE)
+    table = f'{events_table_name}_loader_benchmark'
+    if DATABASE == 'clickhouse':
+        create = f'CREATE TABLE {table} AS {events_table_name}'
+    elif DATABASE == 'snowflake':
+        create = f'CREATE TABLE {table} LIKE {events_table_name}'
+    else:
+        create = f'CREATE TABLE {table} (LIKE {events_table_name})'
+    with db.engine.begin() as conn:
+        conn.execute(create)
+    try:
+        sample = df.head(to_sql_rows)
+        report('to_sql', len(sample),
+               timed(lambda: sample.to_sql(table, db.engine, if_exists='append', index=False)))
+        # Same entry point as the connector (DataFrame conversion included), BULK_INSERT decides the loader path
+        report(f'{DATABASE} bulk', len(events), timed(insert_batch, db, events, table, 'normal'))
+    finally:
+        with db.engine.begin() as conn:
+            conn.execute(f'DROP TABLE {table}')
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--live', action='store_true')
+    parser.add_argument('--to-sql-rows', type=int, default=20000)
+    args = parser.parse_args()
+
+    events = synthetic_events(args.rows)
+    t = perf_counter()
+    df = get_df_from_batch(events, level='normal')
+    print(f'[INFO] {args.rows} synthetic events, DataFrame built in {perf_counter() - t:.2f}s')
+    if args.live:
+        run_live(events, df, args.to_sql_rows)
+    else:
+        run_stand_in(df)
+
+
+if __name__ == '__main__':
+    main()
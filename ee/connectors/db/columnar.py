@@ -0,0 +1,109 @@
+import numpy as np
+import pandas as pd
+
+
+class ColumnarBatch:
+    """Rows appended straight into one buffer per column of a dtypes_* schema (db.utils).
+    Handler rows are sparse, so only the fields a row actually has are stored (row index + value);
+    typed arrays are built once in to_arrays"""
+
+    def __init__(self, dtypes: dict[str, str], columns: list[str] = None):
+        self.dtypes = dtypes
+        self.columns = columns or list(dtypes.keys())
+        self.n_rows = 0
+        self._indices = {name: list() for name in self.columns}
+        self._values = {name: list() for name in self.columns}
+
+    def __len__(self):
+        return self.n_rows
+
+    def append(self, row: dict):
+        i = self.n_rows
+        indices = self._indices
+        values = self._values
+        for name, value in row.items():
+            if value is None:
+                continue
+            try:
+                indices[name].append(i)
+            except KeyError:
+                # Attributes out of the schema are dropped, as get_df_from_batch did with the ORM objects
+                continue
+            values[name].append(value)
+        self.n_rows += 1
+
+    def extend(self, rows):
+        for row in rows:
+            self.append(row)
+
+    def to_arrays(self) -> 'ColumnArrays':
+        n = self.n_rows
+        columns = dict()
+        for name in self.columns:
+            kind = self.dtypes[name]
+            idx = np.fromiter(self._indices[name], dtype=np.int64, count=len(self._indices[name]))
+            mask = np.ones(n, dtype=bool)
+            mask[idx] = False
+            if kind == 'Int64':
+                values = np.zeros(n, dtype=np.int64)
+            elif kind == 'boolean':
+                values = np.zeros(n, dtype=bool)
+            else:
+                values = np.full(n, None, dtype=object)
+            if len(idx):
+                values[idx] = self._values[name]
+            columns[name] = (values, mask)
+        return ColumnArrays(self.dtypes, self.columns, columns, n)
+
+
+class ColumnArrays:
+    """Typed numpy columns of a batch as (values, null mask) pairs. This is what the decoding workers return:
+    it pickles as a few arrays instead of one object per row and turns into a DataFrame without copying rows"""
+
+    def __init__(self, dtypes: dict[str, str], columns: list[str], arrays: dict[str, tuple], n_rows: int):
+        self.dtypes = dtypes
+        self.columns = columns
+        self.arrays = arrays
+        self.n_rows = n_rows
+
+    def __len__(self):
+        return self.n_rows
+
+    @classmethod
+    def from_records(cls, records: list[dict], dtypes: dict[str, str], columns: list[str] = None):
+        batch = ColumnarBatch(dtypes, columns)
+        batch.extend(records)
+        return batch.to_arrays()
+
+    @classmethod
+    def concat(cls, parts: list['ColumnArrays']):
+        if len(parts) == 1:
+            return parts[0]
+        first = parts[0]
+        arrays = {name: (np.concatenate([p.arrays[name][0] for p in parts]),
+                         np.concatenate([p.arrays[name][1] for p in parts]))
+                  for name in first.columns}
+        return cls(first.dtypes, first.columns, arrays, sum(p.n_rows for p in parts))
+
+    def to_records(self) -> list[dict]:
+        """Rows as dicts holding only their non null fields, with python values (json serializable)"""
+        records = [dict() for _ in range(self.n_rows)]
+        for name in self.columns:
+            values, mask = self.arrays[name]
+            idx = np.flatnonzero(~mask)
+            for i, value in zip(idx.tolist(), values[idx].tolist()):
+                records[i][name] = value
+        return records
+
+    def to_dataframe(self) -> pd.DataFrame:
+        data = dict()
+        for name in self.columns:
+            values, mask = self.arrays[name]
+            kind = self.dtypes[name]
+            if kind == 'Int64':
+                data[name] = pd.arrays.IntegerArray(values, mask)
+            elif kind == 'boolean':
+                data[name] = pd.arrays.BooleanArray(values, mask)
+            else:
+                data[name] = pd.array(values, dtype=kind)
+        return pd.DataFrame(data, columns=self.columns)
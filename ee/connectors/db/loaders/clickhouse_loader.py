@@ -1,4 +1,61 @@
+from clickhouse_driver import Client
+from decouple import config
+import pandas as pd
 
-def insert_to_clickhouse(db, df, table: str):
-    df.to_sql(table, db.engine, if_exists='append', index=False)
+# Native bulk insert, BULK_INSERT=false goes back to pandas to_sql
+bulk_insert = config('BULK_INSERT', default=True, cast=bool)
+
+
+def get_native_client(db) -> Client:
+    """clickhouse_driver client on the same server as db.engine, created once per connection"""
+    client = getattr(db, 'clickhouse_client', None)
+    if client is None:
+        url = db.engine.url.set(drivername='clickhouse')
+        client = Client.from_url(url.render_as_string(hide_password=False))
+        db.clickhouse_client = client
+    return client
+
+
+def replaces_rows(db, table: str) -> bool:
+    """If rows inserted again into table replace the previous ones of their sessionid: table is a
+    ReplacingMergeTree, or a Buffer flushing into one. Checked once per table and connection"""
+    engines = getattr(db, 'clickhouse_replacing', None)
+    if engines is None:
+        engines = db.clickhouse_replacing = dict()
+    if table not in engines:
+        client = get_native_client(db)
+        query = "SELECT database, engine, engine_full FROM system.tables WHERE database = {database} AND name = %(table)s"
+        rows = client.execute(query.format(database='currentDatabase()'), {'table': table})
+        if rows and rows[0][1] == 'Buffer':
+            # Buffer(database, table, ...), an empty database is the one of the buffer
+            database, destination = [arg.strip(" '`") for arg in rows[0][2][len('Buffer('):].split(',')[:2]]
+            rows = client.execute(query.format(database='%(database)s'),
+                                  {'database': database or rows[0][0], 'table': destination})
+        # ReplacingMergeTree, ReplicatedReplacingMergeTree, SharedReplacingMergeTree
+        engines[table] = len(rows) > 0 and rows[0][1].endswith('ReplacingMergeTree')
+    return engines[table]
 
+
+def to_numpy_columns(df):
+    """Nullable pandas columns as plain numpy ones (object arrays with None where values are missing)"""
+    data = dict()
+    for column in df.columns:
+        values = df[column]
+        if pd.api.types.is_extension_array_dtype(values.dtype):
+            if values.hasnans:
+                values = values.astype(object).where(values.notna(), None)
+            else:
+                values = values.to_numpy(dtype=getattr(values.dtype, 'numpy_dtype', object))
+        data[column] = values
+    return pd.DataFrame(data, columns=df.columns)
+
+
+def insert_to_clickhouse(db, df, table: str):
+    if not bulk_insert:
+        df.to_sql(table, db.engine, if_exists='append', index=False)
+        return
+    # Columns are sent as numpy arrays over the native protocol in a single INSERT
+    client = get_native_client(db)
+    columns = ', '.join(df.columns)
+    client.insert_dataframe(f'INSERT INTO {table} ({columns}) VALUES', to_numpy_columns(df),
+                            settings={'use_numpy': True})
@@ -1,3 +1,56 @@
+from decouple import config
+import io
+
+# COPY FROM STDIN, BULK_INSERT=false goes back to pandas to_sql
+bulk_insert = config('BULK_INSERT', default=True, cast=bool)
+
+
+def to_csv_buffer(df) -> io.StringIO:
+    buffer = io.StringIO()
+    # Missing values are written as \N, so they are not mistaken for empty strings
+    df.to_csv(buffer, index=False, header=False, na_rep='\\N')
+    buffer.seek(0)
+    return buffer
+
+
+def copy_to_postgres(db, df, table: str):
+    buffer = to_csv_buffer(df)
+    columns = ', '.join(df.columns)
+    connection = db.engine.raw_connection()
+    try:
+        with connection.cursor() as cursor:
+            cursor.copy_expert(f"COPY {table} ({columns}) FROM STDIN WITH (FORMAT csv, NULL '\\N')", buffer)
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+
 
 def insert_to_postgres(db, df, table: str):
-    df.to_sql(table, db.engine, if_exists='append', index=False)
+    if not bulk_insert:
+        df.to_sql(table, db.engine, if_exists='append', index=False)
+        return
+    copy_to_postgres(db, df, table)
+
+
+def merge_into_postgres(db, df, table: str):
+    """Updates the rows of table with the same sessionid as df in one statement: df is copied into a temporary
+    staging table (dropped at commit) and joined with UPDATE ... FROM"""
+    buffer = to_csv_buffer(df)
+    columns = ', '.join(df.columns)
+    updates = ', '.join(f'{column} = s.{column}' for column in df.columns if column != 'sessionid')
+    staging = f'{table}_staging'
+    connection = db.engine.raw_connection()
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f'CREATE TEMP TABLE {staging} (LIKE {table}) ON COMMIT DROP')
+            cursor.copy_expert(f"COPY {staging} ({columns}) FROM STDIN WITH (FORMAT csv, NULL '\\N')", buffer)
+            cursor.execute(f'UPDATE {table} SET {updates} FROM {staging} s WHERE {table}.sessionid = s.sessionid')
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
@@ -17,3 +17,20 @@ def insert_df(pr, df, table):
                           redshift_table_name=table,
                           append=True,
                           delimiter='|')
+
+
+def merge_into_redshift(db, df, table):
+    """Updates the rows of table with the same sessionid as df in one statement. df goes through S3 into a
+    temporary staging table (same connection as pandas_redshift), then UPDATE ... FROM joins both tables"""
+    staging = f'{table}_staging'
+    updates = ', '.join(f'{column} = s.{column}' for column in df.columns if column != 'sessionid')
+    try:
+        db.pdredshift.exec_commit(f'CREATE TEMP TABLE {staging} (LIKE {table});')
+        insert_df(db.pdredshift, df, staging)
+        db.pdredshift.exec_commit(f'UPDATE {table} SET {updates} FROM {staging} s '
+                                  f'WHERE {table}.sessionid = s.sessionid;')
+    except InternalError_ as e:
+        print(repr(e))
+        print("merge failed. check stl_load_errors")
+    finally:
+        db.pdredshift.exec_commit(f'DROP TABLE IF EXISTS {staging};')
@@ -1,5 +1,41 @@
+from snowflake.connector.pandas_tools import write_pandas
+from decouple import config
+
+# write_pandas (PUT of parquet files into the table stage + COPY INTO), BULK_INSERT=false goes back to pandas to_sql
+bulk_insert = config('BULK_INSERT', default=True, cast=bool)
+
 
 def insert_to_snowflake(db, df, table):
-    df.to_sql(table, db.engine, if_exists='append', index=False)
+    if not bulk_insert:
+        df.to_sql(table, db.engine, if_exists='append', index=False)
+        return
+    connection = db.engine.raw_connection()
+    try:
+        # Tables are created unquoted, so their name and columns are upper case in snowflake
+        success, n_chunks, n_rows, _ = write_pandas(connection.connection, df, table_name=table.upper(),
+                                                    quote_identifiers=False)
+        if not success:
+            raise ValueError(f'write_pandas could not load {len(df)} rows into {table}')
+    finally:
+        connection.close()
 
 
+def merge_into_snowflake(db, df, table):
+    """Updates the rows of table with the same sessionid as df with a single MERGE, df is loaded first into a
+    temporary staging table with write_pandas"""
+    staging = f'{table}_staging'
+    updates = ', '.join(f'{column} = s.{column}' for column in df.columns if column != 'sessionid')
+    connection = db.engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.execute(f'CREATE OR REPLACE TEMPORARY TABLE {staging} LIKE {table}')
+        success, n_chunks, n_rows, _ = write_pandas(connection.connection, df, table_name=staging.upper(),
+                                                    quote_identifiers=False)
+        if not success:
+            raise ValueError(f'write_pandas could not load {len(df)} rows into {staging}')
+        cursor.execute(f'MERGE INTO {table} t USING {staging} s ON t.sessionid = s.sessionid '
+                       f'WHEN MATCHED THEN UPDATE SET {updates}')
+        cursor.execute(f'DROP TABLE {staging}')
+        connection.commit()
+    finally:
+        connection.close()
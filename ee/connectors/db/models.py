@@ -207,3 +207,15 @@ class DetailedEvent(Base):
     received_at = Column(BigInteger)
     batch_order_number = Column(BigInteger)
 
+
+
+def row_class(model):
+    """Plain attribute container with the columns of model, all defaulting to None like on the ORM instance.
+    Handlers fill these instead of the SQLAlchemy models, rows are only read through their __dict__ when
+    appended into a db.columnar.ColumnarBatch so the per-row instrumentation of the ORM is not needed"""
+    return type(f'{model.__name__}Row', (), dict.fromkeys(column.name for column in model.__table__.columns))
+
+
+SessionRow = row_class(Session)
+EventRow = row_class(Event)
+DetailedEventRow = row_class(DetailedEvent)
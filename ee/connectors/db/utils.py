@@ -1,5 +1,6 @@
 import pandas as pd
 from db.models import DetailedEvent, Event, Session, DATABASE
+from db.columnar import ColumnArrays
 
 dtypes_events = {
     'sessionid': "Int64",
@@ -183,18 +184,22 @@ for col in Session.__dict__:
         sessions_col.append(col)
 
 
-def get_df_from_batch(batch, level):
+def get_schema(level):
+    """dtypes and column order of the table written for the given level"""
     if level == 'normal':
-        df = pd.DataFrame([b.__dict__ for b in batch], columns=events_col)
+        return dtypes_events, events_col
     if level == 'detailed':
-        df = pd.DataFrame([b.__dict__ for b in batch], columns=detailed_events_col)
+        return dtypes_detailed_events, detailed_events_col
     if level == 'sessions':
-        df = pd.DataFrame([b.__dict__ for b in batch], columns=sessions_col)
+        return dtypes_sessions, sessions_col + [col for col in dtypes_sessions if col not in sessions_col]
+
 
-    try:
-        df = df.drop('_sa_instance_state', axis=1)
-    except KeyError:
-        pass
+def get_df_from_batch(batch, level):
+    """batch is either ColumnArrays (as returned by the workers) or a list of rows (objects with __dict__)"""
+    if not isinstance(batch, ColumnArrays):
+        dtypes, columns = get_schema(level)
+        batch = ColumnArrays.from_records([b.__dict__ for b in batch], dtypes, columns)
+    df = batch.to_dataframe()
 
     if level == 'normal':
         current_types = dtypes_events
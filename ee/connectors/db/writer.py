@@ -7,17 +7,17 @@ from db.utils import get_df_from_batch, dtypes_sessions
 from db.tables import *
 
 if DATABASE == 'redshift':
-    from db.loaders.redshift_loader import transit_insert_to_redshift
+    from db.loaders.redshift_loader import transit_insert_to_redshift, merge_into_redshift
     import pandas as pd
 elif DATABASE == 'clickhouse':
-    from db.loaders.clickhouse_loader import insert_to_clickhouse
+    from db.loaders.clickhouse_loader import insert_to_clickhouse, replaces_rows
 elif DATABASE == 'pg':
-    from db.loaders.postgres_loader import insert_to_postgres
+    from db.loaders.postgres_loader import insert_to_postgres, merge_into_postgres
 elif DATABASE == 'bigquery':
     from db.loaders.bigquery_loader import insert_to_bigquery
     from bigquery_utils.create_table import create_tables_bigquery
 elif DATABASE == 'snowflake':
-    from db.loaders.snowflake_loader import insert_to_snowflake
+    from db.loaders.snowflake_loader import insert_to_snowflake, merge_into_snowflake
 else:
     raise Exception(f"{DATABASE}-database not supported")
 
@@ -67,26 +67,32 @@ def insert_batch(db: DBConnection, batch, table, level='normal'):
 
 
 def update_batch(db: DBConnection, batch, table):
+    """Updates the sessions of batch (by sessionid) with one set-based statement per batch"""
     if len(batch) == 0:
         return
     df = get_df_from_batch(batch, level='sessions')
-    base_query = f"UPDATE {table} SET"
     for column_name, column_type in dtypes_sessions.items():
         if column_name == 'sessionid':
             continue
         elif column_type == 'string':
             df[column_name] = df[column_name].fillna('NULL')
-            base_query += f" {column_name} = " + "'{" + f"{column_name}" + "}',"
         else:
             df[column_name] = df[column_name].fillna(0)
-            base_query += f" {column_name} = " + "{" + f"{column_name}" + "},"
-    base_query = base_query[:-1] + " WHERE sessionid = {sessionid};"
-    for i in range(len(df)):
-        if db.config == 'redshift':
-            params = dict(df.iloc[i])
-            query = base_query.format(**params)
-            try:
-                db.pdredshift.exec_commit(query)
-            except Exception as e:
-                print('[ERROR] Error while executing query')
-                print(repr(e))
+
+    if db.config == 'redshift':
+        merge_into_redshift(db=db, df=df, table=table)
+
+    if db.config == 'clickhouse':
+        # Sessions table is a ReplacingMergeTree on sessionid: the new row replaces the previous one on merge.
+        # Into a plain MergeTree (created before) the rows would be duplicated, see sql/clickhouse_sessions_migration.sql
+        if replaces_rows(db, table):
+            insert_to_clickhouse(db=db, df=df, table=table)
+        else:
+            print(f'[WARN] {table} is not a ReplacingMergeTree, sessions updates are skipped. '
+                  f'Run sql/clickhouse_sessions_migration.sql to convert it')
+
+    if db.config == 'pg':
+        merge_into_postgres(db=db, df=df, table=table)
+
+    if db.config == 'snowflake':
+        merge_into_snowflake(db=db, df=df, table=table)
@@ -1,12 +1,38 @@
 from typing import Optional, Union
+import ast
+import inspect
+import textwrap
 
-from db.models import Event, DetailedEvent, Session
+from db.models import EventRow, DetailedEventRow, SessionRow
 from messages import *
 
 
-def handle_normal_message(message: Message) -> Optional[Event]:
-
-    n = Event()
+def message_projection(*handlers) -> dict[str, set[str]]:
+    """Fields read by the given handlers for each message type, found by walking the isinstance(message, ...)
+    branches of their source. Passed as MessageCodec projection so that fields nobody reads are never decoded"""
+    projection = dict()
+    for handler in handlers:
+        tree = ast.parse(textwrap.dedent(inspect.getsource(handler)))
+        for node in ast.walk(tree):
+            if not isinstance(node, ast.If):
+                continue
+            message_types = [call.args[1].id for call in ast.walk(node.test)
+                             if isinstance(call, ast.Call) and isinstance(call.func, ast.Name)
+                             and call.func.id == 'isinstance' and len(call.args) == 2
+                             and isinstance(call.args[1], ast.Name)]
+            if not message_types:
+                continue
+            fields = {attr.attr for stmt in node.body for attr in ast.walk(stmt)
+                      if isinstance(attr, ast.Attribute) and isinstance(attr.value, ast.Name)
+                      and attr.value.id == 'message' and not attr.attr.startswith('__')}
+            for message_type in message_types:
+                projection.setdefault(message_type, set()).update(fields)
+    return projection
+
+
+def handle_normal_message(message: Message) -> Optional[EventRow]:
+
+    n = EventRow()
 
     if isinstance(message, ConnectionInformation):
         n.connectioninformation_downlink = message.downlink
@@ -95,10 +121,10 @@ def handle_normal_message(message: Message) -> Optional[Event]:
         return n
 
 
-def handle_session(n: Session, message: Message) -> Optional[Session]:
+def handle_session(n: SessionRow, message: Message) -> Optional[SessionRow]:
 
     if not n:
-        n = Session()
+        n = SessionRow()
 
     if isinstance(message, SessionStart):
         n.session_start_timestamp = message.timestamp
@@ -251,8 +277,8 @@ def handle_session(n: Session, message: Message) -> Optional[Session]:
         return n
 
 
-def handle_message(message: Message) -> Optional[DetailedEvent]:
-    n = DetailedEvent()
+def handle_message(message: Message) -> Optional[DetailedEventRow]:
+    n = DetailedEventRow()
 
     # if isinstance(message, SessionEnd):
     #     n.sessionend = True
@@ -1,51 +1,64 @@
-import io
-
-class Codec:
+class BufferReader:
     """
-    Implements encode/decode primitives
+    Read cursor over a memoryview of a raw message batch.
+    Reading advances an integer offset, so no bytes object is allocated per read byte
+    and skipping a message is just moving the offset.
     """
+    __slots__ = ('buf', 'pos', 'size')
 
-    @staticmethod
-    def read_boolean(reader: io.BytesIO):
-        b = reader.read(1)
+    def __init__(self, b):
+        self.buf = memoryview(b)
+        self.pos = 0
+        self.size = len(self.buf)
+
+    def skip(self, n: int):
+        self.pos += n
+
+    def read_boolean(self) -> bool:
+        try:
+            b = self.buf[self.pos]
+        except IndexError:
+            raise IndexError('bytes out of range')
+        self.pos += 1
         return b == 1
 
-    @staticmethod
-    def read_uint(reader: io.BytesIO):
+    def read_uint(self) -> int:
         """
         The ending "big" doesn't play any role here,
         since we're dealing with data per one byte
         """
+        buf = self.buf
+        pos = self.pos
         x = 0  # the result
         s = 0  # the shift (our result is big-ending)
         i = 0  # n of byte (max 9 for uint64)
         while True:
-            b = reader.read(1)
-            if len(b) == 0:
+            try:
+                num = buf[pos]
+            except IndexError:
+                self.pos = pos
                 raise IndexError('bytes out of range')
-            num = int.from_bytes(b, "big", signed=False)
-            # print(i, x)
-
+            pos += 1
             if num < 0x80:
-                if i > 9 | i == 9 & num > 1:
+                if i > 9 or (i == 9 and num > 1):
                     raise OverflowError()
-                return int(x | num << s)
+                self.pos = pos
+                return x | num << s
             x |= (num & 0x7f) << s
             s += 7
             i += 1
 
-    @staticmethod
-    def read_size(reader: io.BytesIO):
-        size = 0
-        for i in range(3):
-            b = reader.read(1)
-            num = int.from_bytes(b, "big", signed=False)
-            size += num << (8*i)
+    def read_size(self) -> int:
+        buf = self.buf
+        pos = self.pos
+        try:
+            size = buf[pos] | buf[pos + 1] << 8 | buf[pos + 2] << 16
+        except IndexError:
+            raise IndexError('bytes out of range')
+        self.pos = pos + 3
         return size
 
-
-    @staticmethod
-    def read_int(reader: io.BytesIO) -> int:
+    def read_int(self) -> int:
         """
         ux, err := ReadUint(reader)
         x := int64(ux >> 1)
@@ -57,22 +70,42 @@ class Codec:
         }
         return x, err
         """
-        ux = Codec.read_uint(reader)
-        x = int(ux >> 1)
+        ux = self.read_uint()
+        x = ux >> 1
 
         if ux & 1 != 0:
             x = - x - 1
         return x
 
+    def read_string(self) -> str:
+        length = self.read_uint()
+        start = self.pos
+        self.pos = start + length
+        # Decoding straight from the memoryview slice avoids copying the payload into a bytes object first
+        return str(self.buf[start:start + length], 'utf-8', 'replace').replace("\x00", "\uFFFD")
+
+
+class Codec:
+    """
+    Implements encode/decode primitives
+    """
+
     @staticmethod
-    def read_string(reader: io.BytesIO) -> str:
-        length = Codec.read_uint(reader)
-        try:
-            s = reader.read(length)
-        except Exception as e:
-            print(f'Error while reading string of length {length}')
-            raise Exception(e)
-        try:
-            return s.decode("utf-8", errors="replace").replace("\x00", "\uFFFD")
-        except UnicodeDecodeError:
-            return None
+    def read_boolean(reader: BufferReader):
+        return reader.read_boolean()
+
+    @staticmethod
+    def read_uint(reader: BufferReader):
+        return reader.read_uint()
+
+    @staticmethod
+    def read_size(reader: BufferReader):
+        return reader.read_size()
+
+    @staticmethod
+    def read_int(reader: BufferReader) -> int:
+        return reader.read_int()
+
+    @staticmethod
+    def read_string(reader: BufferReader) -> str:
+        return reader.read_string()
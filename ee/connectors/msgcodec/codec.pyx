@@ -1,63 +1,65 @@
-cimport io
+from cpython.unicode cimport PyUnicode_DecodeUTF8
 from libc.stdlib cimport abort
 
 cdef extern from "Python.h":
     int PyArg_ParseTupleAndKeywords(object args, object kwargs, char* format, char** keywords, ...)
 
-ctypedef object PyBytesIO
 
-cdef class Codec:
+cdef class BufferReader:
     """
-    Implements encode/decode primitives
+    Read cursor over a memoryview of a raw message batch.
+    Reading advances an integer offset, so no bytes object is allocated per read byte
+    and skipping a message is just moving the offset.
     """
+    cdef const unsigned char[:] buf
+    cdef public Py_ssize_t pos
+    cdef public Py_ssize_t size
 
-    @staticmethod
-    cdef read_boolean(PyBytesIO reader):
-        cdef bint b
-        b = reader.read(1)[0]
-        return b == 1
+    def __init__(self, b):
+        self.buf = b
+        self.pos = 0
+        self.size = self.buf.shape[0]
 
-    @staticmethod
-    def read_bool_method(PyBytesIO reader):
-        return Codec.read_boolean(reader)
+    cpdef skip(self, Py_ssize_t n):
+        self.pos += n
 
-    @staticmethod
-    cdef read_uint(PyBytesIO reader):
-        cdef int x = 0  # the result
-        cdef int s = 0  # the shift (our result is big-ending)
+    cpdef read_boolean(self):
+        cdef unsigned char b
+        if self.pos >= self.size:
+            raise IndexError('bytes out of range')
+        b = self.buf[self.pos]
+        self.pos += 1
+        return b == 1
+
+    cpdef read_uint(self):
+        cdef unsigned long x = 0  # the result
+        cdef unsigned int s = 0  # the shift (our result is big-ending)
         cdef int i = 0  # n of byte (max 9 for uint64)
-        cdef bytes b
-        cdef int num
+        cdef unsigned long num
 
         while True:
-            b = reader.read(1)
-            if len(b) == 0:
+            if self.pos >= self.size:
                 raise IndexError('bytes out of range')
-
-            num = int.from_bytes(b, "big", signed=False)
+            num = self.buf[self.pos]
+            self.pos += 1
 
             if num < 0x80:
                 if i > 9 or (i == 9 and num > 1):
                     raise OverflowError()
-                return int(x | num << s)
+                return x | num << s
             x |= (num & 0x7f) << s
             s += 7
             i += 1
 
-    @staticmethod
-    def read_size(PyBytesIO reader):
-        cdef int size = 0
-        cdef bytes b
-        cdef int num
-        for i in range(3):
-            b = reader.read(1)
-            num = int.from_bytes(b, "big", signed=False)
-            size += num << (8*i)
+    cpdef read_size(self):
+        cdef unsigned long size
+        if self.pos + 3 > self.size:
+            raise IndexError('bytes out of range')
+        size = self.buf[self.pos] | self.buf[self.pos + 1] << 8 | self.buf[self.pos + 2] << 16
+        self.pos += 3
         return size
 
-
-    @staticmethod
-    def read_int(PyBytesIO reader):
+    cpdef read_int(self):
         """
         ux, err := ReadUint(reader)
         x := int64(ux >> 1)
@@ -69,24 +71,47 @@ cdef class Codec:
         }
         return x, err
         """
-        cdef int ux = Codec.read_uint(reader)
-        cdef int x = int(ux >> 1)
+        cdef unsigned long ux = self.read_uint()
+        cdef long x = ux >> 1
 
         if ux & 1 != 0:
             x = - x - 1
         return x
 
+    cpdef read_string(self):
+        cdef Py_ssize_t length = self.read_uint()
+        cdef Py_ssize_t start = self.pos
+        cdef Py_ssize_t end = start + length
+        self.pos = end
+        if end > self.size:
+            end = self.size
+        if end <= start:
+            return ''
+        # Decoding straight from the buffer avoids copying the payload into a bytes object first
+        return PyUnicode_DecodeUTF8(<const char*> &self.buf[start], end - start, "replace").replace("\x00", "\uFFFD")
+
+
+cdef class Codec:
+    """
+    Implements encode/decode primitives
+    """
+
     @staticmethod
-    def read_string(PyBytesIO reader):
-        cdef int length = Codec.read_uint(reader)
-        cdef int s
-        try:
-            s = reader.read(length)
-        except Exception as e:
-            print(f'Error while reading string of length {length}')
-            raise Exception(e)
-        try:
-            return s.decode("utf-8", errors="replace").replace("\x00", "\uFFFD")
-        except UnicodeDecodeError:
-            return None
+    def read_boolean(BufferReader reader):
+        return reader.read_boolean()
 
+    @staticmethod
+    def read_uint(BufferReader reader):
+        return reader.read_uint()
+
+    @staticmethod
+    def read_size(BufferReader reader):
+        return reader.read_size()
+
+    @staticmethod
+    def read_int(BufferReader reader):
+        return reader.read_int()
+
+    @staticmethod
+    def read_string(BufferReader reader):
+        return reader.read_string()
@@ -1,8 +1,7 @@
 # Auto-generated, do not edit
 
 from messages import *
-#from io cimport BytesIO
-from io import BytesIO
+from cpython.unicode cimport PyUnicode_DecodeUTF8
 from libc.stdlib cimport abort
 
 cdef extern from "Python.h":
@@ -12,64 +11,64 @@ cdef class PyMsg:
     def __cinit__(self):
         pass
 
-ctypedef object PyBytesIO
 
-cdef class MessageCodec:
+cdef class BufferReader:
     """
-    Implements encode/decode primitives
+    Read cursor over a memoryview of a raw message batch.
+    Reading advances an integer offset, so no bytes object is allocated per read byte
+    and skipping a message is just moving the offset.
     """
-    cdef list msg_selector
-
-    def __init__(self, list msg_selector):
-        self.msg_selector = msg_selector
-
-    @staticmethod
-    cdef read_boolean(PyBytesIO reader):
-        cdef bint b
-        b = reader.read(1)[0]
+    cdef const unsigned char[:] buf
+    cdef readonly object view
+    cdef public Py_ssize_t pos
+    cdef public Py_ssize_t size
+
+    def __init__(self, b):
+        self.view = memoryview(b)
+        self.buf = self.view
+        self.pos = 0
+        self.size = self.buf.shape[0]
+
+    cpdef skip(self, Py_ssize_t n):
+        self.pos += n
+
+    cpdef read_boolean(self):
+        cdef unsigned char b
+        if self.pos >= self.size:
+            raise IndexError('bytes out of range')
+        b = self.buf[self.pos]
+        self.pos += 1
         return b == 1
 
-    @staticmethod
-    def read_bool_method(PyBytesIO reader):
-        return MessageCodec.read_boolean(reader)
-
-    @staticmethod
-    cdef read_uint(PyBytesIO reader):
+    cpdef read_uint(self):
         cdef unsigned long x = 0  # the result
         cdef unsigned int s = 0  # the shift (our result is big-ending)
         cdef int i = 0  # n of byte (max 9 for uint64)
-        cdef bytes b
         cdef unsigned long num
 
         while True:
-            b = reader.read(1)
-            if len(b) == 0:
+            if self.pos >= self.size:
                 raise IndexError('bytes out of range')
-
-            num = int.from_bytes(b, "big", signed=False)
+            num = self.buf[self.pos]
+            self.pos += 1
 
             if num < 0x80:
                 if i > 9 or (i == 9 and num > 1):
                     raise OverflowError()
-                return int(x | num << s)
+                return x | num << s
             x |= (num & 0x7f) << s
             s += 7
             i += 1
 
-    @staticmethod
-    def read_size(PyBytesIO reader):
-        cdef unsigned long size = 0
-        cdef bytes b
-        cdef unsigned long num
-        for i in range(3):
-            b = reader.read(1)
-            num = int.from_bytes(b, "big", signed=False)
-            size += num << (8*i)
+    cpdef read_size(self):
+        cdef unsigned long size
+        if self.pos + 3 > self.size:
+            raise IndexError('bytes out of range')
+        size = self.buf[self.pos] | self.buf[self.pos + 1] << 8 | self.buf[self.pos + 2] << 16
+        self.pos += 3
         return size
 
-
-    @staticmethod
-    def read_int(PyBytesIO reader):
+    cpdef read_int(self):
         """
         ux, err := ReadUint(reader)
         x := int64(ux >> 1)
@@ -81,52 +80,216 @@ cdef class MessageCodec:
         }
         return x, err
         """
-        cdef unsigned long ux = MessageCodec.read_uint(reader)
-        cdef long x = int(ux >> 1)
+        cdef unsigned long ux = self.read_uint()
+        cdef long x = ux >> 1
 
         if ux & 1 != 0:
             x = - x - 1
         return x
 
-    @staticmethod
-    def read_string(PyBytesIO reader):
-        cdef unsigned long length = MessageCodec.read_uint(reader)
-        cdef bytes s
-        try:
-            s = reader.read(length)
-        except Exception as e:
-            print(f'Error while reading string of length {length}')
-            raise Exception(e)
+    cpdef read_string(self):
+        cdef Py_ssize_t length = self.read_uint()
+        cdef Py_ssize_t start = self.pos
+        cdef Py_ssize_t end = start + length
+        self.pos = end
+        if end > self.size:
+            end = self.size
+        if end <= start:
+            return ''
+        # Decoding straight from the buffer avoids copying the payload into a bytes object first
+        return PyUnicode_DecodeUTF8(<const char*> &self.buf[start], end - start, "replace").replace("\x00", "\uFFFD")
+
+
+# Field layout of every message (name, type), in wire order. Used to build lazily decoded messages
+MESSAGE_LAYOUTS = {
+    0: (Timestamp, [('timestamp', 'uint')]),
+    1: (SessionStart, [('timestamp', 'uint'), ('project_id', 'uint'), ('tracker_version', 'string'), ('rev_id', 'string'), ('user_uuid', 'string'), ('user_agent', 'string'), ('user_os', 'string'), ('user_os_version', 'string'), ('user_browser', 'string'), ('user_browser_version', 'string'), ('user_device', 'string'), ('user_device_type', 'string'), ('user_device_memory_size', 'uint'), ('user_device_heap_size', 'uint'), ('user_country', 'string'), ('user_id', 'string')]),
+    4: (SetPageLocationDeprecated, [('url', 'string'), ('referrer', 'string'), ('navigation_start', 'uint')]),
+    5: (SetViewportSize, [('width', 'uint'), ('height', 'uint')]),
+    6: (SetViewportScroll, [('x', 'int'), ('y', 'int')]),
+    7: (CreateDocument, []),
+    8: (CreateElementNode, [('id', 'uint'), ('parent_id', 'uint'), ('index', 'uint'), ('tag', 'string'), ('svg', 'boolean')]),
+    9: (CreateTextNode, [('id', 'uint'), ('parent_id', 'uint'), ('index', 'uint')]),
+    10: (MoveNode, [('id', 'uint'), ('parent_id', 'uint'), ('index', 'uint')]),
+    11: (RemoveNode, [('id', 'uint')]),
+    12: (SetNodeAttribute, [('id', 'uint'), ('name', 'string'), ('value', 'string')]),
+    13: (RemoveNodeAttribute, [('id', 'uint'), ('name', 'string')]),
+    14: (SetNodeData, [('id', 'uint'), ('data', 'string')]),
+    15: (SetCSSData, [('id', 'uint'), ('data', 'string')]),
+    16: (SetNodeScroll, [('id', 'uint'), ('x', 'int'), ('y', 'int')]),
+    17: (SetInputTarget, [('id', 'uint'), ('label', 'string')]),
+    18: (SetInputValue, [('id', 'uint'), ('value', 'string'), ('mask', 'int')]),
+    19: (SetInputChecked, [('id', 'uint'), ('checked', 'boolean')]),
+    20: (MouseMove, [('x', 'uint'), ('y', 'uint')]),
+    21: (NetworkRequestDeprecated, [('type', 'string'), ('method', 'string'), ('url', 'string'), ('request', 'string'), ('response', 'string'), ('status', 'uint'), ('timestamp', 'uint'), ('duration', 'uint')]),
+    22: (ConsoleLog, [('level', 'string'), ('value', 'string')]),
+    23: (PageLoadTiming, [('request_start', 'uint'), ('response_start', 'uint'), ('response_end', 'uint'), ('dom_content_loaded_event_start', 'uint'), ('dom_content_loaded_event_end', 'uint'), ('load_event_start', 'uint'), ('load_event_end', 'uint'), ('first_paint', 'uint'), ('first_contentful_paint', 'uint')]),
+    24: (PageRenderTiming, [('speed_index', 'uint'), ('visually_complete', 'uint'), ('time_to_interactive', 'uint')]),
+    26: (IntegrationEvent, [('timestamp', 'uint'), ('source', 'string'), ('name', 'string'), ('message', 'string'), ('payload', 'string')]),
+    27: (CustomEvent, [('name', 'string'), ('payload', 'string')]),
+    28: (UserID, [('id', 'string')]),
+    29: (UserAnonymousID, [('id', 'string')]),
+    30: (Metadata, [('key', 'string'), ('value', 'string')]),
+    31: (PageEventDeprecated, [('message_id', 'uint'), ('timestamp', 'uint'), ('url', 'string'), ('referrer', 'string'), ('loaded', 'boolean'), ('request_start', 'uint'), ('response_start', 'uint'), ('response_end', 'uint'), ('dom_content_loaded_event_start', 'uint'), ('dom_content_loaded_event_end', 'uint'), ('load_event_start', 'uint'), ('load_event_end', 'uint'), ('first_paint', 'uint'), ('first_contentful_paint', 'uint'), ('speed_index', 'uint'), ('visually_complete', 'uint'), ('time_to_interactive', 'uint')]),
+    32: (InputEvent, [('message_id', 'uint'), ('timestamp', 'uint'), ('value', 'string'), ('value_masked', 'boolean'), ('label', 'string')]),
+    33: (PageEvent, [('message_id', 'uint'), ('timestamp', 'uint'), ('url', 'string'), ('referrer', 'string'), ('loaded', 'boolean'), ('request_start', 'uint'), ('response_start', 'uint'), ('response_end', 'uint'), ('dom_content_loaded_event_start', 'uint'), ('dom_content_loaded_event_end', 'uint'), ('load_event_start', 'uint'), ('load_event_end', 'uint'), ('first_paint', 'uint'), ('first_contentful_paint', 'uint'), ('speed_index', 'uint'), ('visually_complete', 'uint'), ('time_to_interactive', 'uint'), ('web_vitals', 'string')]),
+    34: (StringDictGlobal, [('key', 'uint'), ('value', 'string')]),
+    35: (SetNodeAttributeDictGlobal, [('id', 'uint'), ('name', 'uint'), ('value', 'uint')]),
+    40: (Profiler, [('name', 'string'), ('duration', 'uint'), ('args', 'string'), ('result', 'string')]),
+    41: (OTable, [('key', 'string'), ('value', 'string')]),
+    42: (StateAction, [('type', 'string')]),
+    44: (ReduxDeprecated, [('action', 'string'), ('state', 'string'), ('duration', 'uint')]),
+    45: (Vuex, [('mutation', 'string'), ('state', 'string')]),
+    46: (MobX, [('type', 'string'), ('payload', 'string')]),
+    47: (NgRx, [('action', 'string'), ('state', 'string'), ('duration', 'uint')]),
+    48: (GraphQLDeprecated, [('operation_kind', 'string'), ('operation_name', 'string'), ('variables', 'string'), ('response', 'string'), ('duration', 'int')]),
+    49: (PerformanceTrack, [('frames', 'int'), ('ticks', 'int'), ('total_js_heap_size', 'uint'), ('used_js_heap_size', 'uint')]),
+    50: (StringDictDeprecated, [('key', 'uint'), ('value', 'string')]),
+    51: (SetNodeAttributeDictDeprecated, [('id', 'uint'), ('name_key', 'uint'), ('value_key', 'uint')]),
+    43: (StringDict, [('key', 'string'), ('value', 'string')]),
+    52: (SetNodeAttributeDict, [('id', 'uint'), ('name', 'string'), ('value', 'string')]),
+    53: (ResourceTimingDeprecated, [('timestamp', 'uint'), ('duration', 'uint'), ('ttfb', 'uint'), ('header_size', 'uint'), ('encoded_body_size', 'uint'), ('decoded_body_size', 'uint'), ('url', 'string'), ('initiator', 'string')]),
+    54: (ConnectionInformation, [('downlink', 'uint'), ('type', 'string')]),
+    55: (SetPageVisibility, [('hidden', 'boolean')]),
+    56: (PerformanceTrackAggr, [('timestamp_start', 'uint'), ('timestamp_end', 'uint'), ('min_fps', 'uint'), ('avg_fps', 'uint'), ('max_fps', 'uint'), ('min_cpu', 'uint'), ('avg_cpu', 'uint'), ('max_cpu', 'uint'), ('min_total_js_heap_size', 'uint'), ('avg_total_js_heap_size', 'uint'), ('max_total_js_heap_size', 'uint'), ('min_used_js_heap_size', 'uint'), ('avg_used_js_heap_size', 'uint'), ('max_used_js_heap_size', 'uint')]),
+    57: (LoadFontFace, [('parent_id', 'uint'), ('family', 'string'), ('source', 'string'), ('descriptors', 'string')]),
+    58: (SetNodeFocus, [('id', 'int')]),
+    60: (SetNodeAttributeURLBased, [('id', 'uint'), ('name', 'string'), ('value', 'string'), ('base_url', 'string')]),
+    61: (SetCSSDataURLBased, [('id', 'uint'), ('data', 'string'), ('base_url', 'string')]),
+    63: (TechnicalInfo, [('type', 'string'), ('value', 'string')]),
+    64: (CustomIssue, [('name', 'string'), ('payload', 'string')]),
+    66: (AssetCache, [('url', 'string')]),
+    68: (MouseClick, [('id', 'uint'), ('hesitation_time', 'uint'), ('label', 'string'), ('selector', 'string'), ('normalized_x', 'uint'), ('normalized_y', 'uint')]),
+    69: (MouseClickDeprecated, [('id', 'uint'), ('hesitation_time', 'uint'), ('label', 'string'), ('selector', 'string')]),
+    70: (CreateIFrameDocument, [('frame_id', 'uint'), ('id', 'uint')]),
+    71: (AdoptedSSReplaceURLBased, [('sheet_id', 'uint'), ('text', 'string'), ('base_url', 'string')]),
+    72: (AdoptedSSReplace, [('sheet_id', 'uint'), ('text', 'string')]),
+    73: (AdoptedSSInsertRuleURLBased, [('sheet_id', 'uint'), ('rule', 'string'), ('index', 'uint'), ('base_url', 'string')]),
+    74: (AdoptedSSInsertRule, [('sheet_id', 'uint'), ('rule', 'string'), ('index', 'uint')]),
+    75: (AdoptedSSDeleteRule, [('sheet_id', 'uint'), ('index', 'uint')]),
+    76: (AdoptedSSAddOwner, [('sheet_id', 'uint'), ('id', 'uint')]),
+    77: (AdoptedSSRemoveOwner, [('sheet_id', 'uint'), ('id', 'uint')]),
+    78: (JSException, [('name', 'string'), ('message', 'string'), ('payload', 'string'), ('metadata', 'string')]),
+    79: (Zustand, [('mutation', 'string'), ('state', 'string')]),
+    81: (BatchMetadata, [('version', 'uint'), ('page_no', 'uint'), ('first_index', 'uint'), ('timestamp', 'int'), ('location', 'string')]),
+    82: (PartitionedMessage, [('part_no', 'uint'), ('part_total', 'uint')]),
+    83: (NetworkRequest, [('type', 'string'), ('method', 'string'), ('url', 'string'), ('request', 'string'), ('response', 'string'), ('status', 'uint'), ('timestamp', 'uint'), ('duration', 'uint'), ('transferred_body_size', 'uint')]),
+    84: (WSChannel, [('ch_type', 'string'), ('channel_name', 'string'), ('data', 'string'), ('timestamp', 'uint'), ('dir', 'string'), ('message_type', 'string')]),
+    112: (InputChange, [('id', 'uint'), ('value', 'string'), ('value_masked', 'boolean'), ('label', 'string'), ('hesitation_time', 'int'), ('input_duration', 'int')]),
+    113: (SelectionChange, [('selection_start', 'uint'), ('selection_end', 'uint'), ('selection', 'string')]),
+    114: (MouseThrashing, [('timestamp', 'uint')]),
+    115: (UnbindNodes, [('total_removed_percent', 'uint')]),
+    116: (ResourceTiming, [('timestamp', 'uint'), ('duration', 'uint'), ('ttfb', 'uint'), ('header_size', 'uint'), ('encoded_body_size', 'uint'), ('decoded_body_size', 'uint'), ('url', 'string'), ('initiator', 'string'), ('transferred_size', 'uint'), ('cached', 'boolean')]),
+    117: (TabChange, [('tab_id', 'string')]),
+    118: (TabData, [('tab_id', 'string')]),
+    119: (CanvasNode, [('node_id', 'string'), ('timestamp', 'uint')]),
+    120: (TagTrigger, [('tag_id', 'int')]),
+    121: (Redux, [('action', 'string'), ('state', 'string'), ('duration', 'uint'), ('action_time', 'uint')]),
+    122: (SetPageLocation, [('url', 'string'), ('referrer', 'string'), ('navigation_start', 'uint'), ('document_title', 'string')]),
+    123: (GraphQL, [('operation_kind', 'string'), ('operation_name', 'string'), ('variables', 'string'), ('response', 'string'), ('duration', 'uint')]),
+    124: (WebVitals, [('name', 'string'), ('value', 'string')]),
+    125: (IssueEvent, [('message_id', 'uint'), ('timestamp', 'uint'), ('type', 'string'), ('context_string', 'string'), ('context', 'string'), ('payload', 'string'), ('url', 'string')]),
+    126: (SessionEnd, [('timestamp', 'uint'), ('encryption_key', 'string')]),
+    127: (SessionSearch, [('timestamp', 'uint'), ('partition', 'uint')]),
+    90: (MobileSessionStart, [('timestamp', 'uint'), ('project_id', 'uint'), ('tracker_version', 'string'), ('rev_id', 'string'), ('user_uuid', 'string'), ('user_os', 'string'), ('user_os_version', 'string'), ('user_device', 'string'), ('user_device_type', 'string'), ('user_country', 'string')]),
+    91: (MobileSessionEnd, [('timestamp', 'uint')]),
+    92: (MobileMetadata, [('timestamp', 'uint'), ('length', 'uint'), ('key', 'string'), ('value', 'string')]),
+    93: (MobileEvent, [('timestamp', 'uint'), ('length', 'uint'), ('name', 'string'), ('payload', 'string')]),
+    94: (MobileUserID, [('timestamp', 'uint'), ('length', 'uint'), ('id', 'string')]),
+    95: (MobileUserAnonymousID, [('timestamp', 'uint'), ('length', 'uint'), ('id', 'string')]),
+    96: (MobileScreenChanges, [('timestamp', 'uint'), ('length', 'uint'), ('x', 'uint'), ('y', 'uint'), ('width', 'uint'), ('height', 'uint')]),
+    97: (MobileCrash, [('timestamp', 'uint'), ('length', 'uint'), ('name', 'string'), ('reason', 'string'), ('stacktrace', 'string')]),
+    98: (MobileViewComponentEvent, [('timestamp', 'uint'), ('length', 'uint'), ('screen_name', 'string'), ('view_name', 'string'), ('visible', 'boolean')]),
+    100: (MobileClickEvent, [('timestamp', 'uint'), ('length', 'uint'), ('label', 'string'), ('x', 'uint'), ('y', 'uint')]),
+    101: (MobileInputEvent, [('timestamp', 'uint'), ('length', 'uint'), ('value', 'string'), ('value_masked', 'boolean'), ('label', 'string')]),
+    102: (MobilePerformanceEvent, [('timestamp', 'uint'), ('length', 'uint'), ('name', 'string'), ('value', 'uint')]),
+    103: (MobileLog, [('timestamp', 'uint'), ('length', 'uint'), ('severity', 'string'), ('content', 'string')]),
+    104: (MobileInternalError, [('timestamp', 'uint'), ('length', 'uint'), ('content', 'string')]),
+    105: (MobileNetworkCall, [('timestamp', 'uint'), ('length', 'uint'), ('type', 'string'), ('method', 'string'), ('url', 'string'), ('request', 'string'), ('response', 'string'), ('status', 'uint'), ('duration', 'uint')]),
+    106: (MobileSwipeEvent, [('timestamp', 'uint'), ('length', 'uint'), ('label', 'string'), ('x', 'uint'), ('y', 'uint'), ('direction', 'string')]),
+    107: (MobileBatchMeta, [('timestamp', 'uint'), ('length', 'uint'), ('first_index', 'uint')]),
+    110: (MobilePerformanceAggregated, [('timestamp_start', 'uint'), ('timestamp_end', 'uint'), ('min_fps', 'uint'), ('avg_fps', 'uint'), ('max_fps', 'uint'), ('min_cpu', 'uint'), ('avg_cpu', 'uint'), ('max_cpu', 'uint'), ('min_memory', 'uint'), ('avg_memory', 'uint'), ('max_memory', 'uint'), ('min_battery', 'uint'), ('avg_battery', 'uint'), ('max_battery', 'uint')]),
+    111: (MobileIssueEvent, [('timestamp', 'uint'), ('type', 'string'), ('context_string', 'string'), ('context', 'string'), ('payload', 'string')]),
+}
+
+
+def _lazy_field(name: str):
+    def get(self):
         try:
-            return s.decode("utf-8", errors="replace").replace("\x00", "\uFFFD")
-        except UnicodeDecodeError:
-            return None
+            value = self._lazy_values[name]
+        except KeyError:
+            raise AttributeError(f"'{name}' is not part of the projection of {type(self).__name__}")
+        if type(value) is tuple:
+            # String fields keep the (start, end) offsets of their bytes until the first access
+            start, end = value
+            value = str(self._lazy_buf[start:end], 'utf-8', 'replace').replace("\x00", "\uFFFD")
+            self._lazy_values[name] = value
+        return value
+    return property(get)
+
+
+def lazy_message_class(message_class, message_id: int, fields):
+    """
+    Subclass of message_class whose fields are decoded from the batch buffer on first access,
+    it still passes every isinstance check done on message_class
+    """
+    attributes = {name: _lazy_field(name) for name in fields}
+    attributes['__slots__'] = ('_lazy_buf', '_lazy_values')
+    attributes['__id__'] = message_id
+    return type(f'Lazy{message_class.__name__}', (message_class,), attributes)
+
+
+cdef class MessageCodec:
+    """
+    Implements encode/decode primitives
+    """
+    cdef list msg_selector
+    cdef dict lazy_layouts
+
+    def __init__(self, list msg_selector, bint lazy = False, dict projection = None):
+        """
+        lazy: return messages whose string fields are only decoded when accessed
+        projection: message class name -> fields to keep when lazy. The other fields are skipped and raise
+                    AttributeError when accessed, message types that are not listed keep all their fields.
+        Messages without string fields are always decoded eagerly, reading a varint costs the same as skipping it
+        """
+        self.msg_selector = msg_selector
+        self.lazy_layouts = dict()
+        if lazy:
+            projection = projection or dict()
+            for message_id, (message_class, layout) in MESSAGE_LAYOUTS.items():
+                if all(type_ != 'string' for _, type_ in layout):
+                    continue
+                fields = projection.get(message_class.__name__)
+                self.lazy_layouts[message_id] = (
+                    lazy_message_class(message_class, message_id, [name for name, _ in layout]),
+                    [(name, type_, fields is None or name in fields) for name, type_ in layout]
+                )
 
     @staticmethod
-    def read_message_id(PyBytesIO reader):
+    def read_message_id(BufferReader reader):
         """
         Read and return the first byte where the message id is encoded
         """
-        cdef unsigned long id_ = MessageCodec.read_uint(reader)
+        cdef unsigned long id_ = reader.read_uint()
         return id_
 
     @staticmethod
     def encode(PyMsg m):
         ...
 
-    @staticmethod
-    def decode(bytes b):
-        cdef PyBytesIO reader = BytesIO(b)
-        return MessageCodec.read_head_message(reader)
+    def decode(self, b):
+        cdef BufferReader reader = BufferReader(b)
+        return self.read_head_message(reader, reader.read_uint())
 
     @staticmethod
-    def check_message_id(bytes b):
+    def check_message_id(b):
         """
         todo: make it static and without reader. It's just the first byte
         Read and return the first byte where the message id is encoded
         """
-        cdef PyBytesIO reader = BytesIO(b)
-        cdef unsigned long id_ = MessageCodec.read_uint(reader)
+        cdef BufferReader reader = BufferReader(b)
+        cdef unsigned long id_ = reader.read_uint()
 
         return id_
 
@@ -143,19 +306,18 @@ cdef class MessageCodec:
             raise e
         return decoded
 
-    def decode_detailed(self, bytes b):
-        cdef PyBytesIO reader = BytesIO(b)
+    def decode_detailed(self, b):
+        # b is any buffer (bytes, or a memoryview of the shared ring): the reader is a cursor over a memoryview of it,
+        # nothing is copied while decoding
+        cdef BufferReader reader = BufferReader(b)
         cdef list messages_list
         cdef int mode
         try:
-            messages_list = [self.handler(reader, 0)]
+            messages_list = [self.read_head_message(reader, reader.read_uint())]
         except IndexError:
             print('[WARN] Broken batch')
             return list()
-        if isinstance(messages_list[0], BatchMeta):
-            # Old BatchMeta
-            mode = 0
-        elif isinstance(messages_list[0], BatchMetadata):
+        if isinstance(messages_list[0], BatchMetadata):
             # New BatchMeta
             if messages_list[0].version == 0:
                 mode = 0
@@ -172,67 +334,97 @@ cdef class MessageCodec:
                 break
         return messages_list
 
-    def handler(self, PyBytesIO reader, int mode = 0):
-        cdef unsigned long message_id = MessageCodec.read_message_id(reader)
-        cdef int r_size
+    def handler(self, BufferReader reader, int mode = 0):
+        cdef unsigned long message_id = reader.read_uint()
+        cdef Py_ssize_t r_size
         if mode == 1:
             # We read the three bytes representing the length of message. It can be used to skip unwanted messages
-            r_size = MessageCodec.read_size(reader)
+            r_size = reader.read_size()
             if message_id not in self.msg_selector:
-                reader.read(r_size)
+                reader.skip(r_size)
                 return None
-            return MessageCodec.read_head_message(reader, message_id)
-        elif mode == 0:
-            # Old format with no bytes for message length
-            return MessageCodec.read_head_message(reader, message_id)
-        else:
+        elif mode != 0:
             raise IOError()
+        # mode 0 is the old format with no bytes for message length
+        if message_id in self.lazy_layouts:
+            return self.read_lazy_message(reader, message_id)
+        return self.read_head_message(reader, message_id)
 
-    @staticmethod
-    def read_head_message(PyBytesIO reader, unsigned long message_id):
+    def read_lazy_message(self, BufferReader reader, unsigned long message_id):
+        """
+        Walks the fields of the message without decoding strings: integers are read, strings only record
+        their offsets. Fields out of the projection are skipped
+        """
+        cdef Py_ssize_t length
+        cdef dict values = dict()
+        cdef list layout
+        cdef str name, type_
+        cdef bint keep
+        message_class, layout = self.lazy_layouts[message_id]
+        for name, type_, keep in layout:
+            if type_ == 'string':
+                length = reader.read_uint()
+                if keep:
+                    values[name] = (reader.pos, reader.pos + length)
+                reader.skip(length)
+                continue
+            if type_ == 'uint':
+                value = reader.read_uint()
+            elif type_ == 'int':
+                value = reader.read_int()
+            else:
+                value = reader.read_boolean()
+            if keep:
+                values[name] = value
+        message = message_class.__new__(message_class)
+        message._lazy_buf = reader.view
+        message._lazy_values = values
+        return message
+
+    def read_head_message(self, BufferReader reader, unsigned long message_id):
 
         if message_id == 0:
             return Timestamp(
-                timestamp=self.read_uint(reader)
+                timestamp=reader.read_uint()
             )
 
         if message_id == 1:
             return SessionStart(
-                timestamp=self.read_uint(reader),
-                project_id=self.read_uint(reader),
-                tracker_version=self.read_string(reader),
-                rev_id=self.read_string(reader),
-                user_uuid=self.read_string(reader),
-                user_agent=self.read_string(reader),
-                user_os=self.read_string(reader),
-                user_os_version=self.read_string(reader),
-                user_browser=self.read_string(reader),
-                user_browser_version=self.read_string(reader),
-                user_device=self.read_string(reader),
-                user_device_type=self.read_string(reader),
-                user_device_memory_size=self.read_uint(reader),
-                user_device_heap_size=self.read_uint(reader),
-                user_country=self.read_string(reader),
-                user_id=self.read_string(reader)
+                timestamp=reader.read_uint(),
+                project_id=reader.read_uint(),
+                tracker_version=reader.read_string(),
+                rev_id=reader.read_string(),
+                user_uuid=reader.read_string(),
+                user_agent=reader.read_string(),
+                user_os=reader.read_string(),
+                user_os_version=reader.read_string(),
+                user_browser=reader.read_string(),
+                user_browser_version=reader.read_string(),
+                user_device=reader.read_string(),
+                user_device_type=reader.read_string(),
+                user_device_memory_size=reader.read_uint(),
+                user_device_heap_size=reader.read_uint(),
+                user_country=reader.read_string(),
+                user_id=reader.read_string()
             )
 
         if message_id == 4:
             return SetPageLocationDeprecated(
-                url=self.read_string(reader),
-                referrer=self.read_string(reader),
-                navigation_start=self.read_uint(reader)
+                url=reader.read_string(),
+                referrer=reader.read_string(),
+                navigation_start=reader.read_uint()
             )
 
         if message_id == 5:
             return SetViewportSize(
-                width=self.read_uint(reader),
-                height=self.read_uint(reader)
+                width=reader.read_uint(),
+                height=reader.read_uint()
             )
 
         if message_id == 6:
             return SetViewportScroll(
-                x=self.read_int(reader),
-                y=self.read_int(reader)
+                x=reader.read_int(),
+                y=reader.read_int()
             )
 
         if message_id == 7:
@@ -242,807 +434,807 @@ cdef class MessageCodec:
 
         if message_id == 8:
             return CreateElementNode(
-                id=self.read_uint(reader),
-                parent_id=self.read_uint(reader),
-                index=self.read_uint(reader),
-                tag=self.read_string(reader),
-                svg=self.read_boolean(reader)
+                id=reader.read_uint(),
+                parent_id=reader.read_uint(),
+                index=reader.read_uint(),
+                tag=reader.read_string(),
+                svg=reader.read_boolean()
             )
 
         if message_id == 9:
             return CreateTextNode(
-                id=self.read_uint(reader),
-                parent_id=self.read_uint(reader),
-                index=self.read_uint(reader)
+                id=reader.read_uint(),
+                parent_id=reader.read_uint(),
+                index=reader.read_uint()
             )
 
         if message_id == 10:
             return MoveNode(
-                id=self.read_uint(reader),
-                parent_id=self.read_uint(reader),
-                index=self.read_uint(reader)
+                id=reader.read_uint(),
+                parent_id=reader.read_uint(),
+                index=reader.read_uint()
             )
 
         if message_id == 11:
             return RemoveNode(
-                id=self.read_uint(reader)
+                id=reader.read_uint()
             )
 
         if message_id == 12:
             return SetNodeAttribute(
-                id=self.read_uint(reader),
-                name=self.read_string(reader),
-                value=self.read_string(reader)
+                id=reader.read_uint(),
+                name=reader.read_string(),
+                value=reader.read_string()
             )
 
         if message_id == 13:
             return RemoveNodeAttribute(
-                id=self.read_uint(reader),
-                name=self.read_string(reader)
+                id=reader.read_uint(),
+                name=reader.read_string()
             )
 
         if message_id == 14:
             return SetNodeData(
-                id=self.read_uint(reader),
-                data=self.read_string(reader)
+                id=reader.read_uint(),
+                data=reader.read_string()
             )
 
         if message_id == 15:
             return SetCSSData(
-                id=self.read_uint(reader),
-                data=self.read_string(reader)
+                id=reader.read_uint(),
+                data=reader.read_string()
             )
 
         if message_id == 16:
             return SetNodeScroll(
-                id=self.read_uint(reader),
-                x=self.read_int(reader),
-                y=self.read_int(reader)
+                id=reader.read_uint(),
+                x=reader.read_int(),
+                y=reader.read_int()
             )
 
         if message_id == 17:
             return SetInputTarget(
-                id=self.read_uint(reader),
-                label=self.read_string(reader)
+                id=reader.read_uint(),
+                label=reader.read_string()
             )
 
         if message_id == 18:
             return SetInputValue(
-                id=self.read_uint(reader),
-                value=self.read_string(reader),
-                mask=self.read_int(reader)
+                id=reader.read_uint(),
+                value=reader.read_string(),
+                mask=reader.read_int()
             )
 
         if message_id == 19:
             return SetInputChecked(
-                id=self.read_uint(reader),
-                checked=self.read_boolean(reader)
+                id=reader.read_uint(),
+                checked=reader.read_boolean()
             )
 
         if message_id == 20:
             return MouseMove(
-                x=self.read_uint(reader),
-                y=self.read_uint(reader)
+                x=reader.read_uint(),
+                y=reader.read_uint()
             )
 
         if message_id == 21:
             return NetworkRequestDeprecated(
-                type=self.read_string(reader),
-                method=self.read_string(reader),
-                url=self.read_string(reader),
-                request=self.read_string(reader),
-                response=self.read_string(reader),
-                status=self.read_uint(reader),
-                timestamp=self.read_uint(reader),
-                duration=self.read_uint(reader)
+                type=reader.read_string(),
+                method=reader.read_string(),
+                url=reader.read_string(),
+                request=reader.read_string(),
+                response=reader.read_string(),
+                status=reader.read_uint(),
+                timestamp=reader.read_uint(),
+                duration=reader.read_uint()
             )
 
         if message_id == 22:
             return ConsoleLog(
-                level=self.read_string(reader),
-                value=self.read_string(reader)
+                level=reader.read_string(),
+                value=reader.read_string()
             )
 
         if message_id == 23:
             return PageLoadTiming(
-                request_start=self.read_uint(reader),
-                response_start=self.read_uint(reader),
-                response_end=self.read_uint(reader),
-                dom_content_loaded_event_start=self.read_uint(reader),
-                dom_content_loaded_event_end=self.read_uint(reader),
-                load_event_start=self.read_uint(reader),
-                load_event_end=self.read_uint(reader),
-                first_paint=self.read_uint(reader),
-                first_contentful_paint=self.read_uint(reader)
+                request_start=reader.read_uint(),
+                response_start=reader.read_uint(),
+                response_end=reader.read_uint(),
+                dom_content_loaded_event_start=reader.read_uint(),
+                dom_content_loaded_event_end=reader.read_uint(),
+                load_event_start=reader.read_uint(),
+                load_event_end=reader.read_uint(),
+                first_paint=reader.read_uint(),
+                first_contentful_paint=reader.read_uint()
             )
 
         if message_id == 24:
             return PageRenderTiming(
-                speed_index=self.read_uint(reader),
-                visually_complete=self.read_uint(reader),
-                time_to_interactive=self.read_uint(reader)
+                speed_index=reader.read_uint(),
+                visually_complete=reader.read_uint(),
+                time_to_interactive=reader.read_uint()
             )
 
         if message_id == 26:
             return IntegrationEvent(
-                timestamp=self.read_uint(reader),
-                source=self.read_string(reader),
-                name=self.read_string(reader),
-                message=self.read_string(reader),
-                payload=self.read_string(reader)
+                timestamp=reader.read_uint(),
+                source=reader.read_string(),
+                name=reader.read_string(),
+                message=reader.read_string(),
+                payload=reader.read_string()
             )
 
         if message_id == 27:
             return CustomEvent(
-                name=self.read_string(reader),
-                payload=self.read_string(reader)
+                name=reader.read_string(),
+                payload=reader.read_string()
             )
 
         if message_id == 28:
             return UserID(
-                id=self.read_string(reader)
+                id=reader.read_string()
             )
 
         if message_id == 29:
             return UserAnonymousID(
-                id=self.read_string(reader)
+                id=reader.read_string()
             )
 
         if message_id == 30:
             return Metadata(
-                key=self.read_string(reader),
-                value=self.read_string(reader)
+                key=reader.read_string(),
+                value=reader.read_string()
             )
 
         if message_id == 31:
             return PageEventDeprecated(
-                message_id=self.read_uint(reader),
-                timestamp=self.read_uint(reader),
-                url=self.read_string(reader),
-                referrer=self.read_string(reader),
-                loaded=self.read_boolean(reader),
-                request_start=self.read_uint(reader),
-                response_start=self.read_uint(reader),
-                response_end=self.read_uint(reader),
-                dom_content_loaded_event_start=self.read_uint(reader),
-                dom_content_loaded_event_end=self.read_uint(reader),
-                load_event_start=self.read_uint(reader),
-                load_event_end=self.read_uint(reader),
-                first_paint=self.read_uint(reader),
-                first_contentful_paint=self.read_uint(reader),
-                speed_index=self.read_uint(reader),
-                visually_complete=self.read_uint(reader),
-                time_to_interactive=self.read_uint(reader)
+                message_id=reader.read_uint(),
+                timestamp=reader.read_uint(),
+                url=reader.read_string(),
+                referrer=reader.read_string(),
+                loaded=reader.read_boolean(),
+                request_start=reader.read_uint(),
+                response_start=reader.read_uint(),
+                response_end=reader.read_uint(),
+                dom_content_loaded_event_start=reader.read_uint(),
+                dom_content_loaded_event_end=reader.read_uint(),
+                load_event_start=reader.read_uint(),
+                load_event_end=reader.read_uint(),
+                first_paint=reader.read_uint(),
+                first_contentful_paint=reader.read_uint(),
+                speed_index=reader.read_uint(),
+                visually_complete=reader.read_uint(),
+                time_to_interactive=reader.read_uint()
             )
 
         if message_id == 32:
             return InputEvent(
-                message_id=self.read_uint(reader),
-                timestamp=self.read_uint(reader),
-                value=self.read_string(reader),
-                value_masked=self.read_boolean(reader),
-                label=self.read_string(reader)
+                message_id=reader.read_uint(),
+                timestamp=reader.read_uint(),
+                value=reader.read_string(),
+                value_masked=reader.read_boolean(),
+                label=reader.read_string()
             )
 
         if message_id == 33:
             return PageEvent(
-                message_id=self.read_uint(reader),
-                timestamp=self.read_uint(reader),
-                url=self.read_string(reader),
-                referrer=self.read_string(reader),
-                loaded=self.read_boolean(reader),
-                request_start=self.read_uint(reader),
-                response_start=self.read_uint(reader),
-                response_end=self.read_uint(reader),
-                dom_content_loaded_event_start=self.read_uint(reader),
-                dom_content_loaded_event_end=self.read_uint(reader),
-                load_event_start=self.read_uint(reader),
-                load_event_end=self.read_uint(reader),
-                first_paint=self.read_uint(reader),
-                first_contentful_paint=self.read_uint(reader),
-                speed_index=self.read_uint(reader),
-                visually_complete=self.read_uint(reader),
-                time_to_interactive=self.read_uint(reader),
-                web_vitals=self.read_string(reader)
+                message_id=reader.read_uint(),
+                timestamp=reader.read_uint(),
+                url=reader.read_string(),
+                referrer=reader.read_string(),
+                loaded=reader.read_boolean(),
+                request_start=reader.read_uint(),
+                response_start=reader.read_uint(),
+                response_end=reader.read_uint(),
+                dom_content_loaded_event_start=reader.read_uint(),
+                dom_content_loaded_event_end=reader.read_uint(),
+                load_event_start=reader.read_uint(),
+                load_event_end=reader.read_uint(),
+                first_paint=reader.read_uint(),
+                first_contentful_paint=reader.read_uint(),
+                speed_index=reader.read_uint(),
+                visually_complete=reader.read_uint(),
+                time_to_interactive=reader.read_uint(),
+                web_vitals=reader.read_string()
             )
 
         if message_id == 34:
             return StringDictGlobal(
-                key=self.read_uint(reader),
-                value=self.read_string(reader)
+                key=reader.read_uint(),
+                value=reader.read_string()
             )
 
         if message_id == 35:
             return SetNodeAttributeDictGlobal(
-                id=self.read_uint(reader),
-                name=self.read_uint(reader),
-                value=self.read_uint(reader)
+                id=reader.read_uint(),
+                name=reader.read_uint(),
+                value=reader.read_uint()
             )
 
         if message_id == 40:
             return Profiler(
-                name=self.read_string(reader),
-                duration=self.read_uint(reader),
-                args=self.read_string(reader),
-                result=self.read_string(reader)
+                name=reader.read_string(),
+                duration=reader.read_uint(),
+                args=reader.read_string(),
+                result=reader.read_string()
             )
 
         if message_id == 41:
             return OTable(
-                key=self.read_string(reader),
-                value=self.read_string(reader)
+                key=reader.read_string(),
+                value=reader.read_string()
             )
 
         if message_id == 42:
             return StateAction(
-                type=self.read_string(reader)
+                type=reader.read_string()
             )
 
         if message_id == 44:
             return ReduxDeprecated(
-                action=self.read_string(reader),
-                state=self.read_string(reader),
-                duration=self.read_uint(reader)
+                action=reader.read_string(),
+                state=reader.read_string(),
+                duration=reader.read_uint()
             )
 
         if message_id == 45:
             return Vuex(
-                mutation=self.read_string(reader),
-                state=self.read_string(reader)
+                mutation=reader.read_string(),
+                state=reader.read_string()
             )
 
         if message_id == 46:
             return MobX(
-                type=self.read_string(reader),
-                payload=self.read_string(reader)
+                type=reader.read_string(),
+                payload=reader.read_string()
             )
 
         if message_id == 47:
             return NgRx(
-                action=self.read_string(reader),
-                state=self.read_string(reader),
-                duration=self.read_uint(reader)
+                action=reader.read_string(),
+                state=reader.read_string(),
+                duration=reader.read_uint()
             )
 
         if message_id == 48:
             return GraphQLDeprecated(
-                operation_kind=self.read_string(reader),
-                operation_name=self.read_string(reader),
-                variables=self.read_string(reader),
-                response=self.read_string(reader),
-                duration=self.read_int(reader)
+                operation_kind=reader.read_string(),
+                operation_name=reader.read_string(),
+                variables=reader.read_string(),
+                response=reader.read_string(),
+                duration=reader.read_int()
             )
 
         if message_id == 49:
             return PerformanceTrack(
-                frames=self.read_int(reader),
-                ticks=self.read_int(reader),
-                total_js_heap_size=self.read_uint(reader),
-                used_js_heap_size=self.read_uint(reader)
+                frames=reader.read_int(),
+                ticks=reader.read_int(),
+                total_js_heap_size=reader.read_uint(),
+                used_js_heap_size=reader.read_uint()
             )
 
         if message_id == 50:
             return StringDictDeprecated(
-                key=self.read_uint(reader),
-                value=self.read_string(reader)
+                key=reader.read_uint(),
+                value=reader.read_string()
             )
 
         if message_id == 51:
             return SetNodeAttributeDictDeprecated(
-                id=self.read_uint(reader),
-                name_key=self.read_uint(reader),
-                value_key=self.read_uint(reader)
+                id=reader.read_uint(),
+                name_key=reader.read_uint(),
+                value_key=reader.read_uint()
             )
 
         if message_id == 43:
             return StringDict(
-                key=self.read_string(reader),
-                value=self.read_string(reader)
+                key=reader.read_string(),
+                value=reader.read_string()
             )
 
         if message_id == 52:
             return SetNodeAttributeDict(
-                id=self.read_uint(reader),
-                name=self.read_string(reader),
-                value=self.read_string(reader)
+                id=reader.read_uint(),
+                name=reader.read_string(),
+                value=reader.read_string()
             )
 
         if message_id == 53:
             return ResourceTimingDeprecated(
-                timestamp=self.read_uint(reader),
-                duration=self.read_uint(reader),
-                ttfb=self.read_uint(reader),
-                header_size=self.read_uint(reader),
-                encoded_body_size=self.read_uint(reader),
-                decoded_body_size=self.read_uint(reader),
-                url=self.read_string(reader),
-                initiator=self.read_string(reader)
+                timestamp=reader.read_uint(),
+                duration=reader.read_uint(),
+                ttfb=reader.read_uint(),
+                header_size=reader.read_uint(),
+                encoded_body_size=reader.read_uint(),
+                decoded_body_size=reader.read_uint(),
+                url=reader.read_string(),
+                initiator=reader.read_string()
             )
 
         if message_id == 54:
             return ConnectionInformation(
-                downlink=self.read_uint(reader),
-                type=self.read_string(reader)
+                downlink=reader.read_uint(),
+                type=reader.read_string()
             )
 
         if message_id == 55:
             return SetPageVisibility(
-                hidden=self.read_boolean(reader)
+                hidden=reader.read_boolean()
             )
 
         if message_id == 56:
             return PerformanceTrackAggr(
-                timestamp_start=self.read_uint(reader),
-                timestamp_end=self.read_uint(reader),
-                min_fps=self.read_uint(reader),
-                avg_fps=self.read_uint(reader),
-                max_fps=self.read_uint(reader),
-                min_cpu=self.read_uint(reader),
-                avg_cpu=self.read_uint(reader),
-                max_cpu=self.read_uint(reader),
-                min_total_js_heap_size=self.read_uint(reader),
-                avg_total_js_heap_size=self.read_uint(reader),
-                max_total_js_heap_size=self.read_uint(reader),
-                min_used_js_heap_size=self.read_uint(reader),
-                avg_used_js_heap_size=self.read_uint(reader),
-                max_used_js_heap_size=self.read_uint(reader)
+                timestamp_start=reader.read_uint(),
+                timestamp_end=reader.read_uint(),
+                min_fps=reader.read_uint(),
+                avg_fps=reader.read_uint(),
+                max_fps=reader.read_uint(),
+                min_cpu=reader.read_uint(),
+                avg_cpu=reader.read_uint(),
+                max_cpu=reader.read_uint(),
+                min_total_js_heap_size=reader.read_uint(),
+                avg_total_js_heap_size=reader.read_uint(),
+                max_total_js_heap_size=reader.read_uint(),
+                min_used_js_heap_size=reader.read_uint(),
+                avg_used_js_heap_size=reader.read_uint(),
+                max_used_js_heap_size=reader.read_uint()
             )
 
         if message_id == 57:
             return LoadFontFace(
-                parent_id=self.read_uint(reader),
-                family=self.read_string(reader),
-                source=self.read_string(reader),
-                descriptors=self.read_string(reader)
+                parent_id=reader.read_uint(),
+                family=reader.read_string(),
+                source=reader.read_string(),
+                descriptors=reader.read_string()
             )
 
         if message_id == 58:
             return SetNodeFocus(
-                id=self.read_int(reader)
+                id=reader.read_int()
             )
 
         if message_id == 60:
             return SetNodeAttributeURLBased(
-                id=self.read_uint(reader),
-                name=self.read_string(reader),
-                value=self.read_string(reader),
-                base_url=self.read_string(reader)
+                id=reader.read_uint(),
+                name=reader.read_string(),
+                value=reader.read_string(),
+                base_url=reader.read_string()
             )
 
         if message_id == 61:
             return SetCSSDataURLBased(
-                id=self.read_uint(reader),
-                data=self.read_string(reader),
-                base_url=self.read_string(reader)
+                id=reader.read_uint(),
+                data=reader.read_string(),
+                base_url=reader.read_string()
             )
 
         if message_id == 63:
             return TechnicalInfo(
-                type=self.read_string(reader),
-                value=self.read_string(reader)
+                type=reader.read_string(),
+                value=reader.read_string()
             )
 
         if message_id == 64:
             return CustomIssue(
-                name=self.read_string(reader),
-                payload=self.read_string(reader)
+                name=reader.read_string(),
+                payload=reader.read_string()
             )
 
         if message_id == 66:
             return AssetCache(
-                url=self.read_string(reader)
+                url=reader.read_string()
             )
 
         if message_id == 68:
             return MouseClick(
-                id=self.read_uint(reader),
-                hesitation_time=self.read_uint(reader),
-                label=self.read_string(reader),
-                selector=self.read_string(reader),
-                normalized_x=self.read_uint(reader),
-                normalized_y=self.read_uint(reader)
+                id=reader.read_uint(),
+                hesitation_time=reader.read_uint(),
+                label=reader.read_string(),
+                selector=reader.read_string(),
+                normalized_x=reader.read_uint(),
+                normalized_y=reader.read_uint()
             )
 
         if message_id == 69:
             return MouseClickDeprecated(
-                id=self.read_uint(reader),
-                hesitation_time=self.read_uint(reader),
-                label=self.read_string(reader),
-                selector=self.read_string(reader)
+                id=reader.read_uint(),
+                hesitation_time=reader.read_uint(),
+                label=reader.read_string(),
+                selector=reader.read_string()
             )
 
         if message_id == 70:
             return CreateIFrameDocument(
-                frame_id=self.read_uint(reader),
-                id=self.read_uint(reader)
+                frame_id=reader.read_uint(),
+                id=reader.read_uint()
             )
 
         if message_id == 71:
             return AdoptedSSReplaceURLBased(
-                sheet_id=self.read_uint(reader),
-                text=self.read_string(reader),
-                base_url=self.read_string(reader)
+                sheet_id=reader.read_uint(),
+                text=reader.read_string(),
+                base_url=reader.read_string()
             )
 
         if message_id == 72:
             return AdoptedSSReplace(
-                sheet_id=self.read_uint(reader),
-                text=self.read_string(reader)
+                sheet_id=reader.read_uint(),
+                text=reader.read_string()
             )
 
         if message_id == 73:
             return AdoptedSSInsertRuleURLBased(
-                sheet_id=self.read_uint(reader),
-                rule=self.read_string(reader),
-                index=self.read_uint(reader),
-                base_url=self.read_string(reader)
+                sheet_id=reader.read_uint(),
+                rule=reader.read_string(),
+                index=reader.read_uint(),
+                base_url=reader.read_string()
             )
 
         if message_id == 74:
             return AdoptedSSInsertRule(
-                sheet_id=self.read_uint(reader),
-                rule=self.read_string(reader),
-                index=self.read_uint(reader)
+                sheet_id=reader.read_uint(),
+                rule=reader.read_string(),
+                index=reader.read_uint()
             )
 
         if message_id == 75:
             return AdoptedSSDeleteRule(
-                sheet_id=self.read_uint(reader),
-                index=self.read_uint(reader)
+                sheet_id=reader.read_uint(),
+                index=reader.read_uint()
             )
 
         if message_id == 76:
             return AdoptedSSAddOwner(
-                sheet_id=self.read_uint(reader),
-                id=self.read_uint(reader)
+                sheet_id=reader.read_uint(),
+                id=reader.read_uint()
             )
 
         if message_id == 77:
             return AdoptedSSRemoveOwner(
-                sheet_id=self.read_uint(reader),
-                id=self.read_uint(reader)
+                sheet_id=reader.read_uint(),
+                id=reader.read_uint()
             )
 
         if message_id == 78:
             return JSException(
-                name=self.read_string(reader),
-                message=self.read_string(reader),
-                payload=self.read_string(reader),
-                metadata=self.read_string(reader)
+                name=reader.read_string(),
+                message=reader.read_string(),
+                payload=reader.read_string(),
+                metadata=reader.read_string()
             )
 
         if message_id == 79:
             return Zustand(
-                mutation=self.read_string(reader),
-                state=self.read_string(reader)
+                mutation=reader.read_string(),
+                state=reader.read_string()
             )
 
         if message_id == 81:
             return BatchMetadata(
-                version=self.read_uint(reader),
-                page_no=self.read_uint(reader),
-                first_index=self.read_uint(reader),
-                timestamp=self.read_int(reader),
-                location=self.read_string(reader)
+                version=reader.read_uint(),
+                page_no=reader.read_uint(),
+                first_index=reader.read_uint(),
+                timestamp=reader.read_int(),
+                location=reader.read_string()
             )
 
         if message_id == 82:
             return PartitionedMessage(
-                part_no=self.read_uint(reader),
-                part_total=self.read_uint(reader)
+                part_no=reader.read_uint(),
+                part_total=reader.read_uint()
             )
 
         if message_id == 83:
             return NetworkRequest(
-                type=self.read_string(reader),
-                method=self.read_string(reader),
-                url=self.read_string(reader),
-                request=self.read_string(reader),
-                response=self.read_string(reader),
-                status=self.read_uint(reader),
-                timestamp=self.read_uint(reader),
-                duration=self.read_uint(reader),
-                transferred_body_size=self.read_uint(reader)
+                type=reader.read_string(),
+                method=reader.read_string(),
+                url=reader.read_string(),
+                request=reader.read_string(),
+                response=reader.read_string(),
+                status=reader.read_uint(),
+                timestamp=reader.read_uint(),
+                duration=reader.read_uint(),
+                transferred_body_size=reader.read_uint()
             )
 
         if message_id == 84:
             return WSChannel(
-                ch_type=self.read_string(reader),
-                channel_name=self.read_string(reader),
-                data=self.read_string(reader),
-                timestamp=self.read_uint(reader),
-                dir=self.read_string(reader),
-                message_type=self.read_string(reader)
+                ch_type=reader.read_string(),
+                channel_name=reader.read_string(),
+                data=reader.read_string(),
+                timestamp=reader.read_uint(),
+                dir=reader.read_string(),
+                message_type=reader.read_string()
             )
 
         if message_id == 112:
             return InputChange(
-                id=self.read_uint(reader),
-                value=self.read_string(reader),
-                value_masked=self.read_boolean(reader),
-                label=self.read_string(reader),
-                hesitation_time=self.read_int(reader),
-                input_duration=self.read_int(reader)
+                id=reader.read_uint(),
+                value=reader.read_string(),
+                value_masked=reader.read_boolean(),
+                label=reader.read_string(),
+                hesitation_time=reader.read_int(),
+                input_duration=reader.read_int()
             )
 
         if message_id == 113:
             return SelectionChange(
-                selection_start=self.read_uint(reader),
-                selection_end=self.read_uint(reader),
-                selection=self.read_string(reader)
+                selection_start=reader.read_uint(),
+                selection_end=reader.read_uint(),
+                selection=reader.read_string()
             )
 
         if message_id == 114:
             return MouseThrashing(
-                timestamp=self.read_uint(reader)
+                timestamp=reader.read_uint()
             )
 
         if message_id == 115:
             return UnbindNodes(
-                total_removed_percent=self.read_uint(reader)
+                total_removed_percent=reader.read_uint()
             )
 
         if message_id == 116:
             return ResourceTiming(
-                timestamp=self.read_uint(reader),
-                duration=self.read_uint(reader),
-                ttfb=self.read_uint(reader),
-                header_size=self.read_uint(reader),
-                encoded_body_size=self.read_uint(reader),
-                decoded_body_size=self.read_uint(reader),
-                url=self.read_string(reader),
-                initiator=self.read_string(reader),
-                transferred_size=self.read_uint(reader),
-                cached=self.read_boolean(reader)
+                timestamp=reader.read_uint(),
+                duration=reader.read_uint(),
+                ttfb=reader.read_uint(),
+                header_size=reader.read_uint(),
+                encoded_body_size=reader.read_uint(),
+                decoded_body_size=reader.read_uint(),
+                url=reader.read_string(),
+                initiator=reader.read_string(),
+                transferred_size=reader.read_uint(),
+                cached=reader.read_boolean()
             )
 
         if message_id == 117:
             return TabChange(
-                tab_id=self.read_string(reader)
+                tab_id=reader.read_string()
             )
 
         if message_id == 118:
             return TabData(
-                tab_id=self.read_string(reader)
+                tab_id=reader.read_string()
             )
 
         if message_id == 119:
             return CanvasNode(
-                node_id=self.read_string(reader),
-                timestamp=self.read_uint(reader)
+                node_id=reader.read_string(),
+                timestamp=reader.read_uint()
             )
 
         if message_id == 120:
             return TagTrigger(
-                tag_id=self.read_int(reader)
+                tag_id=reader.read_int()
             )
 
         if message_id == 121:
             return Redux(
-                action=self.read_string(reader),
-                state=self.read_string(reader),
-                duration=self.read_uint(reader),
-                action_time=self.read_uint(reader)
+                action=reader.read_string(),
+                state=reader.read_string(),
+                duration=reader.read_uint(),
+                action_time=reader.read_uint()
             )
 
         if message_id == 122:
             return SetPageLocation(
-                url=self.read_string(reader),
-                referrer=self.read_string(reader),
-                navigation_start=self.read_uint(reader),
-                document_title=self.read_string(reader)
+                url=reader.read_string(),
+                referrer=reader.read_string(),
+                navigation_start=reader.read_uint(),
+                document_title=reader.read_string()
             )
 
         if message_id == 123:
             return GraphQL(
-                operation_kind=self.read_string(reader),
-                operation_name=self.read_string(reader),
-                variables=self.read_string(reader),
-                response=self.read_string(reader),
-                duration=self.read_uint(reader)
+                operation_kind=reader.read_string(),
+                operation_name=reader.read_string(),
+                variables=reader.read_string(),
+                response=reader.read_string(),
+                duration=reader.read_uint()
             )
 
         if message_id == 124:
             return WebVitals(
-                name=self.read_string(reader),
-                value=self.read_string(reader)
+                name=reader.read_string(),
+                value=reader.read_string()
             )
 
         if message_id == 125:
             return IssueEvent(
-                message_id=self.read_uint(reader),
-                timestamp=self.read_uint(reader),
-                type=self.read_string(reader),
-                context_string=self.read_string(reader),
-                context=self.read_string(reader),
-                payload=self.read_string(reader),
-                url=self.read_string(reader)
+                message_id=reader.read_uint(),
+                timestamp=reader.read_uint(),
+                type=reader.read_string(),
+                context_string=reader.read_string(),
+                context=reader.read_string(),
+                payload=reader.read_string(),
+                url=reader.read_string()
             )
 
         if message_id == 126:
             return SessionEnd(
-                timestamp=self.read_uint(reader),
-                encryption_key=self.read_string(reader)
+                timestamp=reader.read_uint(),
+                encryption_key=reader.read_string()
             )
 
         if message_id == 127:
             return SessionSearch(
-                timestamp=self.read_uint(reader),
-                partition=self.read_uint(reader)
+                timestamp=reader.read_uint(),
+                partition=reader.read_uint()
             )
 
         if message_id == 90:
             return MobileSessionStart(
-                timestamp=self.read_uint(reader),
-                project_id=self.read_uint(reader),
-                tracker_version=self.read_string(reader),
-                rev_id=self.read_string(reader),
-                user_uuid=self.read_string(reader),
-                user_os=self.read_string(reader),
-                user_os_version=self.read_string(reader),
-                user_device=self.read_string(reader),
-                user_device_type=self.read_string(reader),
-                user_country=self.read_string(reader)
+                timestamp=reader.read_uint(),
+                project_id=reader.read_uint(),
+                tracker_version=reader.read_string(),
+                rev_id=reader.read_string(),
+                user_uuid=reader.read_string(),
+                user_os=reader.read_string(),
+                user_os_version=reader.read_string(),
+                user_device=reader.read_string(),
+                user_device_type=reader.read_string(),
+                user_country=reader.read_string()
             )
 
         if message_id == 91:
             return MobileSessionEnd(
-                timestamp=self.read_uint(reader)
+                timestamp=reader.read_uint()
             )
 
         if message_id == 92:
             return MobileMetadata(
-                timestamp=self.read_uint(reader),
-                length=self.read_uint(reader),
-                key=self.read_string(reader),
-                value=self.read_string(reader)
+                timestamp=reader.read_uint(),
+                length=reader.read_uint(),
+                key=reader.read_string(),
+                value=reader.read_string()
             )
 
         if message_id == 93:
             return MobileEvent(
-                timestamp=self.read_uint(reader),
-                length=self.read_uint(reader),
-                name=self.read_string(reader),
-                payload=self.read_string(reader)
+                timestamp=reader.read_uint(),
+                length=reader.read_uint(),
+                name=reader.read_string(),
+                payload=reader.read_string()
             )
 
         if message_id == 94:
             return MobileUserID(
-                timestamp=self.read_uint(reader),
-                length=self.read_uint(reader),
-                id=self.read_string(reader)
+                timestamp=reader.read_uint(),
+                length=reader.read_uint(),
+                id=reader.read_string()
             )
 
         if message_id == 95:
             return MobileUserAnonymousID(
-                timestamp=self.read_uint(reader),
-                length=self.read_uint(reader),
-                id=self.read_string(reader)
+                timestamp=reader.read_uint(),
+                length=reader.read_uint(),
+                id=reader.read_string()
             )
 
         if message_id == 96:
             return MobileScreenChanges(
-                timestamp=self.read_uint(reader),
-                length=self.read_uint(reader),
-                x=self.read_uint(reader),
-                y=self.read_uint(reader),
-                width=self.read_uint(reader),
-                height=self.read_uint(reader)
+                timestamp=reader.read_uint(),
+                length=reader.read_uint(),
+                x=reader.read_uint(),
+                y=reader.read_uint(),
+                width=reader.read_uint(),
+                height=reader.read_uint()
             )
 
         if message_id == 97:
             return MobileCrash(
-                timestamp=self.read_uint(reader),
-                length=self.read_uint(reader),
-                name=self.read_string(reader),
-                reason=self.read_string(reader),
-                stacktrace=self.read_string(reader)
+                timestamp=reader.read_uint(),
+                length=reader.read_uint(),
+                name=reader.read_string(),
+                reason=reader.read_string(),
+                stacktrace=reader.read_string()
             )
 
         if message_id == 98:
             return MobileViewComponentEvent(
-                timestamp=self.read_uint(reader),
-                length=self.read_uint(reader),
-                screen_name=self.read_string(reader),
-                view_name=self.read_string(reader),
-                visible=self.read_boolean(reader)
+                timestamp=reader.read_uint(),
+                length=reader.read_uint(),
+                screen_name=reader.read_string(),
+                view_name=reader.read_string(),
+                visible=reader.read_boolean()
             )
 
         if message_id == 100:
             return MobileClickEvent(
-                timestamp=self.read_uint(reader),
-                length=self.read_uint(reader),
-                label=self.read_string(reader),
-                x=self.read_uint(reader),
-                y=self.read_uint(reader)
+                timestamp=reader.read_uint(),
+                length=reader.read_uint(),
+                label=reader.read_string(),
+                x=reader.read_uint(),
+                y=reader.read_uint()
             )
 
         if message_id == 101:
             return MobileInputEvent(
-                timestamp=self.read_uint(reader),
-                length=self.read_uint(reader),
-                value=self.read_string(reader),
-                value_masked=self.read_boolean(reader),
-                label=self.read_string(reader)
+                timestamp=reader.read_uint(),
+                length=reader.read_uint(),
+                value=reader.read_string(),
+                value_masked=reader.read_boolean(),
+                label=reader.read_string()
             )
 
         if message_id == 102:
             return MobilePerformanceEvent(
-                timestamp=self.read_uint(reader),
-                length=self.read_uint(reader),
-                name=self.read_string(reader),
-                value=self.read_uint(reader)
+                timestamp=reader.read_uint(),
+                length=reader.read_uint(),
+                name=reader.read_string(),
+                value=reader.read_uint()
             )
 
         if message_id == 103:
             return MobileLog(
-                timestamp=self.read_uint(reader),
-                length=self.read_uint(reader),
-                severity=self.read_string(reader),
-                content=self.read_string(reader)
+                timestamp=reader.read_uint(),
+                length=reader.read_uint(),
+                severity=reader.read_string(),
+                content=reader.read_string()
             )
 
         if message_id == 104:
             return MobileInternalError(
-                timestamp=self.read_uint(reader),
-                length=self.read_uint(reader),
-                content=self.read_string(reader)
+                timestamp=reader.read_uint(),
+                length=reader.read_uint(),
+                content=reader.read_string()
             )
 
         if message_id == 105:
             return MobileNetworkCall(
-                timestamp=self.read_uint(reader),
-                length=self.read_uint(reader),
-                type=self.read_string(reader),
-                method=self.read_string(reader),
-                url=self.read_string(reader),
-                request=self.read_string(reader),
-                response=self.read_string(reader),
-                status=self.read_uint(reader),
-                duration=self.read_uint(reader)
+                timestamp=reader.read_uint(),
+                length=reader.read_uint(),
+                type=reader.read_string(),
+                method=reader.read_string(),
+                url=reader.read_string(),
+                request=reader.read_string(),
+                response=reader.read_string(),
+                status=reader.read_uint(),
+                duration=reader.read_uint()
             )
 
         if message_id == 106:
             return MobileSwipeEvent(
-                timestamp=self.read_uint(reader),
-                length=self.read_uint(reader),
-                label=self.read_string(reader),
-                x=self.read_uint(reader),
-                y=self.read_uint(reader),
-                direction=self.read_string(reader)
+                timestamp=reader.read_uint(),
+                length=reader.read_uint(),
+                label=reader.read_string(),
+                x=reader.read_uint(),
+                y=reader.read_uint(),
+                direction=reader.read_string()
             )
 
         if message_id == 107:
             return MobileBatchMeta(
-                timestamp=self.read_uint(reader),
-                length=self.read_uint(reader),
-                first_index=self.read_uint(reader)
+                timestamp=reader.read_uint(),
+                length=reader.read_uint(),
+                first_index=reader.read_uint()
             )
 
         if message_id == 110:
             return MobilePerformanceAggregated(
-                timestamp_start=self.read_uint(reader),
-                timestamp_end=self.read_uint(reader),
-                min_fps=self.read_uint(reader),
-                avg_fps=self.read_uint(reader),
-                max_fps=self.read_uint(reader),
-                min_cpu=self.read_uint(reader),
-                avg_cpu=self.read_uint(reader),
-                max_cpu=self.read_uint(reader),
-                min_memory=self.read_uint(reader),
-                avg_memory=self.read_uint(reader),
-                max_memory=self.read_uint(reader),
-                min_battery=self.read_uint(reader),
-                avg_battery=self.read_uint(reader),
-                max_battery=self.read_uint(reader)
+                timestamp_start=reader.read_uint(),
+                timestamp_end=reader.read_uint(),
+                min_fps=reader.read_uint(),
+                avg_fps=reader.read_uint(),
+                max_fps=reader.read_uint(),
+                min_cpu=reader.read_uint(),
+                avg_cpu=reader.read_uint(),
+                max_cpu=reader.read_uint(),
+                min_memory=reader.read_uint(),
+                avg_memory=reader.read_uint(),
+                max_memory=reader.read_uint(),
+                min_battery=reader.read_uint(),
+                avg_battery=reader.read_uint(),
+                max_battery=reader.read_uint()
             )
 
         if message_id == 111:
             return MobileIssueEvent(
-                timestamp=self.read_uint(reader),
-                type=self.read_string(reader),
-                context_string=self.read_string(reader),
-                context=self.read_string(reader),
-                payload=self.read_string(reader)
+                timestamp=reader.read_uint(),
+                type=reader.read_string(),
+                context_string=reader.read_string(),
+                context=reader.read_string(),
+                payload=reader.read_string()
             )
 
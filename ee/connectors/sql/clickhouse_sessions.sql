@@ -47,6 +47,6 @@ CREATE TABLE IF NOT EXISTS connector_user_sessions
     issues                         Array(Nullable(String)),
     urls_count                     Nullable(UInt64),
     urls                           Array(Nullable(String))
-) ENGINE = MergeTree()
+) ENGINE = ReplacingMergeTree() -- sessions updates are new rows, read with FINAL to get one row per session
 ORDER BY (sessionid)
 PRIMARY KEY (sessionid);
\ No newline at end of file
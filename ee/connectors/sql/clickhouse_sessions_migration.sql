@@ -0,0 +1,20 @@
+-- Sessions updates are written as new rows, connector_user_sessions must be a ReplacingMergeTree on sessionid
+-- (see clickhouse_sessions.sql). Tables created as a MergeTree before are converted once, with the connector stopped:
+-- until then the connector skips the sessions updates instead of duplicating the rows.
+-- Rows of a session waiting for a merge are still duplicated, read the table with FINAL
+-- (or argMax(column, session_end_timestamp) ... GROUP BY sessionid) to get one row per session.
+CREATE TABLE IF NOT EXISTS connector_user_sessions_replacing AS connector_user_sessions
+    ENGINE = ReplacingMergeTree()
+        ORDER BY (sessionid)
+        PRIMARY KEY (sessionid);
+
+INSERT INTO connector_user_sessions_replacing
+SELECT *
+FROM connector_user_sessions;
+
+-- connector_user_sessions_buffer flushes into connector_user_sessions by name, it writes into the new table once renamed
+RENAME TABLE connector_user_sessions TO connector_user_sessions_merge_tree,
+    connector_user_sessions_replacing TO connector_user_sessions;
+
+-- Once the new table is checked:
+-- DROP TABLE connector_user_sessions_merge_tree;
@@ -0,0 +1,106 @@
+import io
+import time
+from types import SimpleNamespace
+
+from utils.checkpoint import CheckpointLog, _delta_name
+
+PENDING = {'sessions_update_batch': [], 'sessions_insert_batch': [], 'events_batch': []}
+
+
+class MemoryStorage:
+    """save_binary/load_binary/delete_binary of db.api.DBConnection, in memory"""
+
+    def __init__(self):
+        self.objects = dict()
+
+    def save_binary(self, binary_data, name, **kwargs):
+        self.objects[name] = binary_data
+
+    def load_binary(self, name):
+        if name not in self.objects:
+            return None
+        return io.BytesIO(self.objects[name])
+
+    def delete_binary(self, name):
+        self.objects.pop(name, None)
+
+
+def session(**fields):
+    # checkpoints only read the __dict__ of the sessions
+    return SimpleNamespace(**fields)
+
+
+def test_failed_upload_leaves_no_gap():
+    storage, log = MemoryStorage(), CheckpointLog()
+    sessions = {1: session(sessionid=1, user_os='Linux')}
+    log.save(storage, log.build(sessions, {1: 10}, PENDING))
+
+    sessions[1].user_os = 'Mac OS X'
+    log.touch(1)
+    failed = log.build(sessions, {1: 10}, PENDING)
+    sessions[2] = session(sessionid=2, user_os='iOS')
+    log.touch(2)
+    saved = log.build(sessions, {1: 10, 2: 20}, PENDING)
+    # the upload of failed did not succeed, its record is never saved
+    assert failed['full'] is False
+    log.save(storage, saved)
+
+    state = CheckpointLog().load(storage)
+    assert set(state['sessions'].keys()) == {1, 2}
+    # the change of session 1 was only in the failed record
+    assert state['sessions'][1]['user_os'] == 'Mac OS X'
+    assert state['sessions'][2]['user_os'] == 'iOS'
+    assert state['cached_sessions'] == {1: 10, 2: 20}
+
+    # saved records are not repeated
+    sessions[2].user_os = 'Android'
+    log.touch(2)
+    assert set(log.build(sessions, {1: 10, 2: 20}, PENDING)['sessions'].keys()) == {2}
+
+
+def test_deleted_session_of_failed_record():
+    storage, log = MemoryStorage(), CheckpointLog()
+    sessions = {1: session(sessionid=1), 2: session(sessionid=2)}
+    log.save(storage, log.build(sessions, {1: 10, 2: 20}, PENDING))
+    del sessions[1]
+    log.delete(1)
+    log.build(sessions, {2: 20}, PENDING)
+    log.touch(2)
+    log.save(storage, log.build(sessions, {2: 20}, PENDING))
+    state = CheckpointLog().load(storage)
+    assert set(state['sessions'].keys()) == {2}
+    assert state['cached_sessions'] == {2: 20}
+
+
+def test_new_base_ignores_deltas_of_previous_run():
+    storage, log = MemoryStorage(), CheckpointLog()
+    sessions = {1: session(sessionid=1, user_os='Linux')}
+    log.save(storage, log.build(sessions, {1: 10}, PENDING))
+    log.touch(1)
+    log.save(storage, log.build(sessions, {1: 10}, PENDING))
+    stale = _delta_name(log.saved_generation, 1)
+    assert stale in storage.objects
+    # the base is lost, a new run starts from scratch (generations are millisecond timestamps)
+    del storage.objects['checkpoint']
+    time.sleep(0.002)
+
+    log = CheckpointLog()
+    log.save(storage, log.build({3: session(sessionid=3)}, {3: 30}, PENDING))
+    state = CheckpointLog().load(storage)
+    assert set(state['sessions'].keys()) == {3}
+
+
+def test_base_replaces_previous_deltas():
+    storage, log = MemoryStorage(), CheckpointLog()
+    sessions = {1: session(sessionid=1, user_os='Linux')}
+    log.save(storage, log.build(sessions, {1: 10}, PENDING))
+    for _ in range(3):
+        log.touch(1)
+        log.save(storage, log.build(sessions, {1: 10}, PENDING))
+    assert len(storage.objects) == 4
+
+    log = CheckpointLog()
+    state = log.load(storage)
+    assert (log.saved_sequence, state['generation']) == (3, log.saved_generation)
+    log.save(storage, log.build({1: session(**state['sessions'][1])}, state['cached_sessions'], PENDING))
+    assert list(storage.objects.keys()) == ['checkpoint']
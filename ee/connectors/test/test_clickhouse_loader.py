@@ -0,0 +1,48 @@
+from types import SimpleNamespace
+
+import pytest
+
+try:
+    from db.loaders.clickhouse_loader import replaces_rows
+except ImportError:
+    pytest.skip("clickhouse dependencies are not available", allow_module_level=True)
+
+
+class SystemTables:
+    """clickhouse_driver Client answering the system.tables queries of replaces_rows"""
+
+    def __init__(self, tables: dict):
+        self.tables = tables
+        self.queries = 0
+
+    def execute(self, query, params):
+        self.queries += 1
+        database = params.get('database', 'default')
+        if (database, params['table']) not in self.tables:
+            return []
+        return [(database, *self.tables[(database, params['table'])])]
+
+
+def connection(tables: dict):
+    return SimpleNamespace(clickhouse_client=SystemTables(tables))
+
+
+BUFFER = ('Buffer', "Buffer('default', 'connector_user_sessions', 16, 10, 120, 10000, 1000000, 10000, 100000000)")
+
+
+def test_replacing_merge_tree():
+    db = connection({('default', 'connector_user_sessions'): ('ReplacingMergeTree', 'ReplacingMergeTree ORDER BY ...')})
+    assert replaces_rows(db, 'connector_user_sessions')
+    assert replaces_rows(db, 'connector_user_sessions')
+    assert db.clickhouse_client.queries == 1
+
+
+@pytest.mark.parametrize('engine, expected', [('ReplacingMergeTree', True), ('MergeTree', False)])
+def test_buffer_checks_its_destination(engine, expected):
+    db = connection({('default', 'connector_user_sessions_buffer'): BUFFER,
+                     ('default', 'connector_user_sessions'): (engine, engine)})
+    assert replaces_rows(db, 'connector_user_sessions_buffer') is expected
+
+
+def test_missing_table():
+    assert not replaces_rows(connection(dict()), 'connector_user_sessions')
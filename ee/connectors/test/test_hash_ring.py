@@ -0,0 +1,42 @@
+from utils.hash_ring import ConsistentHashRing
+
+SESSION_IDS = range(7000000000000000000, 7000000000000010000)
+
+
+def owners(ring):
+    return {session_id: ring.get(session_id) for session_id in SESSION_IDS}
+
+
+def test_all_nodes_own_sessions():
+    ring = ConsistentHashRing(list(range(4)))
+    assert len(ring) == 4
+    counts = dict()
+    for node in owners(ring).values():
+        counts[node] = counts.get(node, 0) + 1
+    assert set(counts.keys()) == {0, 1, 2, 3}
+    # 160 replicas per node keep the split close to even
+    assert min(counts.values()) > len(SESSION_IDS) / 4 * 0.7
+
+
+def test_same_mapping_across_instances():
+    assert owners(ConsistentHashRing(list(range(4)))) == owners(ConsistentHashRing([3, 1, 0, 2]))
+
+
+def test_remove_only_moves_sessions_of_removed_node():
+    ring = ConsistentHashRing(list(range(4)))
+    before = owners(ring)
+    ring.remove(2)
+    after = owners(ring)
+    assert len(ring) == 3
+    assert 2 not in after.values()
+    assert all(after[session_id] == node for session_id, node in before.items() if node != 2)
+
+
+def test_add_only_moves_sessions_to_new_node():
+    ring = ConsistentHashRing(list(range(3)))
+    before = owners(ring)
+    ring.add(3)
+    after = owners(ring)
+    moved = [session_id for session_id in SESSION_IDS if after[session_id] != before[session_id]]
+    assert len(moved) > 0
+    assert all(after[session_id] == 3 for session_id in moved)
@@ -0,0 +1,77 @@
+import gc
+
+import pytest
+
+from utils.shared_buffer import SharedRingBuffer
+
+try:
+    # compiled codec (build_modules.sh), the msgcodec/ sources alone can't be imported
+    from msgcodec import MessageCodec
+except ImportError:
+    pytest.skip("compiled msgcodec is not available", allow_module_level=True)
+
+
+def uint(x):
+    b = bytearray()
+    while x >= 0x80:
+        b.append(x & 0x7f | 0x80)
+        x >>= 7
+    b.append(x)
+    return bytes(b)
+
+
+def string(s):
+    return uint(len(s.encode())) + s.encode()
+
+
+def sized(message_id, payload):
+    return uint(message_id) + len(payload).to_bytes(3, "little") + payload
+
+
+def batch():
+    # BatchMetadata v1: version, page_no, first_index, timestamp (zigzag int), location
+    metadata = uint(81) + uint(1) + uint(1) + uint(0) + uint(1700000000000 << 1) + string("https://app.io/a")
+    return metadata \
+        + sized(0, uint(1700000000123)) \
+        + sized(5, uint(1280) + uint(720)) \
+        + sized(126, uint(1700000000999) + string("key"))
+
+
+class TestMessageCodec:
+    def setup_method(self):
+        self.ring = SharedRingBuffer(size=4096)
+
+    def teardown_method(self):
+        gc.collect()
+        self.ring.close()
+
+    def decode(self, codec, value):
+        return [(m.__id__, getattr(m, "timestamp", None), getattr(m, "encryption_key", None))
+                for m in codec.decode_detailed(value)]
+
+    def test_decode_detailed_ring_view(self):
+        codec = MessageCodec([0, 126])
+        value = batch()
+        offset = self.ring.write(value)
+        view = self.ring.view(offset, len(value))
+        assert isinstance(view, memoryview)
+        assert self.decode(codec, view) == self.decode(codec, value) == [
+            (81, 1700000000000, None), (0, 1700000000123, None), (126, 1700000000999, "key")]
+        view.release()
+
+    def test_lazy_decode_ring_view(self):
+        codec = MessageCodec([0, 126], lazy=True, projection={"SessionEnd": ["timestamp", "encryption_key"]})
+        value = batch()
+        offset = self.ring.write(value)
+        messages = codec.decode_detailed(self.ring.view(offset, len(value)))
+        assert [m.__id__ for m in messages] == [81, 0, 126]
+        assert messages[2].encryption_key == "key"
+        del messages
+
+    def test_decode_ring_view(self):
+        value = uint(0) + uint(42)
+        offset = self.ring.write(value)
+        view = self.ring.view(offset, len(value))
+        assert MessageCodec.check_message_id(view) == 0
+        assert MessageCodec([0]).decode(view).timestamp == 42
+        view.release()
@@ -1,5 +1,6 @@
 from utils.pg_client import PostgresClient
 from decouple import config
+from collections import deque
 from time import time
 import json
 
@@ -18,47 +19,111 @@ def _project_from_session(sessionId):
     return res['project_id']
 
 
+class TimedCache:
+
+    def __init__(self, ttl: int, max_size: int, n_slots: int = 60):
+        """Memory bounded cache of int session ids that expire ttl seconds after being set.
+        Entries are kept in a timing wheel of n_slots buckets (ttl / n_slots seconds each) ordered by time,
+        expiring is dropping whole buckets from the oldest one, and when max_size is reached the oldest entries
+        are evicted first. hits and misses count the lookups done with get."""
+        self.ttl = ttl
+        self.max_size = max_size
+        self.slot_width = ttl / n_slots
+        self.slots = deque()  # [slot start time, {sessionid: value}], oldest first
+        self.index = dict()  # sessionid -> slot holding it
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, sessionid: int):
+        slot = self.index.get(sessionid)
+        return slot is not None and time() - slot[0] < self.ttl
+
+    def get(self, sessionid: int, default=None):
+        slot = self.index.get(sessionid)
+        if slot is None or time() - slot[0] >= self.ttl:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return slot[1][sessionid]
+
+    def set(self, sessionid: int, value, timestamp: float = None):
+        timestamp = time() if timestamp is None else timestamp
+        old_slot = self.index.get(sessionid)
+        if old_slot is not None:
+            del old_slot[1][sessionid]
+        if not self.slots or timestamp - self.slots[-1][0] >= self.slot_width:
+            self.slots.append([timestamp, dict()])
+        slot = self.slots[-1]
+        slot[1][sessionid] = value
+        self.index[sessionid] = slot
+        while len(self.index) > self.max_size:
+            oldest = self.slots[0][1]
+            if oldest:
+                sessionid = next(iter(oldest))
+                del oldest[sessionid]
+                del self.index[sessionid]
+            else:
+                self.slots.popleft()
+
+    def expire(self):
+        """Drops the buckets older than ttl, only expired entries are visited"""
+        limit = time() - self.ttl
+        while self.slots and self.slots[0][0] + self.slot_width <= limit:
+            for sessionid in self.slots.popleft()[1].keys():
+                del self.index[sessionid]
+
+    def counters(self) -> dict:
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self.index)}
+
+
 class CachedSessions:
 
     def __init__(self):
         """cached_sessions of open and recently closed sessions with its current status.
+        Sessions are kept in creation order, so expired ones are always at the start of session_project.
         env:
                 MAX_SESSION_LIFE: cache lifespan of session (default 7200 seconds)"""
         self.session_project = dict()
         self.max_alive_time = config('MAX_SESSION_LIFE', default=7800, cast=int) # Default 2 hours
 
+    def load(self, session_project: dict):
+        """Loads cached sessions from a checkpoint (ids may be str in json checkpoints)"""
+        self.session_project = {int(sessionid): tuple(values) for sessionid, values in
+                                sorted(session_project.items(), key=lambda item: item[1][0])}
+
     def create(self, sessionid: int):
         """Saves a new session with status OPEN and set its insertion time"""
-        _sessionid = str(sessionid)
-        self.session_project[_sessionid] = (time(), 'OPEN')
+        self.session_project[sessionid] = (time(), 'OPEN')
 
     def add(self, sessionid: int):
         """Handle the creation of a cached session or update its status if already in cache"""
-        _sessionid = str(sessionid)
-        if _sessionid in self.session_project.keys():
-            if self.session_project[_sessionid][1] == 'CLOSE':
-                tmp = self.session_project[_sessionid]
-                self.session_project[_sessionid] = (tmp[0], 'UPDATE')
+        if sessionid in self.session_project:
+            if self.session_project[sessionid][1] == 'CLOSE':
+                tmp = self.session_project[sessionid]
+                self.session_project[sessionid] = (tmp[0], 'UPDATE')
         else:
             self.create(sessionid)
 
     def close(self, sessionid: int):
         """Sets status of session to closed session (received sessionend message)"""
-        _sessionid = str(sessionid)
-        tmp = self.session_project[_sessionid]
+        tmp = self.session_project[sessionid]
         old_status = tmp[1]
-        self.session_project[_sessionid] = (tmp[0], 'CLOSE')
+        self.session_project[sessionid] = (tmp[0], 'CLOSE')
         return old_status
 
     def clear_sessions(self):
         """Delete all sessions that reached max_alive_time"""
         to_clean_list = list()
-        current_time = time()
+        limit = time() - self.max_alive_time
         for sessionid, values in self.session_project.items():
-            if current_time - values[0] > self.max_alive_time:
-                to_clean_list.append(int(sessionid))
+            if values[0] >= limit:
+                break
+            to_clean_list.append(sessionid)
         for sessionid in to_clean_list:
-            del self.session_project[str(sessionid)]
+            del self.session_project[sessionid]
         return to_clean_list
 
 
@@ -111,7 +176,7 @@ class ProjectFilter:
         file.close()
         self.cache = checkpoint['cache']
         self.to_clean = checkpoint['to_clean']
-        self.cached_sessions.session_project = checkpoint['cached_sessions']
+        self.cached_sessions.load(checkpoint['cached_sessions'])
 
     def save_checkpoint(self, db):
         checkpoint = {
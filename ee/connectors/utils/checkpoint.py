@@ -0,0 +1,139 @@
+from decouple import config
+from time import time
+import msgpack
+import json
+
+CHECKPOINT_NAME = 'checkpoint'
+CHECKPOINT_VERSION = 'v2'
+
+
+def _delta_name(generation: int, sequence: int):
+    return f'{CHECKPOINT_NAME}.{generation}.{sequence}'
+
+
+def _pack(record: dict) -> bytes:
+    return msgpack.packb(record, use_bin_type=True)
+
+
+def _unpack(data: bytes) -> dict:
+    return msgpack.unpackb(data, raw=False, strict_map_key=False)
+
+
+class CheckpointLog:
+    """Append-only checkpoint of the connector state, msgpack encoded.
+    A full checkpoint (base) is saved as 'checkpoint', then each new checkpoint only holds the sessions that changed
+    since the previous one and is saved as 'checkpoint.<generation>.<sequence>'. Every CHECKPOINT_COMPACT_EVERY
+    deltas a new base is written with the next generation and the deltas of the previous one are deleted.
+    Records are built when an upload is queued but only saved once it succeeds: deltas are numbered when they are
+    saved, so the record of a failed upload leaves no gap in the sequence, and a delta also holds the sessions of the
+    records built before it and not saved yet, so the changes of a failed one are not lost. Generations are
+    timestamps, deltas left by a previous run can't be applied to a new base.
+    env:
+            CHECKPOINT_COMPACT_EVERY: number of deltas between two full checkpoints (default 20)"""
+
+    def __init__(self):
+        # Last base built and the number of deltas built since, to know when to compact
+        self.generation = 0
+        self.sequence = 0
+        # Last checkpoint saved, the deltas of saved_generation are 1..saved_sequence
+        self.saved_generation = 0
+        self.saved_sequence = 0
+        self.dirty = set()
+        self.deleted = set()
+        # Records built and not saved yet: number of the record -> its (dirty, deleted) sessions
+        self.built = 0
+        self.unsaved = dict()
+        self.force_full = True  # The first checkpoint of a run is always a base
+        self.compact_every = config('CHECKPOINT_COMPACT_EVERY', default=20, cast=int)
+
+    def touch(self, session_id: int):
+        """Session (or its cached_sessions entry) changed since the last checkpoint"""
+        self.dirty.add(session_id)
+        self.deleted.discard(session_id)
+
+    def delete(self, session_id: int):
+        self.deleted.add(session_id)
+        self.dirty.discard(session_id)
+
+    def build(self, sessions: dict, session_project: dict, pending: dict) -> dict:
+        """Checkpoint record of the current state. pending holds the batches not uploaded yet
+        (sessions_update_batch, sessions_insert_batch and events_batch, as in v1.1)"""
+        full = self.force_full or self.sequence >= self.compact_every
+        self.built += 1
+        record = {'version': CHECKPOINT_VERSION, 'full': full, 'built': self.built}
+        if full:
+            self.generation = max(self.generation + 1, int(time() * 1000))
+            self.sequence = 0
+            self.unsaved = dict()
+            session_ids = sessions.keys()
+            record['cached_sessions'] = dict(session_project)
+            record['deleted'] = list()
+        else:
+            self.sequence += 1
+            self.unsaved[self.built] = (self.dirty, self.deleted)
+            # Changes since the last record saved, in the order they were made
+            session_ids, deleted = set(), set()
+            for dirty_ids, deleted_ids in list(self.unsaved.values()):
+                session_ids = (session_ids - deleted_ids) | dirty_ids
+                deleted = (deleted - dirty_ids) | deleted_ids
+            record['cached_sessions'] = {sessionId: session_project[sessionId] for sessionId in session_ids
+                                         if sessionId in session_project}
+            record['deleted'] = list(deleted)
+        # Copied, the record is encoded later on by the upload thread
+        record['sessions'] = {sessionId: dict(sessions[sessionId].__dict__) for sessionId in session_ids
+                              if sessionId in sessions}
+        record['generation'] = self.generation
+        record |= pending
+        self.dirty = set()
+        self.deleted = set()
+        self.force_full = False
+        return record
+
+    def save(self, database_api, record: dict):
+        """Saves a record built by build, records are saved in the order they were built"""
+        if record['full']:
+            record['sequence'] = 0
+            database_api.save_binary(binary_data=_pack(record), name=CHECKPOINT_NAME)
+            # The deltas of the replaced base
+            for sequence in range(1, self.saved_sequence + 1):
+                database_api.delete_binary(name=_delta_name(self.saved_generation, sequence))
+        elif record['generation'] != self.saved_generation:
+            # Its base was not saved (failed upload), the next checkpoint is a full one anyway
+            return
+        else:
+            record['sequence'] = self.saved_sequence + 1
+            database_api.save_binary(binary_data=_pack(record),
+                                     name=_delta_name(record['generation'], record['sequence']))
+        self.saved_generation = record['generation']
+        self.saved_sequence = record['sequence']
+        for built in [built for built in list(self.unsaved.keys()) if built <= record['built']]:
+            self.unsaved.pop(built, None)
+
+    def load(self, database_api) -> dict:
+        """Last checkpoint saved, with its deltas applied. Checkpoints saved before v2 (json) are returned as they are"""
+        file = database_api.load_binary(name=CHECKPOINT_NAME)
+        data = file.getvalue()
+        file.close()
+        if data[:1] == b'{':
+            return json.loads(data.decode('utf-8'))
+        state = _unpack(data)
+        sequence = 0
+        while True:
+            file = database_api.load_binary(name=_delta_name(state['generation'], sequence + 1))
+            if file is None:
+                break
+            delta = _unpack(file.getvalue())
+            file.close()
+            sequence += 1
+            state['sessions'] |= delta['sessions']
+            state['cached_sessions'] |= delta['cached_sessions']
+            for sessionId in delta['deleted']:
+                state['sessions'].pop(sessionId, None)
+                state['cached_sessions'].pop(sessionId, None)
+            for key in ('sessions_update_batch', 'sessions_insert_batch', 'events_batch'):
+                state[key] = delta[key]
+        # Next checkpoint is a new base, it replaces this generation and its deltas
+        self.generation = self.saved_generation = state['generation']
+        self.sequence = self.saved_sequence = sequence
+        self.force_full = True
+        return state
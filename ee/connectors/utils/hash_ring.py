@@ -0,0 +1,40 @@
+from bisect import bisect
+from hashlib import blake2b
+
+
+def _hash(key) -> int:
+    return int.from_bytes(blake2b(str(key).encode(), digest_size=8).digest(), 'big')
+
+
+class ConsistentHashRing:
+    """Maps session ids to nodes (decode workers). Each node is placed replicas times on a 64 bit ring and a session
+    belongs to the first node found clockwise from its hash, so adding or removing a node only moves the sessions
+    of the ring segments it owned."""
+
+    def __init__(self, nodes: list = None, replicas: int = 160):
+        self.replicas = replicas
+        self._points = list()
+        self._owners = list()
+        for node in nodes or list():
+            self.add(node)
+
+    def __len__(self):
+        return len(set(self._owners))
+
+    def add(self, node):
+        for i in range(self.replicas):
+            point = _hash(f'{node}-{i}')
+            index = bisect(self._points, point)
+            self._points.insert(index, point)
+            self._owners.insert(index, node)
+
+    def remove(self, node):
+        kept = [(point, owner) for point, owner in zip(self._points, self._owners) if owner != node]
+        self._points = [point for point, _ in kept]
+        self._owners = [owner for _, owner in kept]
+
+    def get(self, key):
+        index = bisect(self._points, _hash(key))
+        if index == len(self._points):
+            index = 0
+        return self._owners[index]
@@ -0,0 +1,47 @@
+from decouple import config
+from time import time
+
+
+class StageMetrics:
+    """Messages, bytes and busy time accumulated per pipeline stage (read, decode, upload...).
+    Throughput of every stage is printed each METRICS_REPORT_RATE seconds, the slowest stage is the one that stalls
+    the connector.
+    env:
+            METRICS_REPORT_RATE: seconds between reports (default 60, 0 disables the report)"""
+
+    def __init__(self, stages: list[str]):
+        self.stages = stages
+        self.report_rate = config('METRICS_REPORT_RATE', default=60, cast=int)
+        self.last_report = time()
+        self.reset()
+
+    def reset(self):
+        self.counters = {stage: [0, 0, 0.0] for stage in self.stages}
+
+    def add(self, stage: str, n_messages: int, n_bytes: int, elapsed: float):
+        counter = self.counters[stage]
+        counter[0] += n_messages
+        counter[1] += n_bytes
+        counter[2] += elapsed
+
+    def throughput(self, stage: str):
+        """(messages/s, MB/s) of stage while it was busy"""
+        n_messages, n_bytes, elapsed = self.counters[stage]
+        if elapsed == 0:
+            return 0.0, 0.0
+        return n_messages / elapsed, n_bytes / elapsed / 1e6
+
+    def report(self, force: bool = False):
+        if self.report_rate <= 0 and not force:
+            return
+        now = time()
+        if not force and now - self.last_report < self.report_rate:
+            return
+        parts = list()
+        for stage in self.stages:
+            n_messages, n_bytes, elapsed = self.counters[stage]
+            msgs_rate, mb_rate = self.throughput(stage)
+            parts.append(f'{stage}: {msgs_rate:.0f} msgs/s {mb_rate:.2f} MB/s ({n_messages} msgs in {elapsed:.1f}s)')
+        print(f'[WORKER METRICS] Last {now - self.last_report:.0f}s | ' + ' | '.join(parts))
+        self.last_report = now
+        self.reset()
@@ -1,5 +1,6 @@
 import logging
 import time
+import os
 from sqlalchemy import create_engine
 from sqlalchemy import MetaData
 from sqlalchemy.orm import sessionmaker, session
@@ -46,8 +47,16 @@ class PostgresClient:
     CONNECTION_STRING: str = conn_str
     _sessions = sessionmaker()
 
+    _engine = None
+    _engine_pid = None
+
     def __init__(self):
-        self.engine = create_engine(self.CONNECTION_STRING, connect_args={'sslmode': sslmode})
+        # One engine (and connection pool) per process, connections are reused between queries
+        if PostgresClient._engine is None or PostgresClient._engine_pid != os.getpid():
+            PostgresClient._engine = create_engine(self.CONNECTION_STRING, connect_args={'sslmode': sslmode},
+                                                   pool_pre_ping=True)
+            PostgresClient._engine_pid = os.getpid()
+        self.engine = PostgresClient._engine
 
     @contextmanager
     def get_live_session(self) -> session:
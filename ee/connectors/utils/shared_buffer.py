@@ -0,0 +1,83 @@
+from multiprocessing import shared_memory
+from collections import deque
+
+
+class SharedRingBuffer:
+    """Ring buffer over a multiprocessing.shared_memory block used to hand raw kafka values from the reader process
+    to the decoding workers. The reader copies each value once into the ring and only (offset, length) pairs go
+    through the pipe and the pool, the workers decode straight from a memoryview of the same block.
+
+    Writes are grouped in batches (one per read cycle) and space is given back one batch at a time, in the order
+    they were written, with release_batch. Only the writer (reader process) keeps track of the free space."""
+
+    def __init__(self, size: int = None, name: str = None):
+        """Creates a new block of size bytes, or attaches to the existing block called name"""
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+            self.owner = True
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            self.owner = False
+        self.name = self.shm.name
+        self.size = self.shm.size
+        self.head = 0  # Next write position
+        self.used = 0  # Bytes held by unreleased batches (wrap-around gaps included)
+        self.batch_used = 0  # Bytes written since the last end_batch
+        self.batches = deque()
+
+    def write(self, data: bytes):
+        """Copies data into the ring and returns its offset, or None if there is no room left for it"""
+        n = len(data)
+        pos = self.head
+        needed = n
+        if pos + n > self.size:
+            # The tail of the block is too short, it's left unused and the value goes at the start
+            needed += self.size - pos
+            pos = 0
+        if self.used + needed > self.size:
+            return None
+        self.shm.buf[pos:pos + n] = data
+        self.head = pos + n
+        self.used += needed
+        self.batch_used += needed
+        return pos
+
+    def end_batch(self):
+        """Closes the current batch, the values written since the previous call are released together"""
+        self.batches.append(self.batch_used)
+        self.batch_used = 0
+
+    def release_batch(self):
+        """Gives back the space of the oldest batch"""
+        if self.batches:
+            self.used -= self.batches.popleft()
+        if self.used == 0:
+            self.head = 0
+
+    def pending_batches(self) -> int:
+        return len(self.batches)
+
+    def view(self, offset: int, length: int) -> memoryview:
+        """Zero-copy view of a value. It must not be kept after its batch is released"""
+        return self.shm.buf[offset:offset + length]
+
+    def read(self, offset: int, length: int) -> bytes:
+        return bytes(self.shm.buf[offset:offset + length])
+
+    def close(self):
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+_attached = dict()
+
+
+def attach(name: str) -> SharedRingBuffer:
+    """Ring buffer called name, attached once per process (decoding workers reuse it between tasks)"""
+    try:
+        return _attached[name]
+    except KeyError:
+        ring = SharedRingBuffer(name=name)
+        _attached[name] = ring
+        return ring
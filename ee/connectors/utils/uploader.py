@@ -5,23 +5,28 @@ from time import sleep
 
 
 def insertBatch(events_batch, sessions_insert_batch, sessions_update_batch, db, sessions_table_name, table_name, EVENT_TYPE):
+    """Returns (events, sessions insert, sessions update) uploaded: False for the batches that could not reach the
+    datawarehouse, only these ones are to be sent again (rejected rows are not retried)"""
     t1 = datetime.now().timestamp()
+    sessions_inserted, sessions_updated, events_inserted = True, True, True
     print(f'[BG-INFO] Number of events to add {len(events_batch)}, number of sessions to add {len(sessions_insert_batch)}, number of sessions to update {len(sessions_update_batch)}')
     if sessions_insert_batch:
-        attempt_session_insert(sessions_insert_batch, db, sessions_table_name)
+        sessions_inserted = attempt_session_insert(sessions_insert_batch, db, sessions_table_name)
 
     if sessions_update_batch:
-        attempt_session_update(sessions_update_batch, db, sessions_table_name)
+        sessions_updated = attempt_session_update(sessions_update_batch, db, sessions_table_name)
 
     if events_batch:
-        attempt_batch_insert(events_batch, db, table_name, EVENT_TYPE)
+        events_inserted = attempt_batch_insert(events_batch, db, table_name, EVENT_TYPE)
     print(f'[BG-INFO] Uploaded into S3 in {datetime.now().timestamp()-t1} seconds')
+    return events_inserted, sessions_inserted, sessions_updated
 
 
 def attempt_session_insert(sess_batch, db, sessions_table_name, try_=0):
     if sess_batch:
         try:
             insert_batch(db, sess_batch, table=sessions_table_name, level='sessions')
+            return True
         except TypeError as e:
             print("Type conversion error")
             print(repr(e))
@@ -32,15 +37,19 @@ def attempt_session_insert(sess_batch, db, sessions_table_name, try_=0):
             if try_ < 3:
                 try_ += 1
                 sleep(try_*2)
-                attempt_session_insert(sess_batch, db, sessions_table_name, try_)
+                return attempt_session_insert(sess_batch, db, sessions_table_name, try_)
+            return False
         except Exception as e:
             print(repr(e))
+            return False
+    return True
 
 
 def attempt_session_update(sess_batch, db, sessions_table_name):
     if sess_batch:
         try:
             update_batch(db, sess_batch, table=sessions_table_name)
+            return True
         except TypeError as e:
             print('Type conversion error')
             print(repr(e))
@@ -50,13 +59,17 @@ def attempt_session_update(sess_batch, db, sessions_table_name):
         except InterfaceError as e:
             print('Error while trying to update session into datawarehouse')
             print(repr(e))
+            return False
         except Exception as e:
             print(repr(e))
+            return False
+    return True
 
 
 def attempt_batch_insert(events_batch, db, table_name, EVENT_TYPE, try_=0):
     try:
         insert_batch(db=db, batch=events_batch, table=table_name, level=EVENT_TYPE)
+        return True
     except TypeError as e:
         print("Type conversion error")
         print(repr(e))
@@ -67,13 +80,16 @@ def attempt_batch_insert(events_batch, db, table_name, EVENT_TYPE, try_=0):
         if try_ < 3:
             try_ += 1
             sleep(try_*2)
-            attempt_batch_insert(events_batch, db, table_name, EVENT_TYPE, try_)
+            return attempt_batch_insert(events_batch, db, table_name, EVENT_TYPE, try_)
         elif try_ == 3:
             db.restart()
             sleep(2)
-            attempt_batch_insert(events_batch, db, table_name, EVENT_TYPE, try_ + 1)
+            return attempt_batch_insert(events_batch, db, table_name, EVENT_TYPE, try_ + 1)
         else:
             print(repr(e))
+            return False
     except Exception as e:
         print(repr(e))
+        return False
+    return True
 
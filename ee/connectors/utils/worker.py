@@ -1,18 +1,27 @@
 from multiprocessing import Pool, Process, Pipe, TimeoutError
-from multiprocessing.connection import Connection
+from multiprocessing.connection import Connection, wait
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
 from db.api import DBConnection
 from msgcodec import MessageCodec
 from messages import SessionEnd
 from utils.uploader import insertBatch
-from utils.cache import CachedSessions
-from db.models import DetailedEvent, Event, Session, events_detailed_table_name, events_table_name, sessions_table_name
-from handler import handle_normal_message, handle_message, handle_session
+from utils.cache import CachedSessions, TimedCache
+from utils.shared_buffer import SharedRingBuffer, attach
+from utils.metrics import StageMetrics
+from utils.checkpoint import CheckpointLog
+from utils.hash_ring import ConsistentHashRing
+from db.models import SessionRow, events_detailed_table_name, events_table_name, sessions_table_name
+from db.columnar import ColumnarBatch, ColumnArrays
+from db.utils import get_schema
+from handler import handle_normal_message, handle_message, handle_session, message_projection
 from datetime import datetime
 from decouple import config
 from utils import pg_client
 from utils.signal_handler import signal_handler
 from copy import deepcopy
-from confluent_kafka import Consumer
+from confluent_kafka import Consumer, TopicPartition
+from sqlalchemy import text
 import pandas as pd
 from time import time
 import logging
@@ -26,6 +35,7 @@ if EVENT_TYPE == 'detailed':
     table_name = events_detailed_table_name
 elif EVENT_TYPE == 'normal':
     table_name = events_table_name
+events_dtypes, events_columns = get_schema(EVENT_TYPE)
 
 TOPICS = config("TOPICS", default="saas-raw").split(',')
 ssl_protocol = config('KAFKA_USE_SSL', default=True, cast=bool)
@@ -44,8 +54,17 @@ if EVENT_TYPE == 'normal':
 elif EVENT_TYPE == 'detailed':
     events_messages = [1, 4, 21, 22, 25, 27, 31, 32, 39, 48, 59, 64, 69, 78, 125, 126]
 allowed_messages = list(set(session_messages + events_messages))
-codec = MessageCodec(allowed_messages)
+# Lazy decoding keeps string fields undecoded until accessed and skips the fields no handler reads.
+# It pays off with large payloads (NetworkRequest, IssueEvent), for small messages eager decoding is faster
+if config('LAZY_DECODING', default=False, cast=bool):
+    codec = MessageCodec(allowed_messages, lazy=True,
+                         projection=message_projection(handle_session, handle_message if EVENT_TYPE == 'detailed'
+                                                       else handle_normal_message))
+else:
+    codec = MessageCodec(allowed_messages)
 max_kafka_read = config('MAX_KAFKA_READ', default=60000, cast=int)
+# Size of the shared memory ring used to pass kafka values to the decoders (0 sends them through the pipe)
+shared_buffer_mb = config('SHARED_BUFFER_MB', default=256, cast=int)
 
 
 def init_consumer():
@@ -60,7 +79,7 @@ def close_consumer(consumer):
     consumer.close()
 
 
-def session_to_dict(sess: Session):
+def session_to_dict(sess: SessionRow):
     _dict = sess.__dict__
     try:
         del _dict['_sa_instance_state']
@@ -70,106 +89,151 @@ def session_to_dict(sess: Session):
 
 
 def dict_to_session(session_dict: dict):
-    n = Session()
+    n = SessionRow()
     n.__dict__ |= session_dict
     return n
 
-
-def event_to_dict(event: Event | DetailedEvent):
-    _dict = event.__dict__
-    try:
-        del _dict['_sa_instance_state']
-    except KeyError:
-        ...
-    return _dict
-
-
-def dict_to_event(event_dict: dict):
-    global EVENT_TYPE
-    if EVENT_TYPE == 'detailed':
-        n = DetailedEvent()
-    else:
-        n = Event()
-    n.__dict__ |= event_dict
-    return n
-
 class ProjectFilter:
     def __init__(self, project_filter):
+        """Filters sessions by project. Valid and non valid sessions found in PG are kept in a TimedCache
+        (MAX_UNWANTED_SESSION_LIFE seconds, at most PROJECT_CACHE_SIZE sessions)"""
         self.max_lifespan = config('MAX_UNWANTED_SESSION_LIFE', default=7800, cast=int)
         self.project_filter = project_filter
         self.sessions_lifespan = CachedSessions()
-        self.non_valid_sessions_cache = dict()
+        self.sessions_cache = TimedCache(ttl=self.max_lifespan,
+                                         max_size=config('PROJECT_CACHE_SIZE', default=1000000, cast=int))
 
     def is_valid(self, sessionId: int):
         if len(self.project_filter) == 0:
             return True
-        elif sessionId in self.sessions_lifespan.session_project.keys():
+        elif sessionId in self.sessions_lifespan.session_project:
             return True
-        elif sessionId in self.non_valid_sessions_cache.keys():
-            return False
-        else:
+        is_valid = self.sessions_cache.get(sessionId)
+        if is_valid is None:
             projectId = project_from_session(sessionId)
-            if projectId not in self.project_filter:
-                self.non_valid_sessions_cache[sessionId] = int(datetime.now().timestamp())
-                return False
-            else:
-                return True
+            is_valid = projectId in self.project_filter
+            self.sessions_cache.set(sessionId, is_valid)
+        return is_valid
 
     def already_checked(self, sessionId):
         if len(self.project_filter) == 0:
             return True, True
-        elif sessionId in self.sessions_lifespan.session_project.keys():
+        elif sessionId in self.sessions_lifespan.session_project:
             return True, True
-        elif sessionId in self.non_valid_sessions_cache.keys():
-            return True, False
-        else:
+        is_valid = self.sessions_cache.get(sessionId)
+        if is_valid is None:
             return False, None
+        return True, is_valid
 
     def are_valid(self, sessionIds: list[int]):
         valid_sessions = list()
         if len(self.project_filter) == 0:
             return sessionIds
+        if not sessionIds:
+            return valid_sessions
         projects_session = project_from_sessions(list(set(sessionIds)))
-        current_datetime = int(datetime.now().timestamp())
         for projectId, sessionId in projects_session:
-            if projectId not in self.project_filter:
-                self.non_valid_sessions_cache[sessionId] = current_datetime
-            else:
+            is_valid = projectId in self.project_filter
+            self.sessions_cache.set(sessionId, is_valid)
+            if is_valid:
                 valid_sessions.append(sessionId)
         return valid_sessions
 
     def handle_clean(self):
         if len(self.project_filter) == 0:
             return
-        else:
-            current_timestamp = datetime.now().timestamp()
-            self.non_valid_sessions_cache = {sessionId: start_timestamp for sessionId, start_timestamp in
-                                             self.non_valid_sessions_cache.items() if
-                                             self.max_lifespan > current_timestamp - start_timestamp}
+        self.sessions_cache.expire()
+
+
+class ReaderAcks:
+    """Batches sent by the reader that are still waiting for the main process.
+    A batch is acknowledged twice: ('DECODED', batch_id) once decoded, which gives back its space in the ring,
+    and ('UPLOADED', batch_id) once uploaded, which commits the kafka offsets of every batch up to batch_id."""
+
+    def __init__(self, kafka_consumer, ring: SharedRingBuffer = None):
+        self.kafka_consumer = kafka_consumer
+        self.ring = ring
+        self.decoding = 0
+        self.offsets = dict()  # batch_id -> {(topic, partition): next offset to read}
+        self.closed = False
+
+    def sent(self, batch_id: int, offsets: dict):
+        self.decoding += 1
+        self.offsets[batch_id] = offsets
+
+    def handle(self, signal):
+        if signal == 'CLOSE':
+            self.closed = True
+            return
+        kind, batch_id = signal
+        if kind == 'DECODED':
+            # Batches are decoded in the order they were sent
+            self.decoding -= 1
+            if self.ring is not None:
+                self.ring.release_batch()
+        elif kind == 'UPLOADED':
+            self.commit(batch_id)
+
+    def commit(self, batch_id: int):
+        to_commit = dict()
+        for _batch_id in sorted(b for b in self.offsets.keys() if b <= batch_id):
+            to_commit |= self.offsets.pop(_batch_id)
+        if not to_commit:
+            return
+        try:
+            self.kafka_consumer.commit(offsets=[TopicPartition(topic, partition, offset)
+                                                for (topic, partition), offset in to_commit.items()],
+                                       asynchronous=False)
+        except Exception as e:
+            print('[WORKER Exception-reader] Kafka offsets could not be committed', repr(e))
+
+    def receive(self, pipe: Connection, block: bool = False):
+        """Handles the signals waiting in the pipe. With block, waits for at least one"""
+        while not self.closed and (block or pipe.poll()):
+            self.handle(pipe.recv())
+            block = False
 
 
 def read_from_kafka(pipe: Connection, params: dict):
+    """Reads kafka in cycles of UPLOAD_RATE seconds (or max_kafka_read messages) and sends each cycle as a batch.
+    Reading goes on while the main process decodes and uploads, up to read_ahead batches waiting to be decoded."""
     global UPLOAD_RATE, max_kafka_read
     # try:
     # asyncio.run(pg_client.init())
     kafka_consumer = init_consumer()
     project_filter = params['project_filter']
+    ring = attach(params['ring']) if params['ring'] else None
+    acks = ReaderAcks(kafka_consumer, ring)
+    batch_id = params['first_batch_id']
     capture_messages = list()
     capture_sessions = list()
-    while True:
+    while not acks.closed:
+        # Back-pressure: the reader waits while too many batches are queued for decoding
+        while acks.decoding >= params['read_ahead'] and not acks.closed:
+            acks.receive(pipe, block=True)
+        if acks.closed:
+            break
         to_decode = list()
         sessionIds = list()
+        offsets = dict()
         start_time = datetime.now().timestamp()
         broken_batchs = 0
         n_messages = 0
+        n_bytes = 0
         while datetime.now().timestamp() - start_time < UPLOAD_RATE and max_kafka_read > n_messages:
+            acks.receive(pipe)
+            if acks.closed:
+                break
             try:
                 msg = kafka_consumer.poll(5.0)
             except Exception as e:
                 print('[WORKER Exception]', e)
+                continue
             if msg is None:
                 continue
             n_messages += 1
+            n_bytes += len(msg.value())
+            offsets[(msg.topic(), msg.partition())] = msg.offset() + 1
             try:
                 sessionId = codec.decode_key(msg.key())
             except Exception:
@@ -185,6 +249,8 @@ def read_from_kafka(pipe: Connection, params: dict):
             # if project_filter.is_valid(sessionId):
             #     to_decode.append(msg.value())
             #     sessionIds.append(sessionId)
+        if acks.closed:
+            break
         valid_sessions = project_filter.are_valid(list(set(capture_sessions)))
         while capture_sessions:
             sessId = capture_sessions.pop()
@@ -197,13 +263,16 @@ def read_from_kafka(pipe: Connection, params: dict):
             f'[WORKER INFO-bg] Found {broken_batchs} broken batch over {n_messages} read messages ({100 * broken_batchs / n_messages:.2f}%)')
         else:
             print('[WORKER WARN-bg] No messages read')
-        non_valid_updated = project_filter.non_valid_sessions_cache
-        pipe.send((non_valid_updated, sessionIds, to_decode))
-        continue_signal = pipe.recv()
-        if continue_signal == 'CLOSE':
-            print('[WORKER SHUTDOWN-reader] Reader shutting down')
-            break
-        kafka_consumer.commit()
+        if ring is not None:
+            to_decode = [into_ring(ring, value) for value in to_decode]
+            ring.end_batch()
+        read_stats = (n_messages, n_bytes, datetime.now().timestamp() - start_time)
+        print(f'[WORKER INFO-bg] Project cache {project_filter.sessions_cache.counters()}')
+        project_filter.handle_clean()
+        pipe.send((batch_id, sessionIds, to_decode, read_stats))
+        acks.sent(batch_id, offsets)
+        batch_id += 1
+    print('[WORKER SHUTDOWN-reader] Reader shutting down')
     print('[WORKER INFO] Closing consumer')
     close_consumer(kafka_consumer)
     print('[WORKER INFO] Closing pg connection')
@@ -213,21 +282,33 @@ def read_from_kafka(pipe: Connection, params: dict):
     #     print('[WARN]', repr(e))
 
 
-def into_batch(batch: list[Event | DetailedEvent], session_id: int, n: Session):
+def into_ring(ring: SharedRingBuffer, value: bytes):
+    """(offset, length) of value copied into the ring, or the value itself if the ring is full"""
+    offset = ring.write(value)
+    if offset is None:
+        return value
+    return offset, len(value)
+
+
+def from_ring(ring: SharedRingBuffer, encoded_message):
+    if isinstance(encoded_message, bytes):
+        return encoded_message
+    return ring.view(*encoded_message)
+
+
+def into_batch(batch: ColumnarBatch, session_id: int, n):
     n.sessionid = session_id
     n.received_at = int(datetime.now().timestamp() * 1000)
     n.batch_order_number = len(batch)
-    batch.append(n)
+    batch.append(n.__dict__)
     return batch
 
 
 def project_from_session(sessionId: int):
     """Search projectId of requested sessionId in PG table sessions"""
     with pg_client.PostgresClient().get_live_session() as conn:
-        cur = conn.execute(
-            conn.mogrify("SELECT project_id FROM sessions WHERE session_id=%(sessionId)s LIMIT 1",
-                         {'sessionId': sessionId})
-        )
+        cur = conn.execute(text("SELECT project_id FROM sessions WHERE session_id=:sessionId LIMIT 1"),
+                           {'sessionId': sessionId})
         res = cur.fetchone()
     if res is None:
         print(f'[WORKER WARN] sessionid {sessionId} not found in sessions table')
@@ -236,64 +317,92 @@ def project_from_session(sessionId: int):
 
 
 def project_from_sessions(sessionIds: list[int]):
-    """Search projectId of requested sessionId in PG table sessions"""
-    response = list()
-    while sessionIds:
-        sessIds = sessionIds[-1000:]
-        try:
-            with pg_client.PostgresClient().get_live_session() as conn:
-                cur = conn.execute(
-                    "SELECT session_id, project_id FROM sessions WHERE session_id IN ({sessionIds})".format(
-                                 sessionIds=','.join([str(sessId) for sessId in sessIds])
-                    )
-                )
-                res = cur.fetchall()
-        except Exception as e:
-            print('[WORKER project_from_sessions]', repr(e))
-            raise e
-        if res is None:
-            print(f'[WORKER WARN] sessionids {",".join([str(sessId) for sessId in sessIds])} not found in sessions table')
-        else:
-            response += res
-        sessionIds = sessionIds[:-1000]
-    if not response:
+    """Search projectId of requested sessionIds in PG table sessions, with a single array query"""
+    try:
+        with pg_client.PostgresClient().get_live_session() as conn:
+            cur = conn.execute(text("SELECT session_id, project_id FROM sessions WHERE session_id = ANY(:sessionIds)"),
+                               {'sessionIds': sessionIds})
+            res = cur.fetchall()
+    except Exception as e:
+        print('[WORKER project_from_sessions]', repr(e))
+        raise e
+    if not res:
         return []
-    return [(e['project_id'], e['session_id']) for e in response]
+    return [(e['project_id'], e['session_id']) for e in res]
+
+
+def session_deltas(sessions: dict, previous_state: dict) -> dict:
+    """Fields of each session of previous_state (its fields before the batch, None if it is new) changed since"""
+    deltas = dict()
+    for session_id, previous in previous_state.items():
+        previous = previous or dict()
+        deltas[session_id] = {field: value for field, value in session_to_dict(sessions[session_id]).items()
+                              if field not in previous or previous[field] != value}
+    return deltas
+
+
+def rollback_sessions(sessions: dict, previous_state: dict):
+    """Puts the sessions of previous_state back in the state they had before the batch"""
+    for session_id, previous in previous_state.items():
+        if previous is None:
+            sessions.pop(session_id, None)
+        else:
+            sessions[session_id] = dict_to_session(previous)
+
+
+def merge_deltas(sessions: dict, deltas: dict):
+    """Applies the deltas sent back by a decode worker to the main process copy of its sessions"""
+    for session_id, delta in deltas.items():
+        session = sessions.get(session_id)
+        if session is None:
+            session = sessions[session_id] = SessionRow()
+        session.__dict__ |= delta
 
 
-def decode_message(params: dict):
+def decode_message(params: dict, sessions: dict):
+    """Decodes the messages of params, updating the sessions owned by this worker.
+    Returns the events, the fields of each session changed by these messages and the sessions that ended.
+    If decoding fails the sessions are rolled back, so they keep matching the main process copy"""
     global codec, session_messages, events_messages, EVENT_TYPE
     if len(params['message']) == 0:
-        return list(), None, list()
-    memory = {sessId: dict_to_session(sessObj) for sessId, sessObj in params['memory'].items()}
-    events_worker_batch = list()
+        return None, None, list()
+    events_worker_batch = ColumnarBatch(events_dtypes, events_columns)
     sessionid_ended = list()
-    for session_id, encoded_message in params['message']:
-        messages = codec.decode_detailed(encoded_message)
-        if messages is None:
-            continue
-        for message in messages:
-            if message is None:
+    previous_state = dict()
+    ring = attach(params['ring']) if params['ring'] else None
+    try:
+        for session_id, encoded_message in params['message']:
+            messages = codec.decode_detailed(from_ring(ring, encoded_message))
+            if messages is None:
                 continue
-            if message.__id__ in events_messages and EVENT_TYPE != 'detailed':
-                n = handle_normal_message(message)
-                if n:
-                    events_worker_batch = into_batch(batch=events_worker_batch, session_id=session_id, n=n)
-            elif message.__id__ in events_messages and EVENT_TYPE == 'detailed':
-                n = handle_message(message)
-                if n:
-                    events_worker_batch = into_batch(batch=events_worker_batch, session_id=session_id, n=n)
-
-            if message.__id__ in session_messages:
-                try:
-                    memory[session_id] = handle_session(memory[session_id], message)
-                except KeyError:
-                    memory[session_id] = handle_session(None, message)
-                memory[session_id].sessionid = session_id
-                if isinstance(message, SessionEnd):
-                    sessionid_ended.append(session_id)
-    memory = {sessId: session_to_dict(sessObj) for sessId, sessObj in memory.items()}
-    return events_worker_batch, memory, sessionid_ended
+            for message in messages:
+                if message is None:
+                    continue
+                if message.__id__ in events_messages and EVENT_TYPE != 'detailed':
+                    n = handle_normal_message(message)
+                    if n:
+                        events_worker_batch = into_batch(batch=events_worker_batch, session_id=session_id, n=n)
+                elif message.__id__ in events_messages and EVENT_TYPE == 'detailed':
+                    n = handle_message(message)
+                    if n:
+                        events_worker_batch = into_batch(batch=events_worker_batch, session_id=session_id, n=n)
+
+                if message.__id__ in session_messages:
+                    if session_id not in previous_state:
+                        previous_state[session_id] = dict(session_to_dict(sessions[session_id])) \
+                            if session_id in sessions else None
+                    sessions[session_id] = handle_session(sessions.get(session_id), message)
+                    sessions[session_id].sessionid = session_id
+                    if isinstance(message, SessionEnd):
+                        sessionid_ended.append(session_id)
+    except Exception:
+        # The main process drops the whole batch on an error reply
+        rollback_sessions(sessions, previous_state)
+        raise
+    # Only the fields that changed go back to the main process
+    deltas = session_deltas(sessions, previous_state)
+    # Events go back to the main process as typed numpy columns instead of one object per row
+    return events_worker_batch.to_arrays(), deltas, sessionid_ended
 
 
 def fix_missing_redshift():
@@ -367,48 +476,131 @@ def fix_missing_redshift():
     return
 
 
-def work_assigner(params):
-    flag = params.pop('flag')
-    if flag == 'decoder':
-        return {'flag': 'decoder', 'value': decode_message(params)}
-    elif flag == 'fix':
-        return {'flag': 'fix', 'value': fix_missing_redshift()}
+def decode_worker(conn: Connection):
+    """Long-lived decoding process, it owns the state of the sessions hashed to it (see WorkerPool.get_worker).
+    Tasks only carry raw messages (and sessions to load or drop), replies carry the events and session deltas"""
+    sessions = dict()
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            break
+        if task is None:
+            break
+        for session_id in task['drop']:
+            sessions.pop(session_id, None)
+        for session_id, session_dict in task['load'].items():
+            sessions[session_id] = dict_to_session(session_dict)
+        start_time = time()
+        try:
+            value = decode_message(task, sessions)
+        except Exception as e:
+            print('[WORKER Exception-decoder]', repr(e))
+            conn.send({'flag': 'error', 'value': repr(e)})
+            continue
+        n_bytes = sum(len(m) if isinstance(m, bytes) else m[1] for _, m in task['message'])
+        conn.send({'flag': 'decoder', 'value': value, 'stats': (len(task['message']), n_bytes, time() - start_time)})
 
 
 class WorkerPool:
     def __init__(self, n_workers: int, project_filter: list[int]):
-        self.pool = Pool(n_workers)
+        self.pool = Pool(1)
+        # self.sessions mirrors the state owned by the decode workers, it's used for uploads and checkpoints
         self.sessions = dict()
-        self.assigned_worker = dict()
-        self.pointer = 0
         self.n_workers = n_workers
+        self.hash_ring = ConsistentHashRing(list(range(n_workers)))
+        self.workers = {worker_id: self.start_decode_worker() for worker_id in range(n_workers)}
+        self.worker_restarts = {worker_id: 0 for worker_id in range(n_workers)}
+        self.pending_drops = {worker_id: list() for worker_id in range(n_workers)}
         self.project_filter_class = ProjectFilter(project_filter)
         self.sessions_update_batch = dict()
         self.sessions_insert_batch = dict()
         self.events_batch = list()
         self.n_of_loops = config('LOOPS_BEFORE_UPLOAD', default=4, cast=int)
+        self.ring = None
+        self.metrics = StageMetrics(['read', 'decode', 'upload'])
+        self.bytes_to_upload = 0
+        # Pipeline bounds: batches read ahead of decoding and uploads running or queued
+        self.read_ahead = config('READ_AHEAD_BATCHES', default=2, cast=int)
+        self.upload_queue_depth = config('UPLOAD_QUEUE_DEPTH', default=2, cast=int)
+        self.upload_retries = config('UPLOAD_RETRIES', default=3, cast=int)
+        self.upload_failures = 0
+        # Incremented when a failed upload is put back in the pending data, only the uploads submitted after it
+        # carry that data again: the ones queued before are not acknowledged, their offsets would cover it
+        self.failure_generation = 0
+        self.uploads = deque()
+        self.upload_executor = ThreadPoolExecutor(max_workers=1)
+        self.main_conn, self.reader_conn = None, None
+        self.checkpoint_log = CheckpointLog()
 
     def get_worker(self, session_id: int) -> int:
-        if session_id in self.assigned_worker.keys():
-            worker_id = self.assigned_worker[session_id]
-        else:
-            worker_id = self.pointer
-            self.pointer = (self.pointer + 1) % self.n_workers
-            self.assigned_worker[session_id] = worker_id
-        return worker_id
+        return self.hash_ring.get(session_id)
+
+    @staticmethod
+    def start_decode_worker():
+        conn, worker_conn = Pipe()
+        process = Process(target=decode_worker, args=(worker_conn,), daemon=True)
+        process.start()
+        return process, conn
+
+    def new_task(self, worker_id: int) -> dict:
+        task = {'message': list(),
+                'load': dict(),
+                'drop': self.pending_drops[worker_id],
+                'ring': self.ring.name if self.ring is not None else None}
+        self.pending_drops[worker_id] = list()
+        return task
+
+    def load_sessions(self, worker_ids: list[int], session_ids: list[int] = None):
+        """Hands the sessions they own (from self.sessions, all of them or session_ids) to worker_ids,
+        after a checkpoint load, a restart or a rebalancing"""
+        tasks = {worker_id: self.new_task(worker_id) for worker_id in worker_ids}
+        for session_id in (self.sessions.keys() if session_ids is None else session_ids):
+            worker_id = self.get_worker(session_id)
+            if worker_id in tasks:
+                tasks[worker_id]['load'][session_id] = session_to_dict(self.sessions[session_id])
+        for worker_id, task in tasks.items():
+            self.workers[worker_id][1].send(task)
+        for worker_id in tasks.keys():
+            self.workers[worker_id][1].recv()
+
+    def restart_worker(self, worker_id: int):
+        """Restarts a dead decode worker with the state of its sessions. A worker restarted too many times is
+        taken out of the hash ring and its sessions are rebalanced to the remaining workers"""
+        process, conn = self.workers.pop(worker_id)
+        process.join(timeout=1)
+        self.worker_restarts[worker_id] += 1
+        if self.worker_restarts[worker_id] > 3 and len(self.workers) > 0:
+            print(f'[WORKER WARN] Decode worker {worker_id} removed, rebalancing its sessions')
+            # Only the sessions of the removed worker move, each one to the next worker on the ring
+            moved = [session_id for session_id in self.sessions.keys() if self.get_worker(session_id) == worker_id]
+            self.hash_ring.remove(worker_id)
+            del self.pending_drops[worker_id]
+            self.load_sessions(list(self.workers.keys()), session_ids=moved)
+            return
+        print(f'[WORKER INFO] Restarting decode worker {worker_id}')
+        self.workers[worker_id] = self.start_decode_worker()
+        self.load_sessions([worker_id])
 
     def _pool_response_handler(self, pool_results):
-        count = 0
+        decode_messages, decode_bytes, decode_time = 0, 0, 0
         for js_response in pool_results:
             flag = js_response.pop('flag')
             if flag == 'decoder':
-                worker_events, worker_memory, end_sessions = js_response['value']
-                if worker_memory is None:
+                worker_events, worker_deltas, end_sessions = js_response['value']
+                n_messages, n_bytes, elapsed = js_response['stats']
+                decode_messages += n_messages
+                decode_bytes += n_bytes
+                # Workers run in parallel, the stage lasts as long as the slowest one
+                decode_time = max(decode_time, elapsed)
+                if worker_deltas is None:
                     continue
-                self.events_batch += worker_events
-                for session_id in worker_memory.keys():
-                    self.sessions[session_id] = dict_to_session(worker_memory[session_id])
+                if len(worker_events):
+                    self.events_batch.append(worker_events)
+                merge_deltas(self.sessions, worker_deltas)
+                for session_id in worker_deltas.keys():
                     self.project_filter_class.sessions_lifespan.add(session_id)
+                    self.checkpoint_log.touch(session_id)
                 for session_id in end_sessions:
                     if self.sessions[session_id].session_start_timestamp:
                         old_status = self.project_filter_class.sessions_lifespan.close(session_id)
@@ -420,114 +612,212 @@ class WorkerPool:
                             self.sessions_insert_batch[session_id] = deepcopy(self.sessions[session_id])
                         else:
                             print(f'[WORKER Exception] Unknown session status: {old_status}')
-            elif flag == 'reader':
-                count += 1
-                if count > 1:
-                    raise Exception('Pool only accepts one reader task')
-                non_valid_updated, session_ids, messages = js_response['value']
-                self.project_filter_class.non_valid_sessions_cache = non_valid_updated
+        if decode_messages:
+            self.metrics.add('decode', decode_messages, decode_bytes, decode_time)
+            self.bytes_to_upload += decode_bytes
 
         self.project_filter_class.handle_clean()
         sessions_to_delete = self.project_filter_class.sessions_lifespan.clear_sessions()
         for sess_id in sessions_to_delete:
+            self.checkpoint_log.delete(sess_id)
             try:
                 del self.sessions[sess_id]
             except KeyError:
                 ...
-            try:
-                del self.assigned_worker[sess_id]
-            except KeyError:
-                ...
-        return session_ids, messages
+            # The owner drops it with its next task
+            self.pending_drops[self.get_worker(sess_id)].append(sess_id)
+
+    def decode(self, session_ids: list[int], messages: list):
+        """Decodes one batch read from kafka. Every session is decoded by the worker owning it, batches are decoded
+        one after the other since each one goes on from the session state left by the previous one"""
+        tasks = {worker_id: self.new_task(worker_id) for worker_id in self.workers.keys()}
+        for i in range(len(session_ids)):
+            tasks[self.get_worker(session_ids[i])]['message'].append([session_ids[i], messages[i]])
+        # Hand tasks to workers
+        waiting = dict()
+        dead_workers = list()
+        for worker_id, task in tasks.items():
+            if task['message'] or task['drop']:
+                conn = self.workers[worker_id][1]
+                try:
+                    conn.send(task)
+                except (BrokenPipeError, OSError):
+                    print(f'[WORKER Exception] Decode worker {worker_id} died')
+                    dead_workers.append(worker_id)
+                    continue
+                waiting[conn] = worker_id
+        fix_result = self.pool.apply_async(fix_missing_redshift)
+        results = list()
+        deadline = time() + 32 * UPLOAD_RATE
+        while waiting:
+            ready = wait(list(waiting.keys()), timeout=max(deadline - time(), 0))
+            if not ready:
+                print('[WORKER-TimeoutError] Decoding of messages is taking longer than expected')
+                raise TimeoutError()
+            for conn in ready:
+                worker_id = waiting.pop(conn)
+                try:
+                    response = conn.recv()
+                except EOFError:
+                    print(f'[WORKER Exception] Decode worker {worker_id} died')
+                    dead_workers.append(worker_id)
+                    response = {'flag': 'error'}
+                if response['flag'] == 'error':
+                    self.sessions_update_batch = dict()
+                    self.sessions_insert_batch = dict()
+                    self.events_batch = list()
+                    continue
+                results.append(response)
+        for worker_id in dead_workers:
+            self.restart_worker(worker_id)
+        try:
+            fix_result.get(timeout=32 * UPLOAD_RATE)
+        except Exception as e:
+            print(f'[Exception] {e}')
+        return results
+
+    def submit_upload(self, database_api, batch_id: int):
+        """Hands everything decoded up to batch_id to the upload thread and goes on with the next batches.
+        The checkpoint is taken now, so that it matches the kafka offsets committed once this upload succeeds"""
+        while len(self.uploads) >= self.upload_queue_depth:
+            # Back-pressure: decoding waits for the upload queue
+            self.collect_uploads(block=True)
+        payload = (self.get_events_arrays(), self.sessions_insert_batch, self.sessions_update_batch)
+        n_bytes = self.bytes_to_upload
+        self.sessions_update_batch = dict()
+        self.sessions_insert_batch = dict()
+        self.events_batch = list()
+        self.bytes_to_upload = 0
+        checkpoint = self.snapshot()
+        future = self.upload_executor.submit(self.upload, database_api, payload, checkpoint)
+        self.uploads.append((batch_id, payload, n_bytes, self.failure_generation, future))
 
-    def run_workers(self, database_api):
+    def upload(self, database_api, payload, checkpoint):
+        """Runs in the upload thread. Returns which parts of payload were uploaded and the time it took"""
         global sessions_table_name, table_name, EVENT_TYPE
-        session_ids = list()
-        messages = list()
-        main_conn, reader_conn = Pipe()
-        kafka_task_params = {'flag': 'reader',
-                              'project_filter': self.project_filter_class}
-        kafka_reader_process = Process(target=read_from_kafka, args=(reader_conn, kafka_task_params))
-        kafka_reader_process.start()
+        start_time = time()
+        events, sessions_insert_batch, sessions_update_batch = payload
+        uploaded = (False, False, False)
+        try:
+            uploaded = insertBatch(events, sessions_insert_batch.values(), sessions_update_batch.values(),
+                                   database_api, sessions_table_name, table_name, EVENT_TYPE)
+            if all(uploaded):
+                self.save_checkpoint(database_api, checkpoint)
+        except Exception as e:
+            print('[WORKER Exception] Upload failed', repr(e))
+            # Data that reached the datawarehouse is not sent again, the changes of the checkpoint go in a full one
+            self.checkpoint_log.force_full = True
+        return uploaded, time() - start_time
+
+    def collect_uploads(self, block: bool = False):
+        """Acknowledges finished uploads to the reader, which commits their kafka offsets.
+        The parts of a failed upload that did not reach the datawarehouse are put back in front of the pending data
+        and go with the next one submitted, the uploads already queued are not acknowledged until that one succeeds"""
+        while self.uploads and (block or self.uploads[0][4].done()):
+            block = False
+            batch_id, payload, n_bytes, generation, future = self.uploads.popleft()
+            (events_uploaded, inserts_uploaded, updates_uploaded), elapsed = future.result()
+            uploaded = events_uploaded and inserts_uploaded and updates_uploaded
+            events, sessions_insert_batch, sessions_update_batch = payload
+            self.metrics.add('upload', len(events), n_bytes, elapsed)
+            if not uploaded and self.upload_failures < self.upload_retries:
+                self.upload_failures += 1
+                print(f'[WORKER WARN] Upload failed ({self.upload_failures}/{self.upload_retries}), retrying with next batch')
+                # The checkpoint of this upload was not saved, the changes it held go in a full one
+                self.checkpoint_log.force_full = True
+                if not events_uploaded and len(events):
+                    self.events_batch.insert(0, events)
+                if not inserts_uploaded:
+                    self.sessions_insert_batch = sessions_insert_batch | self.sessions_insert_batch
+                if not updates_uploaded:
+                    self.sessions_update_batch = sessions_update_batch | self.sessions_update_batch
+                self.bytes_to_upload += n_bytes
+                self.failure_generation += 1
+                continue
+            if not uploaded:
+                print(f'[WORKER WARN] Upload failed {self.upload_failures + 1} times, data up to batch {batch_id} is dropped')
+            if generation < self.failure_generation:
+                # Queued before a failed upload, whose data is still pending
+                continue
+            self.upload_failures = 0
+            self.main_conn.send(('UPLOADED', batch_id))
+
+    def start_reader(self, first_batch_id: int):
+        reader_params = {'flag': 'reader',
+                         'project_filter': self.project_filter_class,
+                         'ring': self.ring.name if self.ring is not None else None,
+                         'first_batch_id': first_batch_id,
+                         'read_ahead': self.read_ahead}
+        reader_process = Process(target=read_from_kafka, args=(self.reader_conn, reader_params))
+        reader_process.start()
+        return reader_process
+
+    def run_workers(self, database_api):
+        """Kafka reading (reader process), decoding (pool) and upload (thread) overlap:
+        reader -> up to read_ahead batches -> decode -> up to upload_queue_depth uploads -> offsets commit"""
+        self.main_conn, self.reader_conn = Pipe()
+        if shared_buffer_mb > 0:
+            self.ring = SharedRingBuffer(size=shared_buffer_mb * 1024 * 1024)
+        kafka_reader_process = self.start_reader(first_batch_id=0)
+        # Sessions loaded from the checkpoint go to their workers
+        self.load_sessions(list(self.workers.keys()))
+        last_batch_id = -1
         current_loop_number = 0
         n_kafka_restarts = 0
         while signal_handler.KEEP_PROCESSING:
-            current_loop_number = (current_loop_number + 1) % self.n_of_loops
-            # Setup of parameters for workers
             if not kafka_reader_process.is_alive():
                 if n_kafka_restarts > 3:
                     break
                 print('[WORKER-INFO] Restarting reader task')
+                # Batches left by the reader are dropped: their offsets were not committed, so they are read again
+                while self.main_conn.poll():
+                    last_batch_id = max(last_batch_id, self.main_conn.recv()[0])
                 del kafka_reader_process
-                kafka_reader_process = Process(target=read_from_kafka, args=(reader_conn, kafka_task_params))
-                kafka_reader_process.start()
+                kafka_reader_process = self.start_reader(first_batch_id=last_batch_id + 1)
                 n_kafka_restarts += 1
-            decoding_params = [{'flag': 'decoder',
-                                'message': list(),
-                                'memory': dict()} for _ in range(self.n_workers)
-                               ]
-            for i in range(len(session_ids)):
-                session_id = session_ids[i]
-                worker_id = self.get_worker(session_id)
-                decoding_params[worker_id]['message'].append([session_id, messages[i]])
-                if session_id not in decoding_params[worker_id]['memory'].keys():
-                    try:
-                        decoding_params[worker_id]['memory'][session_id] = session_to_dict(self.sessions[session_id])
-                    except KeyError:
-                        ...
-            # Hand tasks to workers
-            async_results = list()
-            for params in decoding_params:
-                if params['message']:
-                    async_results.append(self.pool.apply_async(work_assigner, args=[params]))
-            results = [{'flag': 'reader', 'value': main_conn.recv()}]
-            async_results.append(self.pool.apply_async(work_assigner, args=[{'flag': 'fix'}]))
-            for async_result in async_results:
-                try:
-                    results.append(async_result.get(timeout=32 * UPLOAD_RATE))
-                except TimeoutError as e:
-                    print('[WORKER-TimeoutError] Decoding of messages is taking longer than expected')
-                    raise e
-                except Exception as e:
-                    print(f'[Exception] {e}')
-                    self.sessions_update_batch = dict()
-                    self.sessions_insert_batch = dict()
-                    self.events_batch = list()
-                    continue
-            session_ids, messages = self._pool_response_handler(
-                pool_results=results)
+            self.collect_uploads()
+            if not self.main_conn.poll(1):
+                continue
+            batch_id, session_ids, messages, read_stats = self.main_conn.recv()
+            last_batch_id = batch_id
+            self.metrics.add('read', *read_stats)
+            results = self.decode(session_ids, messages)
+            self.main_conn.send(('DECODED', batch_id))
+            self._pool_response_handler(pool_results=results)
+            current_loop_number = (current_loop_number + 1) % self.n_of_loops
             if current_loop_number == 0:
-                insertBatch(self.events_batch, self.sessions_insert_batch.values(), self.sessions_update_batch.values(),
-                            database_api, sessions_table_name, table_name, EVENT_TYPE)
-                self.sessions_update_batch = dict()
-                self.sessions_insert_batch = dict()
-                self.events_batch = list()
-            self.save_snapshot(database_api)
-            main_conn.send('CONTINUE')
+                self.submit_upload(database_api, batch_id)
+            self.metrics.report()
+        print('[WORKER-INFO] Uploading pending batches')
+        if last_batch_id >= 0 and (self.events_batch or self.sessions_insert_batch or self.sessions_update_batch):
+            self.submit_upload(database_api, last_batch_id)
+        while self.uploads:
+            self.collect_uploads(block=True)
         print('[WORKER-INFO] Sending close signal')
-        main_conn.send('CLOSE')
+        self.main_conn.send('CLOSE')
+        kafka_reader_process.join(timeout=2 * UPLOAD_RATE)
         self.terminate(database_api)
         kafka_reader_process.terminate()
+        if self.ring is not None:
+            self.ring.close()
         print('[WORKER-SHUTDOWN] Process terminated')
 
     def load_checkpoint(self, database_api):
-        file = database_api.load_binary(name='checkpoint')
-        checkpoint = json.loads(file.getvalue().decode('utf-8'))
-        file.close()
+        checkpoint = self.checkpoint_log.load(database_api)
         if 'version' not in checkpoint.keys():
             sessions_cache_list = checkpoint['cache']
-            reload_default_time = datetime.now().timestamp()
-            self.project_filter_class.non_valid_sessions_cache = {int(sessId): reload_default_time for sessId, value in
-                                                                  sessions_cache_list.items() if not value[1]}
-            self.project_filter_class.sessions_lifespan.session_project = checkpoint['cached_sessions']
+            for sessId, value in sessions_cache_list.items():
+                if not value[1]:
+                    self.project_filter_class.sessions_cache.set(int(sessId), False)
+            self.project_filter_class.sessions_lifespan.load(checkpoint['cached_sessions'])
         elif checkpoint['version'] == 'v1.0':
             for sessionId, session_dict in checkpoint['sessions']:
                 self.sessions[sessionId] = dict_to_session(session_dict)
-            self.project_filter_class.sessions_lifespan.session_project = checkpoint['cached_sessions']
+            self.project_filter_class.sessions_lifespan.load(checkpoint['cached_sessions'])
         elif checkpoint['version'] == 'v1.1':
             for sessionId, session_dict in checkpoint['sessions']:
                 self.sessions[sessionId] = dict_to_session(session_dict)
-            self.project_filter_class.sessions_lifespan.session_project = checkpoint['cached_sessions']
+            self.project_filter_class.sessions_lifespan.load(checkpoint['cached_sessions'])
             for sessionId in checkpoint['sessions_update_batch']:
                 try:
                     self.sessions_update_batch[sessionId] = self.sessions[sessionId]
@@ -538,25 +828,45 @@ class WorkerPool:
                     self.sessions_insert_batch[sessionId] = self.sessions[sessionId]
                 except Exception:
                     continue
-            self.events_batch = [dict_to_event(event) for event in checkpoint['events_batch']]
+            self.events_batch = [ColumnArrays.from_records(checkpoint['events_batch'], events_dtypes, events_columns)]
+        elif checkpoint['version'] == 'v2':
+            self.sessions = {sessionId: dict_to_session(session_dict)
+                             for sessionId, session_dict in checkpoint['sessions'].items()}
+            self.project_filter_class.sessions_lifespan.load(checkpoint['cached_sessions'])
+            self.sessions_update_batch = {sessionId: self.sessions[sessionId]
+                                          for sessionId in checkpoint['sessions_update_batch'] if sessionId in self.sessions}
+            self.sessions_insert_batch = {sessionId: self.sessions[sessionId]
+                                          for sessionId in checkpoint['sessions_insert_batch'] if sessionId in self.sessions}
+            if checkpoint['events_batch']:
+                self.events_batch = [ColumnArrays.from_records(checkpoint['events_batch'], events_dtypes, events_columns)]
         else:
             raise Exception('Error in version of snapshot')
 
+    def get_events_arrays(self) -> ColumnArrays:
+        """Events decoded since the last upload, as one set of columns"""
+        if not self.events_batch:
+            return ColumnarBatch(events_dtypes, events_columns).to_arrays()
+        return ColumnArrays.concat(self.events_batch)
+
     def terminate(self, database_api):
+        # The checkpoint was saved with the last upload, data not uploaded is read again from kafka
+        for process, conn in self.workers.values():
+            conn.send(None)
+            process.join(timeout=5)
         self.pool.close()
-        self.save_snapshot(database_api)
+        self.upload_executor.shutdown()
         database_api.close()
 
+    def snapshot(self) -> dict:
+        """Checkpoint record, holding only the sessions changed since the previous one unless a full one is due"""
+        pending = {'sessions_update_batch': list(self.sessions_update_batch.keys()),
+                   'sessions_insert_batch': list(self.sessions_insert_batch.keys()),
+                   'events_batch': self.get_events_arrays().to_records()}
+        return self.checkpoint_log.build(self.sessions, self.project_filter_class.sessions_lifespan.session_project,
+                                         pending)
+
+    def save_checkpoint(self, database_api, checkpoint: dict):
+        self.checkpoint_log.save(database_api, checkpoint)
+
     def save_snapshot(self, database_api):
-        session_snapshot = list()
-        for sessionId, session in self.sessions.items():
-            session_snapshot.append([sessionId, session_to_dict(session)])
-        checkpoint = {
-            'version': 'v1.1',
-            'sessions': session_snapshot,
-            'cached_sessions': self.project_filter_class.sessions_lifespan.session_project,
-            'sessions_update_batch': list(self.sessions_update_batch.keys()),
-            'sessions_insert_batch': list(self.sessions_insert_batch.keys()),
-            'events_batch': [event_to_dict(event) for event in self.events_batch]
-        }
-        database_api.save_binary(binary_data=json.dumps(checkpoint).encode('utf-8'), name='checkpoint')
+        self.save_checkpoint(database_api, self.snapshot())